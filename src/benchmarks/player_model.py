@@ -0,0 +1,54 @@
+"""Per-player cost of building a `PlayerModel` from a stored document.
+
+Run from `src`::
+
+    python -m benchmarks.player_model
+"""
+
+import timeit
+from datetime import datetime
+
+from bson import ObjectId
+
+from db.models.playerModel import PlayerModel
+from utility import playerClasses
+
+DOCUMENT = {
+  '_id': ObjectId(),
+  'discord_id': 123456789987654321,
+  'title': 'Noob',
+  'playerClass': 'Test Class A',
+  'stats': dict(playerClasses.defaultStatsA),
+  'tokens': 100,
+  'favor': 100,
+  'inventory': {'Rumshot': 3, 'Cakecrumbs': 1},
+  'cooldowns': dict(playerClasses.defaultCooldowns),
+  'registered_at': datetime.now(),
+  'version': 0,
+}
+
+
+def _per_call(func, number: int, repeat: int) -> float:
+  # Best of several runs, in microseconds per call
+  return (
+    min(timeit.repeat(func, number=number, repeat=repeat))
+    / number
+    * 1e6
+  )
+
+
+def main(number: int = 20000, repeat: int = 5) -> None:
+  validated = _per_call(
+    lambda: PlayerModel(**DOCUMENT), number, repeat
+  )
+  constructed = _per_call(
+    lambda: PlayerModel.from_db(DOCUMENT), number, repeat
+  )
+
+  print(f'PlayerModel(**doc):    {validated:.2f} us')
+  print(f'PlayerModel.from_db:   {constructed:.2f} us')
+  print(f'Speedup:               {validated / constructed:.1f}x')
+
+
+if __name__ == '__main__':
+  main()
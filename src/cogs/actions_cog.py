@@ -1,4 +1,3 @@
-import importlib
 import random
 import traceback
 from datetime import datetime, timezone
@@ -10,10 +9,15 @@ from fastapi import HTTPException
 from pydantic import ValidationError
 
 import core.player_utils as utils
+from core.enemies import ENEMIES
+from core.items import ITEMS, get_item
+from core.sampling import AliasSampler
+from db.models.partialPlayerModel import PartialPlayerModel
 from db.models.playerModel import PlayerModel
-from db.models.updatePlayerModel import UpdatePlayerModel
-from db.routes import get_player, update_player
 from utility import buttons, embeds
+from utility.deadline import auto_defer
+from utility.middleware import player_command
+from utility.tracing import tracer
 
 # region Settings
 COOLDOWN_CMDS = ['worship', 'duel', 'hunt']
@@ -31,6 +35,9 @@ WORSHIP_DANCE_OUTCOMES = {
   'The light of our Lord GhostKai shines upon you! Your dance has greatly pleased Him.\nYou get +5 Favour!': 5,
 }
 WORSHIP_DANCE_WEIGHTS = [5, 10, 40, 35, 10]
+WORSHIP_DANCE_SAMPLER = AliasSampler(
+  list(WORSHIP_DANCE_OUTCOMES), WORSHIP_DANCE_WEIGHTS
+)
 
 HUNT_MOBS = {
   'Bundt': 0.15,
@@ -38,9 +45,43 @@ HUNT_MOBS = {
   'CinnamonRoll': 0.5,
   'RedvelvetCupcake': 1.0,
 }
+# Cumulative weights, as for `random.choices`
+HUNT_MOB_SAMPLER = AliasSampler.from_cumulative(
+  list(HUNT_MOBS), list(HUNT_MOBS.values())
+)
+if unknown := set(HUNT_MOBS) - set(ENEMIES):
+  raise ValueError(f'HUNT_MOBS has unknown mobs {sorted(unknown)}')
 # endregion
 
 
+def cooldown_remaining(
+  cooldowns: dict[str, float | None], cmd: str
+) -> float | None:
+  """Returns the seconds left on a command's cooldown.
+
+  Args:
+      cooldowns (dict[str, float | None]): Player's cooldown timestamps.
+      cmd (str): Command name, one of `COOLDOWN_CMDS`.
+
+  Returns:
+      float | None: Seconds left, zero or less once expired, None if the cooldown is not set.
+  """
+  timestamp = cooldowns.get(cmd)
+  if not timestamp:
+    return None
+  timeSince = datetime.now(timezone.utc).timestamp() - timestamp
+  return COOLDOWN_TIMES.get(cmd) * 60 - timeSince
+
+
+def clear_expired_cooldowns(uow: utils.PlayerUnitOfWork) -> None:
+  # Checked again on the copy being written, so a cooldown started
+  # meanwhile is kept
+  for attr in COOLDOWN_CMDS:
+    remaining = cooldown_remaining(uow.player.cooldowns, attr)
+    if remaining is not None and remaining <= 0:
+      uow.remove_cooldown(attr)
+
+
 class ActionsCog(commands.Cog):
   def __init__(self, bot: commands.Bot) -> None:
     self.app = bot.app
@@ -52,62 +93,42 @@ class ActionsCog(commands.Cog):
     name='cooldowns',
     description='All command cooldowns.',
   )
+  @auto_defer()
+  @player_command(fields=['cooldowns'])
   async def cooldowns(
-    self, interaction: discord.Interaction
+    self,
+    interaction: discord.Interaction,
+    player: PartialPlayerModel,
   ) -> None:
-    # Query database for player
-    try:
-      player: PlayerModel = await get_player(
-        self.app, discord_id=interaction.user.id
-      )
-      print(player)
-    except Exception as e:
-      raise e
-
-    # Player Not Found on DB
-    if not player:
-      return await interaction.response.send_message(
-        embed=embeds.NotRegisteredEmbed()
-      )
-
-    # Get cooldowns
-    player_cooldowns = player['cooldowns']
     # Filter out special methods and create dict
     remainingDeltas: dict[str, str] = {}
+    expired = False
     # Get all time diffs and update to None if exceeded
     for attr in COOLDOWN_CMDS:
-      timestamp = player_cooldowns[attr]
-      if timestamp:
-        timeSince = (
-          datetime.now(timezone.utc).timestamp() - timestamp
-        )
-        timeRemaining = (
-          COOLDOWN_TIMES.get(attr) * 60
-        ) - timeSince
-        if timeRemaining <= 0:
-          player_cooldowns[attr] = None
-          remainingDeltas[attr] = 'Ready'
-        else:
-          minutes, seconds = divmod(timeRemaining, 60)
-          hours, minutes = divmod(minutes, 60)
-          remainingDeltas[attr] = '%d:%02d:%02d' % (
-            hours,
-            minutes,
-            seconds,
-          )
-      else:
+      timeRemaining = cooldown_remaining(player.cooldowns, attr)
+      if timeRemaining is None:
+        remainingDeltas[attr] = 'Ready'
+      elif timeRemaining <= 0:
+        expired = True
         remainingDeltas[attr] = 'Ready'
+      else:
+        minutes, seconds = divmod(timeRemaining, 60)
+        hours, minutes = divmod(minutes, 60)
+        remainingDeltas[attr] = '%d:%02d:%02d' % (
+          hours,
+          minutes,
+          seconds,
+        )
 
-    # Update player in DB to remove nulled cooldowns
-    new_player = UpdatePlayerModel(
-      cooldowns=player_cooldowns
-    )
-    try:
-      await update_player(
-        self.app, interaction.user.id, new_player
+    if expired:
+      # Null expired cooldowns, the Player is not held while reading
+      (stored,) = await utils.fetch_players(
+        self.app, player.discord_id
       )
-    except Exception as e:
-      raise e
+      if stored is not None:
+        await utils.run_with_retry(
+          self.app, stored, clear_expired_cooldowns
+        )
 
     return await interaction.response.send_message(
       embed=embeds.CooldownsEmbed(remainingDeltas)
@@ -173,27 +194,15 @@ class ActionsCog(commands.Cog):
       app_commands.Choice(name='dance', value='dance'),
     ]
   )
+  @auto_defer()
+  @player_command()
   async def worship(
     self,
     interaction: discord.Interaction,
     type: app_commands.Choice[str],
+    player: PlayerModel,
+    uow: utils.PlayerUnitOfWork,
   ):
-    # Get player from db
-    try:
-      player: PlayerModel = PlayerModel(
-        **await get_player(
-          self.app, discord_id=interaction.user.id
-        )
-      )
-    except Exception as e:
-      raise e
-
-    # Player Not Found in DB
-    if not player:
-      return await interaction.response.send_message(
-        embed=embeds.NotRegisteredEmbed()
-      )
-
     # Check Cooldown
     cooldown: str | None = player.cooldown_by_name(
       COOLDOWN_TIMES, 'worship'
@@ -206,32 +215,19 @@ class ActionsCog(commands.Cog):
     # region Dance
     if type.value == 'dance':
       # Choose result based on given weights
-      dance_result: list[str] = random.choices(
-        list(WORSHIP_DANCE_OUTCOMES.keys()),
-        WORSHIP_DANCE_WEIGHTS,
-      )
-      dance_result: str = dance_result[0]
+      dance_result: str = WORSHIP_DANCE_SAMPLER.draw()
 
       # Calculate XP
       xp_result: int = player.calculate_xp_gauss(25, 5)
 
+      # Update Favor and XP
+      uow.update_favor(WORSHIP_DANCE_OUTCOMES.get(dance_result))
+      # If XP meets Required XP, levelled_up contains how many levels
+      levelled_up: int | None = uow.update_xp(xp_result)
+      # Reset the Cooldown
+      uow.start_cooldown('worship')
       try:
-        # Update Favor and XP
-        await utils.update_favor(
-          self.app,
-          player,
-          WORSHIP_DANCE_OUTCOMES.get(dance_result),
-        )
-        # If XP meets Required XP, levelled_up contains how many levels
-        levelled_up: int | None = await utils.update_xp(
-          self.app,
-          player,
-          xp_result,
-        )
-        # Reset the Cooldown
-        await utils.start_cooldown(
-          self.app, player, 'worship'
-        )
+        await uow.commit()
       except Exception as e:
         raise e
 
@@ -324,6 +320,7 @@ class ActionsCog(commands.Cog):
       ),
     ]
   )
+  @auto_defer()
   async def duel(
     self,
     interaction: discord.Interaction,
@@ -336,15 +333,10 @@ class ActionsCog(commands.Cog):
         'You cannot challenge yourself to a duel.'
       )
 
-    # Get both players from db
+    # Get both players from db in one query
     try:
-      initiator: PlayerModel = PlayerModel(
-        **await get_player(
-          self.app, discord_id=interaction.user.id
-        )
-      )
-      target: PlayerModel = PlayerModel(
-        **await get_player(self.app, discord_id=target.id)
+      initiator, target = await utils.fetch_players(
+        self.app, interaction.user.id, target.id
       )
     except Exception as e:
       raise e
@@ -396,16 +388,27 @@ class ActionsCog(commands.Cog):
 
       # If Duel Accepted
       if view.value:
-        # Update Cooldowns
-        try:
-          await utils.start_cooldown(
-            self.app, initiator, 'duel'
-          )
-          await utils.start_cooldown(
-            self.app, target, 'duel'
+        # The wait can outlast other commands, so settle the duel on
+        # fresh copies that are only written if still current
+        initiator, target = await utils.fetch_players(
+          self.app, initiator.discord_id, target.discord_id
+        )
+        if not initiator or not target:
+          return await interaction.followup.send(
+            'A Player left before the duel could start.'
           )
-        except Exception as e:
-          raise e
+
+        # Changes to both players are written once the duel is settled
+        init_uow = utils.PlayerUnitOfWork(
+          self.app, initiator, check_version=True
+        )
+        target_uow = utils.PlayerUnitOfWork(
+          self.app, target, check_version=True
+        )
+
+        # Update Cooldowns
+        init_uow.start_cooldown('duel')
+        target_uow.start_cooldown('duel')
 
         # Roll the Dice
         initiator_roll: int = random.randint(1, 20)
@@ -422,19 +425,12 @@ class ActionsCog(commands.Cog):
             # Initiator
             init_levelled_up: (
               int | None
-            ) = await utils.update_xp(
-              app=self.app,
-              player=initiator,
-              amount=init_xp,
-            )
+            ) = init_uow.update_xp(init_xp)
             # Target
             target_levelled_up: (
               int | None
-            ) = await utils.update_xp(
-              app=self.app,
-              player=target,
-              amount=target_xp,
-            )
+            ) = target_uow.update_xp(target_xp)
+            await utils.commit_all(init_uow, target_uow)
           except Exception as e:
             raise e
 
@@ -472,11 +468,8 @@ class ActionsCog(commands.Cog):
           try:
             init_levelled_up: (
               int | None
-            ) = await utils.update_xp(
-              app=self.app,
-              player=initiator,
-              amount=init_xp,
-            )
+            ) = init_uow.update_xp(init_xp)
+            await utils.commit_all(init_uow, target_uow)
           except Exception as e:
             raise e
 
@@ -504,11 +497,8 @@ class ActionsCog(commands.Cog):
           try:
             target_levelled_up: (
               int | None
-            ) = await utils.update_xp(
-              app=self.app,
-              player=target,
-              amount=target_xp,
-            )
+            ) = target_uow.update_xp(target_xp)
+            await utils.commit_all(init_uow, target_uow)
           except Exception as e:
             raise e
 
@@ -545,16 +535,27 @@ class ActionsCog(commands.Cog):
 
       # If Duel Accepted
       if view.value:
-        # Update Cooldowns
-        try:
-          await utils.start_cooldown(
-            self.app, initiator, 'duel'
-          )
-          await utils.start_cooldown(
-            self.app, target, 'duel'
+        # The wait can outlast other commands, so settle the duel on
+        # fresh copies that are only written if still current
+        initiator, target = await utils.fetch_players(
+          self.app, initiator.discord_id, target.discord_id
+        )
+        if not initiator or not target:
+          return await interaction.followup.send(
+            'A Player left before the duel could start.'
           )
-        except Exception as e:
-          raise e
+
+        # Changes to both players are written once the duel is settled
+        init_uow = utils.PlayerUnitOfWork(
+          self.app, initiator, check_version=True
+        )
+        target_uow = utils.PlayerUnitOfWork(
+          self.app, target, check_version=True
+        )
+
+        # Update Cooldowns
+        init_uow.start_cooldown('duel')
+        target_uow.start_cooldown('duel')
 
         # Roll the Dice
         initiator_roll: int = random.randint(1, 20)
@@ -562,7 +563,13 @@ class ActionsCog(commands.Cog):
 
         # If result is a Tie
         if initiator_roll == target_roll:
-          # No one earns XP, send result
+          # No one earns XP, only save cooldowns
+          try:
+            await utils.commit_all(init_uow, target_uow)
+          except Exception as e:
+            raise e
+
+          # Send result
           followup = await interaction.followup.send(
             f"{interaction.user.name}: {initiator_roll}\n{target.name}: {target_roll}\nIt's a tie! No one gets anything."
           )
@@ -581,18 +588,11 @@ class ActionsCog(commands.Cog):
           try:
             init_levelled_up: (
               int | None
-            ) = await utils.update_xp(
-              app=self.app,
-              player=initiator,
-              amount=init_xp,
-            )
+            ) = init_uow.update_xp(init_xp)
             target_levelled_up: (
               int | None
-            ) = await utils.update_xp(
-              app=self.app,
-              player=target,
-              amount=target_xp,
-            )
+            ) = target_uow.update_xp(target_xp)
+            await utils.commit_all(init_uow, target_uow)
           except Exception as e:
             raise e
 
@@ -630,18 +630,11 @@ class ActionsCog(commands.Cog):
           try:
             target_levelled_up: (
               int | None
-            ) = await utils.update_xp(
-              app=self.app,
-              player=target,
-              amount=target_xp,
-            )
+            ) = target_uow.update_xp(target_xp)
             init_levelled_up: (
               int | None
-            ) = await utils.update_xp(
-              app=self.app,
-              player=initiator,
-              amount=init_xp,
-            )
+            ) = init_uow.update_xp(init_xp)
+            await utils.commit_all(init_uow, target_uow)
           except Exception as e:
             raise e
 
@@ -721,17 +714,14 @@ class ActionsCog(commands.Cog):
   @app_commands.command(
     name='hunt', description='Hunt small mobs.'
   )
-  async def hunt(self, interaction: discord.Interaction):
-    # Get Player from DB
-    try:
-      player: PlayerModel = PlayerModel(
-        **await get_player(
-          self.app, discord_id=interaction.user.id
-        )
-      )
-    except Exception as e:
-      raise e
-
+  @auto_defer()
+  @player_command()
+  async def hunt(
+    self,
+    interaction: discord.Interaction,
+    player: PlayerModel,
+    uow: utils.PlayerUnitOfWork,
+  ):
     # Check Cooldown
     cooldown: str | None = player.cooldown_by_name(
       COOLDOWN_TIMES, 'hunt'
@@ -741,82 +731,57 @@ class ActionsCog(commands.Cog):
         cooldown
       )
 
+    # All changes from the hunt are written in one update
     # Update Cooldown
-    try:
-      await utils.start_cooldown(self.app, player, 'hunt')
-    except Exception as e:
-      raise e
+    uow.start_cooldown('hunt')
 
     # Pick a Mob
-    mob = random.choices(
-      list(HUNT_MOBS.keys()),
-      cum_weights=list(HUNT_MOBS.values()),
-    )
-    # Instantiate the Mob
-    EnemyClass = getattr(
-      importlib.import_module('core.enemies'), mob[0]
-    )
-    enemy = EnemyClass()
+    mob: str = HUNT_MOB_SAMPLER.draw()
+    # Start a fight against the shared Mob template
+    enemy = ENEMIES[mob]
+    fight = enemy.spawn()
 
     initial_player_hp: int = player.stats['hp']
 
     # Player takes turn first
-    while player.stats['hp'] > 0 and enemy.hp > 0:
-      # Player's turn
-      enemy.hp = enemy.hp - player.stats['atk']
-      # Enemy's turn
-      if enemy.hp > 0:
-        player.stats['hp'] = int(
-          player.stats['hp']
-          - (enemy.atk * (80 / 100 + player.stats['dfs']))
-        )
+    with tracer.span('hunt.combat'):
+      while player.stats['hp'] > 0 and fight.hp > 0:
+        # Player's turn
+        fight.hp = fight.hp - player.stats['atk']
+        # Enemy's turn
+        if fight.hp > 0:
+          player.stats['hp'] = int(
+            player.stats['hp']
+            - (enemy.atk * (80 / 100 + player.stats['dfs']))
+          )
 
     if player.stats['hp'] > 0:
       # Calculate XP
       xp_result: int = player.calculate_xp_gauss(35, 5)
 
-      # Calculate loot
-      available_loot = list(enemy.drops.keys())
-      cum_weights = list(enemy.drops.values())
-
-      # Add none as total cumulative weight
-      available_loot.append('None')
-      cum_weights.append(1.0)
+      # Calculate loot, None if nothing dropped
+      loot: str | None = enemy.loot.draw()
 
-      loot = random.choices(
-        available_loot, cum_weights=cum_weights
-      )
-
-      if loot[0] != 'None':
+      if loot is not None:
         # Get the item
-        ItemClass = getattr(
-          importlib.import_module('core.items'), loot[0]
-        )
-        item = ItemClass()
+        item = ITEMS[loot]
 
         # Add the item to inventory
-        await utils.add_item(
-          self.app, player, loot[0], 1
-        )  # TODO: varible amounts of loot?
+        uow.add_item(loot, 1)  # TODO: varible amounts of loot?
 
       # Update XP and HP
       try:
         # HP
-        new_player = UpdatePlayerModel(stats=player.stats)
-        await update_player(
-          self.app, player.discord_id, new_player
-        )
+        uow.set_stat('hp', player.stats['hp'])
 
         # Then XP
-        levelled_up: int | None = await utils.update_xp(
-          app=self.app,
-          player=player,
-          amount=xp_result,
-        )
+        levelled_up: int | None = uow.update_xp(xp_result)
+
+        await uow.commit()
       except Exception as e:
         raise e
 
-      if loot[0] != 'None':
+      if loot is not None:
         if levelled_up:
           return await interaction.response.send_message(
             f'**{interaction.user.name}** found and killed a {enemy.emoji}{enemy.name.upper()}.\nGained {xp_result} XP and lost {initial_player_hp - player.stats["hp"]} HP. Remaining HP is {player.stats["hp"]}/{player.stats["maxhp"]}:heart:.\nYou level up {levelled_up} times!\nReceived: {item.emoji}{item.name.upper()}.'
@@ -838,11 +803,8 @@ class ActionsCog(commands.Cog):
       # Return HP to 1
       try:
         # HP First
-        player.stats['hp'] = 1
-        new_player = UpdatePlayerModel(stats=player.stats)
-        await update_player(
-          self.app, player.discord_id, new_player
-        )
+        uow.set_stat('hp', 1)
+        await uow.commit()
       except Exception as e:
         raise e
 
@@ -908,40 +870,42 @@ class ActionsCog(commands.Cog):
   @app_commands.command(
     name='use', description='Use an item.'
   )
+  @auto_defer()
+  @player_command()
   async def use(
-    self, interaction: discord.Interaction, item: str
+    self,
+    interaction: discord.Interaction,
+    item: str,
+    player: PlayerModel,
   ):
-    # Get Player from DB
-    try:
-      player: PlayerModel = PlayerModel(
-        **await get_player(
-          self.app, discord_id=interaction.user.id
-        )
-      )
-    except Exception as e:
-      raise e
-
-    # Check for item in inventory
-    item_name = item.replace(' ', '').capitalize()
-
-    if item_name not in player.inventory:
+    # Check for item in inventory, by id or display name
+    found = get_item(item)
+    if found is None or found.key not in (player.inventory or {}):
       return await interaction.response.send_message(
         f'You do not have {item}.'
       )
+    item, item_name = found, found.key
 
-    # Get the item
-    ItemClass = getattr(
-      importlib.import_module('core.items'),
-      item_name,
+    # Remove from inventory and actually use consumable
+    def consume(uow: utils.PlayerUnitOfWork) -> str | None:
+      # Re-checked, the Player may have been reloaded
+      if item_name not in (uow.player.inventory or {}):
+        return None
+      uow.remove_item(item_name, 1)
+      if item.stat == 'hp':
+        return uow.heal(item.amount)
+      return ''
+
+    # Retried if another command changed the Player meanwhile
+    healed = await utils.run_with_retry(
+      self.app, player, consume
     )
-    item = ItemClass()
+    if healed is None:
+      return await interaction.response.send_message(
+        f'You do not have {item.name}.'
+      )
 
-    # Remove from inventory and actually use consumable
-    await utils.remove_item(self.app, player, item_name, 1)
     if item.stat == 'hp':
-      healed = await utils.heal(
-        self.app, player, item.amount
-      )
       return await interaction.response.send_message(
         f'You use {item.emoji}{item.name.upper()}. {healed}'
       )
@@ -4,9 +4,9 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 
-import utility.embeds as embeds
 from core.items import all_armor, all_consumables
-from db.routes import delete_player, list_players
+from db.routes import delete_player
+from utility import buttons, embeds
 
 
 class CommandsCog(commands.Cog):
@@ -158,9 +158,11 @@ class CommandsCog(commands.Cog):
     name='players', description='List all Players.'
   )
   async def list(self, interaction: discord.Interaction):
+    view = buttons.PlayerListPages(self.app)
     await interaction.response.send_message(
-      await list_players(self.app)
+      embed=await view.load_page(), view=view
     )
+    view.response = await interaction.original_response()
 
   # Development utilities
   # Extension Reload
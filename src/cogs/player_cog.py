@@ -5,14 +5,19 @@ from typing import Optional
 import discord
 from discord import app_commands
 from discord.ext import commands
+from fastapi import HTTPException
 from pydantic import ValidationError
 
 import core.titles as titles
 import utility.buttons as buttons
 import utility.embeds as embeds
 import utility.playerClasses as playerClasses
+from db.cache import player_cache
+from db.models.partialPlayerModel import PartialPlayerModel
 from db.models.playerModel import PlayerModel
-from db.routes import add_player, get_player
+from db.routes import get_player, register_player
+from utility.deadline import auto_defer
+from utility.middleware import player_command
 
 
 class PlayerCog(commands.Cog):
@@ -25,15 +30,7 @@ class PlayerCog(commands.Cog):
     name='start', description='Create a Player Profile.'
   )
   async def start(self, interaction: discord.Interaction):
-    # Initialize player
-    player = None
-    try:
-      player = await get_player(
-        self.app, discord_id=interaction.user.id
-      )
-    except Exception:
-      pass
-    if player:
+    if await self._is_registered(interaction.user.id):
       return await interaction.response.send_message(
         'You are already registered!'
       )
@@ -45,41 +42,44 @@ class PlayerCog(commands.Cog):
     view.response = await interaction.original_response()
     await view.wait()
 
-    if view.value == 'a':
-      newPlayer = PlayerModel(
-        discord_id=interaction.user.id,
-        title=titles.PlayerTitles._0,
-        playerClass='Test Class A',
-        stats=playerClasses.defaultStatsA,
-        tokens=100,
-        favor=100,
-        cooldowns=playerClasses.defaultCooldowns,
-        registered_at=datetime.now(),
-      )
-      addedPlayer = await add_player(
-        self.app, player=newPlayer
-      )
-      await interaction.followup.send(
-        f'Added player: {addedPlayer}'
-      )
+    player_class = playerClasses.PLAYER_CLASSES.get(view.value)
+    if player_class is None:
+      return
+    newPlayer = PlayerModel(
+      discord_id=interaction.user.id,
+      title=titles.PlayerTitles._0,
+      playerClass=player_class.name,
+      stats=dict(player_class.stats),
+      tokens=100,
+      favor=100,
+      cooldowns=playerClasses.defaultCooldowns,
+      registered_at=datetime.now(),
+    )
 
-    elif view.value == 'b':
-      newPlayer = PlayerModel(
-        discord_id=interaction.user.id,
-        title=titles.PlayerTitles._0,
-        playerClass='Test Class B',
-        stats=playerClasses.defaultStatsB,
-        tokens=100,
-        favor=100,
-        cooldowns=playerClasses.defaultCooldowns,
-        registered_at=datetime.now(),
-      )
-      addedPlayer = await add_player(
-        self.app, player=newPlayer
+    addedPlayer, created = await register_player(
+      self.app, player=newPlayer
+    )
+    if not created:
+      return await interaction.followup.send(
+        'You are already registered!'
       )
-      await interaction.followup.send(
-        f'Added player: {addedPlayer}'
+    await interaction.followup.send(
+      f'Added player: {addedPlayer}'
+    )
+
+  async def _is_registered(self, discord_id: int) -> bool:
+    # Only a hint, registering is race-free anyway
+    if player_cache.peek(discord_id) is not None:
+      return True
+    try:
+      await get_player(
+        self.app, discord_id=discord_id, fields=['discord_id']
       )
+    except HTTPException as e:
+      if e.status_code != 404:
+        raise
+      return False
+    return True
 
   @start.error
   async def start_error(
@@ -137,6 +137,7 @@ class PlayerCog(commands.Cog):
   @app_commands.describe(
     user="Look at someone else's profile."
   )
+  @auto_defer()
   async def profile(
     self,
     interaction: discord.Interaction,
@@ -145,16 +146,16 @@ class PlayerCog(commands.Cog):
     # Query database for Target player
     if user:
       try:
-        player: PlayerModel = PlayerModel(
-          **await get_player(self.app, discord_id=user.id)
+        player: PlayerModel = PlayerModel.from_db(
+          await get_player(self.app, discord_id=user.id)
         )
       except Exception as e:
         raise e
     # If not given, query for caller
     else:
       try:
-        player: PlayerModel = PlayerModel(
-          **await get_player(
+        player: PlayerModel = PlayerModel.from_db(
+          await get_player(
             self.app, discord_id=interaction.user.id
           )
         )
@@ -227,25 +228,13 @@ class PlayerCog(commands.Cog):
   @app_commands.command(
     name='stats', description='Your full Stats.'
   )
+  @auto_defer()
+  @player_command(fields=['stats'])
   async def stats(
-    self, interaction: discord.Interaction
+    self,
+    interaction: discord.Interaction,
+    player: PartialPlayerModel,
   ) -> None:
-    # Query database for player
-    try:
-      player = PlayerModel(
-        **await get_player(
-          self.app, discord_id=interaction.user.id
-        )
-      )
-    except Exception as e:
-      raise e
-
-    # Player Not Found
-    if not player:
-      return await interaction.response.send_message(
-        embed=embeds.NotRegisteredEmbed()
-      )
-
     # Get discord user to be able to display name and avatar
     discordUser = self.bot.get_user(player.discord_id)
 
@@ -308,19 +297,13 @@ class PlayerCog(commands.Cog):
   @app_commands.command(
     name='inventory', description='Your items.'
   )
+  @auto_defer()
+  @player_command(fields=['inventory'])
   async def inventory(
-    self, interaction: discord.Interaction
+    self,
+    interaction: discord.Interaction,
+    player: PartialPlayerModel,
   ) -> None:
-    # Query database for player
-    try:
-      player = PlayerModel(
-        **await get_player(
-          self.app, discord_id=interaction.user.id
-        )
-      )
-    except Exception:
-      raise
-
     return await interaction.response.send_message(
       embed=embeds.InventoryEmbed(player=player)
     )
@@ -0,0 +1,311 @@
+"""Game content loaded from content packs.
+
+Packs are JSON or TOML files in `CONTENT_DIR`, read in file name
+order. Each may define any of these sections, as lists of tables::
+
+    [[items]]
+    key = 'Rumshot'
+    kind = 'consumable'
+    name = 'Rum Shot'
+    ...
+
+The first load compiles every pack into one pickle in
+`CONTENT_CACHE_DIR`, named after the hash of the pack files. Later
+starts with unchanged packs read that file only, provided it belongs
+to the user running the bot and nobody else can write it.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import tomllib
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Bump when the compiled layout or validation changes, so old caches
+# are ignored
+FORMAT_VERSION = 3
+
+CONTENT_DIR = Path(
+  os.getenv(
+    'CONTENT_DIR', Path(__file__).resolve().parent.parent / 'content'
+  )
+)
+CONTENT_CACHE_DIR = Path(
+  os.getenv('CONTENT_CACHE_DIR', CONTENT_DIR / '.cache')
+)
+
+# Field order of compiled rows per section, and which are required
+SECTIONS: dict[str, tuple[tuple[str, ...], tuple[str, ...]]] = {
+  'items': (
+    (
+      'key',
+      'kind',
+      'name',
+      'emoji',
+      'description',
+      'value',
+      'stat',
+      'amount',
+      'type',
+      'bonuses',
+    ),
+    ('key', 'kind', 'name', 'emoji', 'description', 'value'),
+  ),
+  'mobs': (
+    ('key', 'name', 'emoji', 'description', 'drops', 'hp', 'atk'),
+    ('key', 'name', 'emoji', 'description', 'drops', 'hp', 'atk'),
+  ),
+  'player_classes': (
+    ('key', 'name', 'stats'),
+    ('key', 'name', 'stats'),
+  ),
+  'quiz': (
+    ('question', 'choices', 'answer'),
+    ('question', 'choices', 'answer'),
+  ),
+}
+# Fields each item kind needs on top of the common ones
+ITEM_KINDS = {
+  'consumable': ('stat', 'amount'),
+  'armor': ('type', 'amount', 'bonuses'),
+}
+
+
+class ContentError(ValueError):
+  """A content pack is malformed or refers to missing content."""
+
+
+class Record:
+  """Base class for read-only content records.
+
+  Subclasses list their fields in `__slots__`. Records are shared by
+  every command, so attributes cannot be set after `__init__`.
+  """
+
+  __slots__ = ()
+
+  def __init__(self, **values) -> None:
+    for name, value in values.items():
+      object.__setattr__(self, name, value)
+
+  def __setattr__(self, name: str, value) -> None:
+    raise AttributeError(
+      f'{type(self).__name__} records are shared and cannot be '
+      'changed'
+    )
+
+  def __repr__(self) -> str:
+    key = getattr(self, 'key', None)
+    return f'<{type(self).__name__} {key!r}>'
+
+
+class Content:
+  """Compiled content, one tuple of rows per section.
+
+  Rows hold the fields listed in `SECTIONS`, in that order, and a
+  row's position is its integer id.
+
+  Args:
+      digest (str): Hash of the packs this was compiled from.
+      sections (dict[str, tuple[tuple, ...]]): Rows per section.
+  """
+
+  __slots__ = ('digest', 'sections')
+
+  def __init__(
+    self, digest: str, sections: dict[str, tuple[tuple, ...]]
+  ) -> None:
+    self.digest = digest
+    self.sections = sections
+
+  def rows(self, section: str) -> tuple[tuple, ...]:
+    return self.sections.get(section, ())
+
+
+def _pack_files(content_dir: Path) -> list[Path]:
+  return sorted(
+    path
+    for path in content_dir.iterdir()
+    if path.suffix in ('.json', '.toml')
+  )
+
+
+def _digest(files: list[Path]) -> str:
+  digest = hashlib.sha256(str(FORMAT_VERSION).encode())
+  for path in files:
+    digest.update(path.name.encode())
+    digest.update(path.read_bytes())
+  return digest.hexdigest()
+
+
+def _read(path: Path) -> dict:
+  try:
+    if path.suffix == '.toml':
+      with path.open('rb') as f:
+        return tomllib.load(f)
+    with path.open('rb') as f:
+      return json.load(f)
+  except (json.JSONDecodeError, tomllib.TOMLDecodeError) as e:
+    raise ContentError(f'{path.name}: {e}') from e
+
+
+def _check(path: Path, section: str, entry: dict) -> None:
+  fields, required = SECTIONS[section]
+  if section == 'items':
+    if entry.get('kind') not in ITEM_KINDS:
+      raise ContentError(
+        f'{path.name}: item {entry.get("key")!r} has unknown kind '
+        f'{entry.get("kind")!r}'
+      )
+    required = (*required, *ITEM_KINDS[entry['kind']])
+  missing = [field for field in required if field not in entry]
+  unknown = set(entry) - set(fields)
+  if missing or unknown:
+    raise ContentError(
+      f'{path.name}: {section} entry {entry.get("key", entry)!r} '
+      f'missing {missing}, unknown {sorted(unknown)}'
+    )
+  if section == 'mobs':
+    _check_drops(path, entry)
+
+
+def _check_drops(path: Path, mob: dict) -> None:
+  drops = mob['drops']
+  if not isinstance(drops, dict):
+    raise ContentError(
+      f'{path.name}: mob {mob["key"]!r} drops must be a table of '
+      f'item keys to chances, got {drops!r}'
+    )
+  for item, chance in drops.items():
+    if isinstance(chance, bool) or not isinstance(
+      chance, (int, float)
+    ):
+      raise ContentError(
+        f'{path.name}: mob {mob["key"]!r} drops.{item} must be a '
+        f'number, got {chance!r}'
+      )
+  # Drop chances are cumulative, whatever is left drops nothing
+  chances = [0, *drops.values(), 1]
+  if any(a > b for a, b in itertools.pairwise(chances)):
+    raise ContentError(
+      f'{path.name}: mob {mob["key"]!r} drop chances must be '
+      'cumulative, between 0 and 1'
+    )
+
+
+def _trusted(path: Path) -> bool:
+  # Unpickling runs code, so only read what this user wrote and
+  # nobody else can change
+  stat = path.stat()
+  if hasattr(os, 'getuid') and stat.st_uid != os.getuid():
+    return False
+  return not stat.st_mode & 0o022
+
+
+def compile_packs(
+  files: list[Path],
+) -> dict[str, tuple[tuple, ...]]:
+  """Reads and validates content packs.
+
+  Args:
+      files (list[Path]): Pack files, later ones may add but not redefine content.
+
+  Raises:
+      ContentError: A pack is malformed, repeats a key or drops an unknown item.
+
+  Returns:
+      dict[str, tuple[tuple, ...]]: Rows per section, see `SECTIONS`.
+  """
+  entries: dict[str, list[dict]] = {
+    section: [] for section in SECTIONS
+  }
+  for path in files:
+    for section, values in _read(path).items():
+      if section not in SECTIONS:
+        raise ContentError(
+          f'{path.name}: unknown section {section!r}'
+        )
+      for entry in values:
+        _check(path, section, entry)
+        entries[section].append(entry)
+
+  for section, values in entries.items():
+    if section == 'quiz':
+      continue
+    keys = [entry['key'] for entry in values]
+    if duplicates := {key for key in keys if keys.count(key) > 1}:
+      raise ContentError(
+        f'{section} defined more than once: {sorted(duplicates)}'
+      )
+
+  item_keys = {entry['key'] for entry in entries['items']}
+  for mob in entries['mobs']:
+    if unknown := set(mob['drops']) - item_keys:
+      raise ContentError(
+        f'Mob {mob["key"]!r} drops unknown items {sorted(unknown)}'
+      )
+
+  return {
+    section: tuple(
+      tuple(entry.get(field) for field in SECTIONS[section][0])
+      for entry in values
+    )
+    for section, values in entries.items()
+  }
+
+
+def load_content(
+  content_dir: Path = CONTENT_DIR,
+  cache_dir: Path = CONTENT_CACHE_DIR,
+) -> Content:
+  """Loads compiled content, compiling the packs if they changed.
+
+  Args:
+      content_dir (Path, optional): Directory holding the packs. Defaults to `CONTENT_DIR`.
+      cache_dir (Path, optional): Directory for compiled packs. Defaults to `CONTENT_CACHE_DIR`.
+
+  Raises:
+      ContentError: A pack is invalid, see `compile_packs`.
+
+  Returns:
+      Content: Rows per section.
+  """
+  files = _pack_files(content_dir)
+  digest = _digest(files)
+  cached = cache_dir / f'{digest}.pickle'
+  try:
+    if _trusted(cached):
+      with cached.open('rb') as f:
+        return Content(digest, pickle.load(f))
+    print(
+      f'Ignoring {cached}, it may have been written by another user.'
+    )
+  except (OSError, pickle.UnpicklingError, EOFError):
+    pass
+
+  sections = compile_packs(files)
+  try:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    partial = cached.with_suffix('.tmp')
+    with partial.open('wb') as f:
+      pickle.dump(sections, f, protocol=pickle.HIGHEST_PROTOCOL)
+    # Whatever the umask, so the next start trusts it
+    partial.chmod(0o644)
+    os.replace(partial, cached)
+    # Only the latest compile is ever read
+    for old in cache_dir.glob('*.pickle'):
+      if old != cached:
+        old.unlink(missing_ok=True)
+  except OSError as e:
+    # Read-only deployments just compile on every start
+    print(f'Could not cache compiled content: {e}')
+  return Content(digest, sections)
+
+
+content = load_content()
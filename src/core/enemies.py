@@ -1,99 +1,96 @@
-class Enemy:
-  def __init__(
-    self,
-    name: str,
-    emoji: str,
-    description: str,
-    drops: dict[str, float],
-  ) -> None:
-    """Base class for all enemies.
-
-    Args:
-        name (str): Enemy's name.
-        emoji (str): Enemy's emoji representation.
-        description (str): Enemy's description.
-        drops (dict[str, float]): Dictionary of potential loot drops and probabilities.
-    """
-    self.name = name
-    self.emoji = emoji
-    self.description = description
-    self.drops = drops
+from types import MappingProxyType
+
+from core.content import Record, content
+from core.sampling import AliasSampler
+
+
+class Enemy(Record):
+  """Base class for all enemies.
+
+  Enemies are read-only templates shared by every fight against
+  them, anything that changes during a fight lives in its state
+  record instead.
+
+  Args:
+      id (int): Position of the enemy in the content packs.
+      key (str): Canonical enemy id, e.g. as used in `HUNT_MOBS`.
+      name (str): Enemy's name.
+      emoji (str): Enemy's emoji representation.
+      description (str): Enemy's description.
+      drops (Mapping[str, float]): Potential loot drops by item id and their cumulative probabilities.
+      loot (AliasSampler[str | None]): Draws an item id from `drops`, None for no drop.
+  """
+
+  __slots__ = (
+    'description',
+    'drops',
+    'emoji',
+    'id',
+    'key',
+    'loot',
+    'name',
+  )
 
 
 class Mob(Enemy):
-  """Base class for mobs. Mobs only get one turn to either die or kill the Player."""
-
-  def __init__(
-    self,
-    name: str,
-    emoji: str,
-    description: str,
-    drops: dict[str, float],
-    hp: int,
-    atk: int,
-  ) -> None:
-    super().__init__(name, emoji, description, drops)
-    self.hp = hp
-    self.atk = atk
-
-
-class Redvelvet(Mob):
-  def __init__(self) -> None:
-    super().__init__(
-      name='Cursed Red Velvet Cake',
-      emoji=':cake:',
-      description='Oops, looks like someone forgot to grease the pan!',
-      drops={
-        'Rumshot': 0.1,
-        'Rumbottle': 0.12,
-        'Sprinkles': 0.32,
-        'Cakecrumbs': 0.52,
-      },
-      hp=8,
-      atk=2,
-    )
-
-
-class RedvelvetCupcake(Mob):
-  def __init__(self) -> None:
-    super().__init__(
-      name='Cursed Red Velvet Cupcake',
-      emoji=':cupcake:',
-      description='Just like a Cursed Red Velvet Cake... but smaller.',
-      drops={
-        'Rumshot': 0.05,
-        'Rumbottle': 0.06,
-        'Sprinkles': 0.16,
-        'Cakecrumbs': 0.2,
-      },
-      hp=4,
-      atk=1,
-    )
-
-
-class Bundt(Mob):
-  def __init__(self) -> None:
-    super().__init__(
-      name='Holeless Bundt Cake',
-      emoji=':pudding:',
-      description='It has no hole, and it must EAT.',
-      drops={
-        'Rumshot': 0.15,
-        'Rumbottle': 0.18,
-        'Cakecrumbs': 0.25,
-      },
-      hp=10,
-      atk=3,
-    )
-
-
-class CinnamonRoll(Mob):
-  def __init__(self) -> None:
-    super().__init__(
-      name='Suspicious Cinnamon Roll',
-      emoji=':waffle:',
-      description='Just a normal cinnamon roll, covered in "frosting", nothing to see here.',
-      drops={'Rumshot': 0.08, 'Rumbottle': 0.1},
-      hp=5,
-      atk=3,
-    )
+  """Base class for mobs. Mobs only get one turn to either die or kill the Player.
+
+  Args:
+      hp (int): HP at the start of a fight.
+      atk (int): Attack.
+  """
+
+  __slots__ = ('atk', 'hp')
+
+  def spawn(self) -> 'MobState':
+    """Starts a fight against this mob.
+
+    Returns:
+        MobState: Fresh state for one fight.
+    """
+    return MobState(self)
+
+
+class MobState:
+  """What changes about a mob during one fight.
+
+  Args:
+      mob (Mob): Template the fight is against.
+  """
+
+  __slots__ = ('hp', 'mob')
+
+  def __init__(self, mob: Mob) -> None:
+    self.mob = mob
+    self.hp = mob.hp
+
+
+# region Registry
+
+
+def _build(id: int, row: tuple) -> Mob:
+  key, name, emoji, description, drops, hp, atk = row
+  return Mob(
+    id=id,
+    key=key,
+    name=name,
+    emoji=emoji,
+    description=description,
+    drops=MappingProxyType(drops),
+    loot=AliasSampler.from_cumulative(
+      list(drops), list(drops.values()), total=1.0
+    ),
+    hp=hp,
+    atk=atk,
+  )
+
+
+# Every mob in content pack order, indexed by integer id
+MOBS: tuple[Mob, ...] = tuple(
+  _build(id, row) for id, row in enumerate(content.rows('mobs'))
+)
+
+# Every enemy template by canonical id
+ENEMIES: dict[str, Enemy] = {mob.key: mob for mob in MOBS}
+
+# endregion
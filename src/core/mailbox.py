@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import AsyncExitStack, asynccontextmanager
+
+
+class _Slot:
+  # Lock for one Player, dropped once nobody holds or waits on it
+  __slots__ = ('lock', 'owner', 'users', 'waiting')
+
+  def __init__(self) -> None:
+    self.lock = asyncio.Lock()
+    self.owner: asyncio.Task | None = None
+    self.users = 0
+    self.waiting = 0
+
+
+class PlayerMailbox:
+  """Serialises writes to each Player without blocking other Players.
+
+  Every Discord id gets a lock the first time it is used, which is
+  dropped again when idle. A task that already holds a Player's
+  lock can hold it again, so helpers that lock may call each other.
+
+  Args:
+      clock (Callable[[], float], optional): Time source. Defaults to time.monotonic.
+  """
+
+  def __init__(
+    self, clock: Callable[[], float] = time.monotonic
+  ) -> None:
+    self._clock = clock
+    self._slots: dict[int, _Slot] = {}
+    self.acquired = 0
+    self.contended = 0
+    self.max_depth = 0
+    self.total_wait = 0.0
+    self.max_wait = 0.0
+
+  def __len__(self) -> int:
+    return len(self._slots)
+
+  @asynccontextmanager
+  async def hold(self, discord_id: int) -> AsyncIterator[None]:
+    """Holds a Player's lock for the duration of the block.
+
+    Args:
+        discord_id (int): Player's Discord id.
+    """
+    task = asyncio.current_task()
+    slot = self._slots.get(discord_id)
+    if slot is not None and slot.owner is task:
+      # Already held by this command
+      yield
+      return
+
+    if slot is None:
+      slot = self._slots[discord_id] = _Slot()
+    slot.users += 1
+    try:
+      await self._acquire(slot)
+    except BaseException:
+      self._release_user(discord_id, slot)
+      raise
+
+    slot.owner = task
+    try:
+      yield
+    finally:
+      slot.owner = None
+      slot.lock.release()
+      self._release_user(discord_id, slot)
+
+  @asynccontextmanager
+  async def hold_many(self, *discord_ids: int) -> AsyncIterator[None]:
+    """Holds several Players' locks, e.g. both sides of a duel.
+
+    Locks are taken in Discord id order so two commands locking the
+    same Players cannot deadlock.
+
+    Args:
+        *discord_ids (int): Discord ids of the Players.
+    """
+    async with AsyncExitStack() as stack:
+      for discord_id in sorted(set(discord_ids)):
+        await stack.enter_async_context(self.hold(discord_id))
+      yield
+
+  async def _acquire(self, slot: _Slot) -> None:
+    self.acquired += 1
+    if not slot.lock.locked():
+      await slot.lock.acquire()
+      return
+
+    self.contended += 1
+    slot.waiting += 1
+    self.max_depth = max(self.max_depth, slot.waiting)
+    start = self._clock()
+    try:
+      await slot.lock.acquire()
+    finally:
+      slot.waiting -= 1
+      waited = self._clock() - start
+      self.total_wait += waited
+      self.max_wait = max(self.max_wait, waited)
+
+  def _release_user(self, discord_id: int, slot: _Slot) -> None:
+    slot.users -= 1
+    if slot.users == 0 and self._slots.get(discord_id) is slot:
+      del self._slots[discord_id]
+
+  def stats(self) -> dict:
+    """Returns counters for lock contention between commands."""
+    return {
+      'players': len(self._slots),
+      'waiting': sum(s.waiting for s in self._slots.values()),
+      'acquired': self.acquired,
+      'contended': self.contended,
+      'max_depth': self.max_depth,
+      'avg_wait': self.total_wait / self.contended
+      if self.contended
+      else 0.0,
+      'max_wait': self.max_wait,
+    }
+
+
+player_mailbox = PlayerMailbox()
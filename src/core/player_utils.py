@@ -1,38 +1,423 @@
+import copy
+from collections.abc import Callable
 from datetime import datetime, timezone
+from typing import Any, Self, TypeVar
 
+from fastapi import HTTPException
+
+from core.mailbox import player_mailbox
+from db.models.playerDeltaModel import (
+  PlayerBatchDeltaModel,
+  PlayerDeltaModel,
+)
 from db.models.playerModel import PlayerModel
 from db.models.updatePlayerModel import UpdatePlayerModel
-from db.routes import update_player
+from db.outage import outage_log
+from db.routes import (
+  bulk_patch_players,
+  get_player,
+  get_players,
+  patch_player,
+)
+from db.write_behind import write_behind
+from utility.tracing import traced
+
+T = TypeVar('T')
+
+# region Unit of Work
+
+
+class PlayerUnitOfWork:
+  """Collects changes to a single Player and writes them in one update.
+
+  Commands mutate the Player through the methods below, which update
+  the in-memory `PlayerModel` and record the matching field-level
+  delta, then call `commit` (or leave the `async with` block) to
+  issue a single `find_one_and_update`. Commits for the same Player
+  are serialised through `player_mailbox`, which `player_command`
+  holds from loading the Player until its changes are committed.
+
+  Args:
+      app: FastAPI app holding the `players` collection.
+      player (PlayerModel): Player being modified.
+      check_version (bool, optional): Fail with a 409 if the Player was written since it was loaded. Defaults to False.
+  """
+
+  def __init__(
+    self, app, player: PlayerModel, *, check_version: bool = False
+  ) -> None:
+    self.app = app
+    self.player = player
+    self.check_version = check_version
+    self._inc: dict[str, int | float] = {}
+    self._set: dict[str, Any] = {}
+    self._unset: set[str] = set()
+
+  async def __aenter__(self) -> Self:
+    return self
+
+  async def __aexit__(self, exc_type, exc, tb) -> None:
+    # Only persist if the command finished without raising
+    if exc_type is None:
+      await self.commit()
+
+  @property
+  def dirty(self) -> bool:
+    """bool: Whether there are changes waiting to be committed."""
+    return bool(self._inc or self._set or self._unset)
+
+  # region Delta tracking
+  def _parent_set(self, path: str) -> str | None:
+    # A whole sub-document may already be replaced by $set
+    parent = path.split('.', 1)[0]
+    if parent != path and parent in self._set:
+      return parent
+    return None
+
+  def _refresh_parent(self, parent: str) -> None:
+    self._set[parent] = copy.deepcopy(
+      getattr(self.player, parent)
+    )
+
+  def _forget(self, path: str) -> None:
+    # Drop pending changes to a path and anything below it
+    prefix = f'{path}.'
+    for changes in (self._inc, self._set):
+      for key in [
+        k for k in changes if k == path or k.startswith(prefix)
+      ]:
+        del changes[key]
+    self._unset = {
+      key
+      for key in self._unset
+      if key != path and not key.startswith(prefix)
+    }
+
+  def _inc_path(self, path: str, amount: float) -> None:
+    if parent := self._parent_set(path):
+      self._refresh_parent(parent)
+    elif path in self._set:
+      self._set[path] += amount
+    elif path in self._unset:
+      # Removed earlier in this command, so the new value is absolute
+      self._set_path(path, amount)
+    else:
+      self._inc[path] = self._inc.get(path, 0) + amount
+
+  def _set_path(self, path: str, value: Any) -> None:
+    if parent := self._parent_set(path):
+      self._refresh_parent(parent)
+      return
+    self._forget(path)
+    self._set[path] = value
+
+  def _unset_path(self, path: str) -> None:
+    if parent := self._parent_set(path):
+      self._refresh_parent(parent)
+      return
+    self._forget(path)
+    self._unset.add(path)
+
+  # endregion
+
+  def to_delta(self) -> PlayerDeltaModel:
+    """Builds the delta for all changes recorded so far.
+
+    Returns:
+        PlayerDeltaModel: `$inc`/`$set`/`$unset` paths to apply.
+    """
+    return PlayerDeltaModel(
+      inc=dict(self._inc) or None,
+      set=dict(self._set) or None,
+      unset=sorted(self._unset) or None,
+    )
+
+  def clear(self) -> None:
+    self._inc.clear()
+    self._set.clear()
+    self._unset.clear()
+
+  @traced()
+  async def commit(self) -> dict | None:
+    """Writes all pending changes in a single update.
+
+    Raises:
+        HTTPException: Player was changed since it was loaded, only with `check_version`.
+
+    Returns:
+        dict | None: Updated Player record, None if nothing changed or the change was buffered.
+    """
+    if not self.dirty:
+      return None
+
+    delta = self.to_delta()
+    if (
+      write_behind.enabled
+      and not self.check_version
+      and not outage_log.pending
+      and write_behind.accepts(delta)
+    ):
+      # Counters only, written later in bulk. Reads count them as
+      # one version on until then, as does the write landing them
+      if not write_behind.buffers(self.player.discord_id):
+        self.player.version += 1
+      await write_behind.add(self.player.discord_id, delta)
+      self.clear()
+      return None
+
+    async with player_mailbox.hold(self.player.discord_id):
+      updated = await patch_player(
+        self.app,
+        discord_id=self.player.discord_id,
+        delta=delta,
+        expected_version=self.player.version
+        if self.check_version
+        else None,
+      )
+    self.player.version = updated['version']
+    self.clear()
+    return updated
+
+  # region Cooldowns
+  def start_cooldown(self, cmd: str) -> None:
+    self.player.cooldowns[cmd] = datetime.now(
+      tz=timezone.utc
+    ).timestamp()
+    self._set_path(
+      f'cooldowns.{cmd}', self.player.cooldowns[cmd]
+    )
+
+  def remove_cooldown(self, cmd: str) -> None:
+    self.player.cooldowns[cmd] = None
+    self._set_path(f'cooldowns.{cmd}', None)
+
+  # endregion
+
+  # region XP/Levels
+  def update_xp(self, amount: int) -> int | None:
+    """Adds XP to the Player, levelling up if required.
+
+    Args:
+        amount (int): XP to add, can be negative.
+
+    Returns:
+        int | None: Number of levels gained, None if no level up.
+    """
+    stats = self.player.stats
+    stats['currentxp'] += amount
+    if stats['currentxp'] < 0:
+      stats['currentxp'] = 0
+      self._set_path('stats.currentxp', 0)
+      return None
+    if stats['currentxp'] < stats['requiredxp']:
+      # No need to level up
+      self._inc_path('stats.currentxp', amount)
+      return None
+
+    count = level_up(self.player)[1]
+    for stat in ('currentxp', 'level', 'requiredxp'):
+      self._set_path(f'stats.{stat}', stats[stat])
+    return count
+
+  # endregion
+
+  # region Favor/Tokens
+  def update_favor(self, amount: int) -> None:
+    self.player.favor += amount
+    self._inc_path('favor', amount)
+
+  # endregion
+
+  # region Inventory
+  def add_item(self, item: str, amount: int) -> None:
+    if self.player.inventory is None:
+      # Create the inventory dict with the item given
+      self.player.inventory = {item: amount}
+      self._set_path('inventory', {item: amount})
+      return
+
+    if item in self.player.inventory:
+      self.player.inventory[item] += amount
+    else:
+      self.player.inventory[item] = amount
+    self._inc_path(f'inventory.{item}', amount)
+
+  def remove_item(self, item: str, amount: int) -> None:
+    self.player.inventory[item] -= amount
+
+    # Remove from inventory fully if none left
+    if self.player.inventory[item] <= 0:
+      del self.player.inventory[item]
+      self._unset_path(f'inventory.{item}')
+    else:
+      self._inc_path(f'inventory.{item}', -amount)
+
+  # endregion
+
+  # region Stats
+  def set_stat(self, stat: str, value: int) -> None:
+    self.player.stats[stat] = value
+    self._set_path(f'stats.{stat}', value)
+
+  def heal(self, amount: int) -> str:
+    """Heals the Player without going over max HP.
+
+    Args:
+        amount (int): HP to restore.
+
+    Returns:
+        str: Message describing the result.
+    """
+    self.player.stats['hp'] = self.player.stats['hp'] + amount
+    if self.player.stats['hp'] > self.player.stats['maxhp']:
+      self.set_stat('hp', self.player.stats['maxhp'])
+      return 'Your health is fully restored.'
+
+    self.set_stat('hp', self.player.stats['hp'])
+
+    return f'You have healed {amount} HP. Your HP is now {self.player.stats["hp"]}/{self.player.stats["maxhp"]}.'
+
+  # endregion
+
+
+@traced()
+async def commit_all(*uows: PlayerUnitOfWork) -> None:
+  """Commits several units of work, e.g. both sides of a duel.
+
+  Changes to more than one Player are sent as a single unordered
+  `bulk_write`, so multi-player commands cost one round trip. Those
+  are only written while every Player is at the version it was
+  loaded at, as the batch cannot be retried per Player.
+
+  Args:
+      *uows (PlayerUnitOfWork): Units of work to commit.
+
+  Raises:
+      HTTPException: A Player was changed since it was loaded (409).
+  """
+  pending = [uow for uow in uows if uow.dirty]
+  if len(pending) <= 1 or (
+    write_behind.enabled
+    and all(write_behind.accepts(uow.to_delta()) for uow in pending)
+  ):
+    for uow in pending:
+      await uow.commit()
+    return
+
+  async with player_mailbox.hold_many(
+    *(uow.player.discord_id for uow in pending)
+  ):
+    result = await bulk_patch_players(
+      pending[0].app,
+      updates=[
+        PlayerBatchDeltaModel(
+          discord_id=uow.player.discord_id,
+          delta=uow.to_delta(),
+          expected_version=uow.player.version,
+        )
+        for uow in pending
+      ],
+    )
+  for uow in pending:
+    uow.player.version = result['versions'][uow.player.discord_id]
+    uow.clear()
+
+
+@traced()
+async def run_with_retry(
+  app,
+  player: PlayerModel,
+  change: Callable[[PlayerUnitOfWork], T],
+  attempts: int = 3,
+) -> T:
+  """Applies a change to a Player without losing concurrent writes.
+
+  The change is committed only if the Player is still at the version
+  it was loaded at. Otherwise the Player is reloaded and the change
+  is run again on the fresh copy, so it must not have side effects
+  other than mutating the unit of work.
+
+  Args:
+      player (PlayerModel): Player as loaded by the command.
+      change (Callable[[PlayerUnitOfWork], T]): Mutates the Player through the unit of work.
+      attempts (int, optional): Tries before giving up. Defaults to 3.
+
+  Raises:
+      HTTPException: The Player kept changing for every attempt (409).
+
+  Returns:
+      T: Whatever `change` returned on the attempt that was committed.
+  """
+  # Holding the Player means only other processes can conflict
+  async with player_mailbox.hold(player.discord_id):
+    for attempt in range(attempts):
+      uow = PlayerUnitOfWork(app, player, check_version=True)
+      result = change(uow)
+      try:
+        await uow.commit()
+        return result
+      except HTTPException as e:
+        if e.status_code != 409 or attempt == attempts - 1:
+          raise
+      player = PlayerModel.from_db(
+        await get_player(app, discord_id=player.discord_id)
+      )
+
+
+# endregion
+
+# region Loading
+
+
+@traced()
+async def fetch_players(
+  app, *discord_ids: int
+) -> list[PlayerModel | None]:
+  """Loads several Players with a single database query.
+
+  Args:
+      *discord_ids (int): Discord ids of the Players to load.
+
+  Returns:
+      list[PlayerModel | None]: Players in the order given, None for any that are not registered.
+  """
+  found = {
+    player['discord_id']: player
+    for player in (
+      await get_players(app, discord_ids=list(discord_ids))
+    )['players']
+  }
+  return [
+    PlayerModel.from_db(found[i]) if i in found else None
+    for i in discord_ids
+  ]
+
+
+# endregion
 
 # region Cooldowns
 
 
+@traced()
 async def start_cooldown(
   app, player: PlayerModel, cmd: str
 ) -> None:
-  cooldowns = player.cooldowns
-  cooldowns[cmd] = datetime.now(tz=timezone.utc).timestamp()
-
-  new_player = UpdatePlayerModel(cooldowns=cooldowns)
+  uow = PlayerUnitOfWork(app, player)
+  uow.start_cooldown(cmd)
   try:
-    await update_player(
-      app, discord_id=player.discord_id, player=new_player
-    )
+    await uow.commit()
   except Exception as e:
     return e
 
 
+@traced()
 async def remove_cooldown(
   app, player: PlayerModel, cmd: str
 ) -> None:
-  cooldowns = player.cooldowns
-  cooldowns[cmd] = None
-
-  new_player = UpdatePlayerModel(cooldowns=cooldowns)
+  uow = PlayerUnitOfWork(app, player)
+  uow.remove_cooldown(cmd)
   try:
-    await update_player(
-      app, discord_id=player.discord_id, player=new_player
-    )
+    await uow.commit()
   except Exception as e:
     return e
 
@@ -42,6 +427,7 @@ async def remove_cooldown(
 # region XP/Levels
 
 
+@traced()
 def level_up(
   player: PlayerModel,
 ) -> list[UpdatePlayerModel, int]:
@@ -62,37 +448,17 @@ def level_up(
   return [new_player, count]
 
 
+@traced()
 async def update_xp(
   app, player: PlayerModel, amount: int
 ) -> int:
-  player.stats['currentxp'] += amount
-  if player.stats['currentxp'] < 0:
-    player.stats['currentxp'] = 0
-  if (
-    player.stats['currentxp'] >= player.stats['requiredxp']
-  ):
-    leveldata = level_up(player)
-
-    try:
-      await update_player(
-        app,
-        discord_id=player.discord_id,
-        player=leveldata[0],
-      )
-      return leveldata[1]
-    except Exception as e:
-      return e
-  else:
-    # No need to level up
-    new_player = UpdatePlayerModel(stats=player.stats)
-
-    try:
-      await update_player(
-        app, discord_id=player.discord_id, player=new_player
-      )
-      return None
-    except Exception as e:
-      return e
+  uow = PlayerUnitOfWork(app, player)
+  levelled_up = uow.update_xp(amount)
+  try:
+    await uow.commit()
+    return levelled_up
+  except Exception as e:
+    return e
 
 
 # endregion
@@ -100,16 +466,14 @@ async def update_xp(
 # region Favor/Tokens
 
 
+@traced()
 async def update_favor(
   app, player: PlayerModel, amount: int
 ) -> None:
-  new_player = UpdatePlayerModel(
-    favor=(player.favor + amount)
-  )
+  uow = PlayerUnitOfWork(app, player)
+  uow.update_favor(amount)
   try:
-    await update_player(
-      app, discord_id=player.discord_id, player=new_player
-    )
+    await uow.commit()
   except Exception as e:
     return e
 
@@ -119,46 +483,26 @@ async def update_favor(
 # region Inventory
 
 
+@traced()
 async def add_item(
   app, player: PlayerModel, item: str, amount: int
 ) -> None:
-  inventory = player.inventory
-
-  if inventory is None:
-    # Create the inventory dict with the item given
-    inventory = {item: amount}
-  else:
-    # Check it item exists
-    if item in inventory:
-      inventory[item] += amount
-    else:
-      inventory[item] = amount
-
-  new_player = UpdatePlayerModel(inventory=inventory)
+  uow = PlayerUnitOfWork(app, player)
+  uow.add_item(item, amount)
   try:
-    await update_player(
-      app, discord_id=player.discord_id, player=new_player
-    )
+    await uow.commit()
   except Exception as e:
     return e
 
 
+@traced()
 async def remove_item(
   app, player: PlayerModel, item: str, amount: int
 ) -> None:
-  inventory = player.inventory
-
-  inventory[item] -= amount
-
-  # Remove from inventory fully if none left
-  if inventory[item] <= 0:
-    del inventory[item]
-
-  new_player = UpdatePlayerModel(inventory=inventory)
+  uow = PlayerUnitOfWork(app, player)
+  uow.remove_item(item, amount)
   try:
-    await update_player(
-      app, discord_id=player.discord_id, player=new_player
-    )
+    await uow.commit()
   except Exception as e:
     return e
 
@@ -166,28 +510,14 @@ async def remove_item(
 # endregion
 
 
+@traced()
 async def heal(
   app, player: PlayerModel, amount: int
 ) -> str:
-  player.stats['hp'] = player.stats['hp'] + amount
-  if player.stats['hp'] > player.stats['maxhp']:
-    player.stats['hp'] = player.stats['maxhp']
-    new_player = UpdatePlayerModel(stats=player.stats)
-    try:
-      await update_player(
-        app, discord_id=player.discord_id, player=new_player
-      )
-      return 'Your health is fully restored.'
-    except Exception as e:
-      return e
-
-  else:
-    new_player = UpdatePlayerModel(stats=player.stats)
-    try:
-      await update_player(
-        app, discord_id=player.discord_id, player=new_player
-      )
-
-      return f'You have healed {amount} HP. Your HP is now {player.stats["hp"]}/{player.stats["maxhp"]}.'
-    except Exception as e:
-      return e
+  uow = PlayerUnitOfWork(app, player)
+  healed = uow.heal(amount)
+  try:
+    await uow.commit()
+    return healed
+  except Exception as e:
+    return e
@@ -0,0 +1,137 @@
+import math
+import random
+from collections.abc import Sequence
+from typing import Generic, TypeVar
+
+T = TypeVar('T')
+
+
+class AliasSampler(Generic[T]):
+  """Draws from a fixed weighted table in constant time (Walker's alias method).
+
+  The table is checked and prepared once, each draw then costs one
+  random number and two list lookups whatever the table size.
+
+  Args:
+      outcomes (Sequence[T]): Possible results.
+      weights (Sequence[float]): Relative weight of each outcome, need not sum to 1.
+
+  Raises:
+      ValueError: The table is empty, lengths differ, a weight is negative or not finite, or all weights are 0.
+  """
+
+  __slots__ = ('_alias', '_n', '_prob', 'outcomes')
+
+  def __init__(
+    self, outcomes: Sequence[T], weights: Sequence[float]
+  ) -> None:
+    if not outcomes:
+      raise ValueError('Cannot sample from an empty table')
+    if len(outcomes) != len(weights):
+      raise ValueError(
+        f'{len(outcomes)} outcomes but {len(weights)} weights'
+      )
+    for outcome, weight in zip(outcomes, weights):
+      if not math.isfinite(weight) or weight < 0:
+        raise ValueError(f'Invalid weight {weight!r} for {outcome!r}')
+    total = math.fsum(weights)
+    if total <= 0:
+      raise ValueError('At least one weight must be positive')
+
+    n = len(outcomes)
+    scaled = [weight * n / total for weight in weights]
+    prob = [1.0] * n
+    alias = list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+      less, more = small.pop(), large.pop()
+      prob[less] = scaled[less]
+      alias[less] = more
+      scaled[more] += scaled[less] - 1.0
+      (small if scaled[more] < 1.0 else large).append(more)
+    # Whatever is left is 1 up to rounding error
+
+    self.outcomes = tuple(outcomes)
+    self._n = n
+    self._prob = prob
+    self._alias = alias
+
+  @classmethod
+  def from_cumulative(
+    cls,
+    outcomes: Sequence[T],
+    cum_weights: Sequence[float],
+    total: float | None = None,
+    rest: T | None = None,
+  ) -> 'AliasSampler[T]':
+    """Builds a sampler from cumulative weights, as taken by `random.choices`.
+
+    Args:
+        outcomes (Sequence[T]): Possible results.
+        cum_weights (Sequence[float]): Running totals of the weights.
+        total (float | None, optional): Full range, the gap above the last cumulative weight draws `rest`. Defaults to None.
+        rest (T | None, optional): Outcome for the gap up to `total`. Defaults to None.
+
+    Raises:
+        ValueError: Cumulative weights decrease or exceed `total`.
+
+    Returns:
+        AliasSampler[T]: Sampler with the same distribution.
+    """
+    weights = []
+    previous = 0.0
+    for outcome, cumulative in zip(outcomes, cum_weights):
+      if cumulative < previous:
+        raise ValueError(
+          f'Cumulative weight for {outcome!r} is below the one '
+          'before it'
+        )
+      weights.append(cumulative - previous)
+      previous = cumulative
+    outcomes = list(outcomes)
+    if total is not None:
+      if previous > total:
+        raise ValueError(
+          f'Cumulative weights reach {previous}, above {total}'
+        )
+      outcomes.append(rest)
+      weights.append(total - previous)
+    return cls(outcomes, weights)
+
+  def draw(self, rng: random.Random = random) -> T:
+    """Draws one outcome.
+
+    Args:
+        rng (random.Random, optional): Random source. Defaults to the `random` module.
+
+    Returns:
+        T: The outcome drawn.
+    """
+    u = rng.random() * self._n
+    # Rounding can land exactly on n
+    i = min(int(u), self._n - 1)
+    if u - i < self._prob[i]:
+      return self.outcomes[i]
+    return self.outcomes[self._alias[i]]
+
+  def draws(self, k: int, rng: random.Random = random) -> list[T]:
+    """Draws `k` outcomes with replacement.
+
+    Args:
+        k (int): Number of draws.
+        rng (random.Random, optional): Random source. Defaults to the `random` module.
+
+    Returns:
+        list[T]: The outcomes drawn, in order.
+    """
+    rand, n = rng.random, self._n
+    prob, alias, outcomes = self._prob, self._alias, self.outcomes
+    result = []
+    for _ in range(k):
+      u = rand() * n
+      i = min(int(u), n - 1)
+      result.append(
+        outcomes[i] if u - i < prob[i] else outcomes[alias[i]]
+      )
+    return result
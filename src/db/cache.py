@@ -0,0 +1,242 @@
+import asyncio
+import copy
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+from dotenv import load_dotenv
+
+from utility.metrics import registry
+
+load_dotenv()
+
+cache_hits = registry.counter(
+  'planephobia_player_cache_hits_total',
+  'Player lookups served from the cache.',
+)
+cache_misses = registry.counter(
+  'planephobia_player_cache_misses_total',
+  'Player lookups that went to the database.',
+)
+cache_evictions = registry.counter(
+  'planephobia_player_cache_evictions_total',
+  'Players evicted from a full cache.',
+)
+
+
+class PlayerCache:
+  """In-process read-through cache for Player records.
+
+  Entries expire after `ttl` seconds and the least recently used
+  entry is evicted once `max_size` is reached. Concurrent loads for
+  the same Discord id share a single database query.
+
+  Args:
+      max_size (int, optional): Maximum number of cached Players. Defaults to 1024.
+      ttl (float, optional): Seconds an entry stays valid. Defaults to 60.
+      clock (Callable[[], float], optional): Time source. Defaults to time.monotonic.
+  """
+
+  def __init__(
+    self,
+    max_size: int = 1024,
+    ttl: float = 60.0,
+    clock: Callable[[], float] = time.monotonic,
+  ) -> None:
+    self.max_size = max_size
+    self.ttl = ttl
+    self._clock = clock
+    self._entries: OrderedDict[int, tuple[float, dict]] = (
+      OrderedDict()
+    )
+    self._loading: dict[int, asyncio.Future] = {}
+    self.hits = 0
+    self.misses = 0
+    self.coalesced = 0
+    self.evictions = 0
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def peek(self, discord_id: int) -> dict | None:
+    """Returns a cached Player without touching counters or LRU order.
+
+    Args:
+        discord_id (int): Player's Discord id.
+
+    Returns:
+        dict | None: Copy of the cached record, None if absent or expired.
+    """
+    entry = self._entries.get(discord_id)
+    if entry is None or entry[0] <= self._clock():
+      return None
+    return copy.deepcopy(entry[1])
+
+  def get(self, discord_id: int) -> dict | None:
+    """Returns a cached Player, counting the hit or miss.
+
+    Args:
+        discord_id (int): Player's Discord id.
+
+    Returns:
+        dict | None: Copy of the cached record, None on a miss.
+    """
+    if (player := self._lookup(discord_id)) is not None:
+      self._hit()
+      return player
+    self._miss()
+    return None
+
+  def _hit(self) -> None:
+    self.hits += 1
+    cache_hits.labels().inc()
+
+  def _miss(self) -> None:
+    self.misses += 1
+    cache_misses.labels().inc()
+
+  def _lookup(self, discord_id: int) -> dict | None:
+    entry = self._entries.get(discord_id)
+    if entry is not None and entry[0] > self._clock():
+      self._entries.move_to_end(discord_id)
+      return copy.deepcopy(entry[1])
+    # Expired entries stay until reloaded or evicted, see `stale`
+    return None
+
+  def stale(self, discord_id: int) -> dict | None:
+    """Returns a cached Player even if expired, for when the DB is down.
+
+    Args:
+        discord_id (int): Player's Discord id.
+
+    Returns:
+        dict | None: Copy of the cached record, None if never cached or evicted.
+    """
+    entry = self._entries.get(discord_id)
+    if entry is None:
+      return None
+    return copy.deepcopy(entry[1])
+
+  def put(self, discord_id: int, player: dict) -> None:
+    """Stores a Player record, evicting the oldest entry if full.
+
+    Args:
+        discord_id (int): Player's Discord id.
+        player (dict): Player record as stored in MongoDB.
+    """
+    # A write supersedes whatever an in-flight load returns
+    self._loading.pop(discord_id, None)
+    self._entries[discord_id] = (
+      self._clock() + self.ttl,
+      copy.deepcopy(player),
+    )
+    self._entries.move_to_end(discord_id)
+    while len(self._entries) > self.max_size:
+      self._entries.popitem(last=False)
+      self.evictions += 1
+      cache_evictions.labels().inc()
+
+  def modify(
+    self, discord_id: int, change: Callable[[dict], object]
+  ) -> None:
+    """Changes a cached Player in place, if it is cached.
+
+    Args:
+        discord_id (int): Player's Discord id.
+        change (Callable[[dict], object]): Mutates the cached record.
+    """
+    # An in-flight load may predate the change
+    self._loading.pop(discord_id, None)
+    entry = self._entries.get(discord_id)
+    if entry is not None:
+      change(entry[1])
+
+  def invalidate(self, discord_id: int) -> None:
+    self._loading.pop(discord_id, None)
+    self._entries.pop(discord_id, None)
+
+  def clear(self) -> None:
+    self._loading.clear()
+    self._entries.clear()
+
+  async def get_or_load(
+    self,
+    discord_id: int,
+    loader: Callable[[], Awaitable[dict | None]],
+  ) -> dict | None:
+    """Returns a cached Player or loads it, sharing in-flight loads.
+
+    Args:
+        discord_id (int): Player's Discord id.
+        loader (Callable[[], Awaitable[dict | None]]): Fetches the record from the database.
+
+    Returns:
+        dict | None: Copy of the Player record, None if it does not exist.
+    """
+    if (player := self._lookup(discord_id)) is not None:
+      self._hit()
+      return player
+
+    loop = asyncio.get_running_loop()
+    pending = self._loading.get(discord_id)
+    if pending is not None and pending.get_loop() is loop:
+      self.coalesced += 1
+      player = await asyncio.shield(pending)
+      return copy.deepcopy(player)
+
+    self._miss()
+    future = loop.create_future()
+    self._loading[discord_id] = future
+    try:
+      player = await loader()
+    except BaseException as e:
+      if isinstance(e, Exception):
+        future.set_exception(e)
+        # Mark as retrieved in case nobody else was waiting
+        future.exception()
+      else:
+        future.cancel()
+      if self._loading.get(discord_id) is future:
+        del self._loading[discord_id]
+      raise
+
+    future.set_result(player)
+    # Only cache if no write happened while loading
+    if self._loading.get(discord_id) is future:
+      del self._loading[discord_id]
+      if player is not None:
+        self.put(discord_id, player)
+    return copy.deepcopy(player)
+
+  def stats(self) -> dict:
+    """Returns counters used to size the cache."""
+    lookups = self.hits + self.misses + self.coalesced
+    return {
+      'size': len(self._entries),
+      'max_size': self.max_size,
+      'ttl': self.ttl,
+      'hits': self.hits,
+      'misses': self.misses,
+      'coalesced': self.coalesced,
+      'evictions': self.evictions,
+      'hit_rate': self.hits / lookups if lookups else 0.0,
+    }
+
+
+player_cache = PlayerCache(
+  max_size=int(os.getenv('PLAYER_CACHE_SIZE', '1024')),
+  ttl=float(os.getenv('PLAYER_CACHE_TTL', '60')),
+)
+
+# Derived from the cache's state, read on each scrape
+registry.gauge(
+  'planephobia_player_cache_size',
+  'Players currently cached.',
+  lambda: len(player_cache),
+)
+registry.gauge(
+  'planephobia_player_cache_hit_rate',
+  'Share of Player lookups served from the cache.',
+  lambda: player_cache.stats()['hit_rate'],
+)
@@ -0,0 +1,121 @@
+import os
+import time
+from collections.abc import Callable
+from typing import Self
+
+from dotenv import load_dotenv
+from pymongo.errors import ConnectionFailure, ExecutionTimeout
+
+load_dotenv()
+
+# Errors meaning the DB could not be reached or did not answer in time
+UNAVAILABLE_ERRORS = (ConnectionFailure, ExecutionTimeout)
+
+
+class DatabaseUnavailable(Exception):
+  """Raised instead of waiting on a database that is known to be down."""
+
+
+class CircuitBreaker:
+  """Stops sending queries to MongoDB after repeated connection failures.
+
+  Wrap each query in `async with db_circuit:`. After
+  `failure_threshold` failures in a row the circuit opens and blocks
+  immediately raise `DatabaseUnavailable`. After `reset_timeout`
+  seconds a single query is let through, and if it succeeds the
+  circuit closes again.
+
+  Args:
+      failure_threshold (int, optional): Failures in a row that open the circuit. Defaults to 5.
+      reset_timeout (float, optional): Seconds before a trial query. Defaults to 30.
+      clock (Callable[[], float], optional): Time source. Defaults to time.monotonic.
+  """
+
+  def __init__(
+    self,
+    failure_threshold: int = 5,
+    reset_timeout: float = 30.0,
+    clock: Callable[[], float] = time.monotonic,
+  ) -> None:
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self._clock = clock
+    self._failures = 0
+    self._opened_at: float | None = None
+    self._trial = False
+    self.opened = 0
+    self.rejected = 0
+
+  @property
+  def state(self) -> str:
+    if self._opened_at is None:
+      return 'closed'
+    if self._trial:
+      return 'half_open'
+    return 'open'
+
+  def allow(self) -> bool:
+    """Whether a query may be sent, starting a trial if one is due."""
+    if self._opened_at is None:
+      return True
+    if (
+      not self._trial
+      and self._clock() - self._opened_at >= self.reset_timeout
+    ):
+      self._trial = True
+      return True
+    return False
+
+  def record_success(self) -> None:
+    self._failures = 0
+    self._trial = False
+    if self._opened_at is not None:
+      self._opened_at = None
+      print('Database reachable again, closing circuit.')
+
+  def record_failure(self) -> None:
+    self._failures += 1
+    if self._trial or (
+      self._opened_at is None
+      and self._failures >= self.failure_threshold
+    ):
+      if self._opened_at is None:
+        print('Database unreachable, opening circuit.')
+      self._opened_at = self._clock()
+      self._trial = False
+      self.opened += 1
+
+  async def __aenter__(self) -> Self:
+    if not self.allow():
+      self.rejected += 1
+      raise DatabaseUnavailable('Database circuit is open')
+    return self
+
+  async def __aexit__(self, exc_type, exc, tb) -> None:
+    if isinstance(exc, DatabaseUnavailable):
+      # Already counted by an inner block
+      return
+    if exc_type is None or issubclass(exc_type, Exception):
+      if isinstance(exc, UNAVAILABLE_ERRORS):
+        self.record_failure()
+        raise DatabaseUnavailable(str(exc)) from exc
+      # Any other answer means the database is up
+      self.record_success()
+    else:
+      # Cancelled, the trial (if any) can be retried
+      self._trial = False
+
+  def stats(self) -> dict:
+    """Returns the circuit state and how often it blocked queries."""
+    return {
+      'state': self.state,
+      'failures': self._failures,
+      'opened': self.opened,
+      'rejected': self.rejected,
+    }
+
+
+db_circuit = CircuitBreaker(
+  failure_threshold=int(os.getenv('DB_CIRCUIT_FAILURES', '5')),
+  reset_timeout=float(os.getenv('DB_CIRCUIT_RESET', '30')),
+)
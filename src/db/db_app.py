@@ -5,25 +5,87 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 from motor import motor_asyncio
 
+from db.indexes import check_query_plans, ensure_indexes
+from db.monitoring import command_monitor
+from db.outage import outage_log
+from db.pool import POOL_OPTIONS, health_probe, pool_monitor
 from db.routes import router
+from db.status_routes import router as status_router
+from db.write_behind import WRITE_BEHIND, write_behind
 
 # Get db connection details from env variables
 load_dotenv()
 ATLAS_URI = os.getenv('ATLAS_URI')
+# Explain route queries on start and fail if any is unindexed
+DB_DIAGNOSTICS = os.getenv('DB_DIAGNOSTICS', '').lower() in (
+  '1',
+  'true',
+  'yes',
+)
 
 
 # Db setup
 async def connectToDB():
   """Connects to Database.
 
+  Pool size and timeouts come from `POOL_OPTIONS`, so a slow or
+  unreachable database fails commands within seconds.
+
   Returns:
       AsyncIOMotorClient: New connection to single MongoDB instance.
   """
-  client = motor_asyncio.AsyncIOMotorClient(ATLAS_URI)
+  client = motor_asyncio.AsyncIOMotorClient(
+    ATLAS_URI,
+    event_listeners=[pool_monitor, command_monitor],
+    **POOL_OPTIONS,
+  )
   print(client)
   return client
 
 
+async def open_database(app) -> None:
+  """Connects to the DB and attaches the players collection to `app`.
+
+  Runs on whichever event loop calls it, which then owns the Motor
+  client. Used by `lifespan` and by the Bot when the API is run as a
+  separate process.
+
+  Args:
+      app: Object the `db` and `players` handles are attached to.
+  """
+  app.client = await connectToDB()
+  app.db = app.client.get_database('testing_apiv2')
+  app.players = app.db.get_collection('players')
+  # Pay for TLS and pool setup now rather than on the first command
+  rtt = await health_probe.ping(app)
+  print(f'Connected to database, ping {1000 * rtt:.1f}ms.')
+
+  build_time = await ensure_indexes(app.players)
+  print(f'Ensured player indexes in {build_time:.3f}s.')
+  if DB_DIAGNOSTICS:
+    plans = await check_query_plans(app.players)
+    print(f'Query plans: {plans}')
+  # Replay writes journalled while the DB was down
+  await outage_log.start(app)
+  if WRITE_BEHIND:
+    await write_behind.start(app)
+  health_probe.start(app)
+
+
+async def close_database(app) -> None:
+  """Closes the connection opened by `open_database`.
+
+  Args:
+      app: Object holding the Motor client.
+  """
+  await health_probe.stop()
+  # Buffered counters must be written while still connected
+  await write_behind.stop()
+  await outage_log.stop()
+  print('Shutting down db connection.')
+  app.client.close()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
   """Context manager to ensure connection to DB is ended.
@@ -31,13 +93,12 @@ async def lifespan(app: FastAPI):
   Args:
       app (FastAPI): FastAPI entry point.
   """
-  client = await connectToDB()
-  app.db = client.get_database('testing_apiv2')
-  app.players = app.db.get_collection('players')
-  print('Connected to database.')
+  await open_database(app)
   yield
-  print('Shutting down db connection.')
+  await close_database(app)
 
 
 app = FastAPI(lifespan=lifespan)
+# Status routes go first so they are not shadowed by /{id}
+app.include_router(status_router)
 app.include_router(router)
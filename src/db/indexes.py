@@ -0,0 +1,106 @@
+import time
+
+from pymongo import ASCENDING, IndexModel
+
+from db.queries import (
+  PLAYER_ORDER,
+  by_discord_id,
+  by_discord_ids,
+  by_version,
+  page_after,
+)
+
+# Indexes the players collection must have
+PLAYER_INDEXES = [
+  # Every route looks Players up by Discord id
+  IndexModel(
+    [('discord_id', ASCENDING)],
+    name='discord_id_unique',
+    unique=True,
+  ),
+]
+# Indexes no route queries, dropped so writes stop maintaining them
+RETIRED_INDEXES = ('leaderboard', 'registered_at')
+
+# Queries issued by `db.routes`, built with the same helpers and
+# checked in diagnostics mode
+ROUTE_QUERIES = {
+  'list_players': {'filter': page_after(0), 'sort': PLAYER_ORDER},
+  'stream_players': {
+    'filter': page_after(None),
+    'sort': PLAYER_ORDER,
+  },
+  'register_player': {'filter': by_discord_id(0)},
+  'get_player': {'filter': by_discord_id(0)},
+  'get_players': {'filter': by_discord_ids([0])},
+  'update_player': {'filter': by_version(0, 1)},
+  'patch_player': {'filter': by_version(0, 0)},
+  'bulk_patch_players': {'filter': by_discord_id(0)},
+  'delete_player': {'filter': by_discord_id(0)},
+}
+
+
+async def ensure_indexes(collection) -> float:
+  """Creates any missing indexes on the players collection.
+
+  Existing indexes with the same definition are left untouched, so this
+  is cheap to run on every start. Retired indexes are dropped.
+
+  Args:
+      collection (AsyncIOMotorCollection): The players collection.
+
+  Returns:
+      float: Seconds spent creating indexes.
+  """
+  start = time.perf_counter()
+  await collection.create_indexes(PLAYER_INDEXES)
+  existing = await collection.index_information()
+  for name in RETIRED_INDEXES:
+    if name in existing:
+      await collection.drop_index(name)
+  return time.perf_counter() - start
+
+
+def _plan_stages(plan) -> list[str]:
+  # Collect every 'stage' in a nested explain plan
+  stages = []
+  if isinstance(plan, dict):
+    if 'stage' in plan:
+      stages.append(plan['stage'])
+    for value in plan.values():
+      stages.extend(_plan_stages(value))
+  elif isinstance(plan, list):
+    for value in plan:
+      stages.extend(_plan_stages(value))
+  return stages
+
+
+async def check_query_plans(collection) -> dict[str, list[str]]:
+  """Explains every route query and fails if any would scan the collection.
+
+  Args:
+      collection (AsyncIOMotorCollection): The players collection.
+
+  Raises:
+      RuntimeError: One or more queries would run without an index.
+
+  Returns:
+      dict[str, list[str]]: Winning plan stages for each route query.
+  """
+  plans = {}
+  unindexed = []
+  for route, query in ROUTE_QUERIES.items():
+    cursor = collection.find(query['filter'])
+    if 'sort' in query:
+      cursor = cursor.sort(query['sort'])
+    explain = await cursor.explain()
+    stages = _plan_stages(explain['queryPlanner']['winningPlan'])
+    plans[route] = stages
+    if 'COLLSCAN' in stages:
+      unindexed.append(route)
+
+  if unindexed:
+    raise RuntimeError(
+      f'Queries without an index: {", ".join(unindexed)}'
+    )
+  return plans
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+
+
+class Journal:
+  """Append-only file of JSON records that survives crashes.
+
+  `append` returns once the record is on disk. Appends made while an
+  fsync is pending share it, so bursts of writes cost one fsync per
+  `sync_delay` instead of one each.
+
+  Args:
+      path (str): File the records are appended to.
+      sync_delay (float, optional): Seconds to gather appends before an fsync. Defaults to 0.005.
+  """
+
+  def __init__(self, path: str, sync_delay: float = 0.005) -> None:
+    self.path = path
+    self.sync_delay = sync_delay
+    # Raw descriptor, so each record is a single appending write
+    self._fd: int | None = None
+    self._written = 0
+    self._synced = 0
+    self._syncing: asyncio.Future | None = None
+    self.syncs = 0
+
+  def open(self) -> None:
+    self._fd = os.open(
+      self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+    )
+
+  def close(self) -> None:
+    if self._fd is not None:
+      if self._synced < self._written:
+        os.fsync(self._fd)
+        self._synced = self._written
+      os.close(self._fd)
+      self._fd = None
+
+  async def append(self, record: dict) -> None:
+    """Appends a record and waits until it is fsynced.
+
+    Args:
+        record (dict): JSON-serialisable record.
+    """
+    os.write(self._fd, (json.dumps(record) + '\n').encode('utf-8'))
+    self._written += 1
+    target = self._written
+    while self._synced < target:
+      if self._syncing is not None:
+        await asyncio.shield(self._syncing)
+        continue
+      self._syncing = asyncio.get_running_loop().create_future()
+      try:
+        await asyncio.sleep(self.sync_delay)
+        # Covers every record written up to now
+        upto, fd = self._written, self._fd
+        # Closed meanwhile, which syncs it anyway
+        if fd is not None:
+          try:
+            await asyncio.to_thread(os.fsync, fd)
+          except OSError:
+            if fd == self._fd:
+              raise
+        self._synced = max(self._synced, upto)
+        self.syncs += 1
+      finally:
+        self._syncing.set_result(None)
+        self._syncing = None
+
+  def read(self) -> list[dict]:
+    """Returns every record in the order it was appended."""
+    if not os.path.exists(self.path):
+      return []
+    with open(self.path, encoding='utf-8') as journal:
+      return [json.loads(line) for line in journal if line.strip()]
+
+  def rewrite(self, records: list[dict]) -> None:
+    """Replaces the journal with `records`, e.g. after a partial replay.
+
+    Args:
+        records (list[dict]): Records to keep.
+    """
+    reopen = self._fd is not None
+    self.close()
+    temp_path = f'{self.path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as journal:
+      journal.writelines(
+        json.dumps(record) + '\n' for record in records
+      )
+      journal.flush()
+      os.fsync(journal.fileno())
+    os.replace(temp_path, self.path)
+    if reopen:
+      self.open()
+
+  def rotate(self, path: str) -> 'Journal':
+    """Moves the current records to `path` and starts an empty journal.
+
+    Args:
+        path (str): Where the current records are moved.
+
+    Returns:
+        Journal: Journal holding the moved records.
+    """
+    self.close()
+    if os.path.exists(self.path):
+      os.replace(self.path, path)
+    self.open()
+    return Journal(path, self.sync_delay)
+
+  def remove(self) -> None:
+    self.close()
+    if os.path.exists(self.path):
+      os.remove(self.path)
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from db.models.playerModel import (
+  PlayerModel,
+  PyObjectId,
+  construct_trusted,
+)
+
+# Fields that can be requested in a projection
+PROJECTABLE_FIELDS = (set(PlayerModel.model_fields) - {'id'}) | {
+  '_id'
+}
+
+
+class PartialPlayerModel(BaseModel):
+  """Container for a projected Player record.
+
+  Mirrors `PlayerModel` with every field optional, so reads that only
+  fetch a few fields can still be validated.
+
+  Args:
+      BaseModel: Pydantic base model.
+  """
+
+  id: PyObjectId | None = Field(alias='_id', default=None)
+  discord_id: int | None = None
+  title: str | None = None
+  playerClass: str | None = None
+  stats: dict[str, int] | None = None
+  tokens: int | None = None
+  favor: int | None = None
+  inventory: dict[str, int] | None = None
+  cooldowns: dict[str, float | None] | None = None
+  registered_at: datetime | None = None
+  version: int | None = None
+  model_config = ConfigDict(
+    populate_by_name=True,
+    arbitrary_types_allowed=True,
+    json_schema_extra={
+      'example': {
+        'discord_id': 123456789987654321,
+        'cooldowns': {
+          'worship': 15443.1,
+          'duel': 1204.0,
+          'hunt': 400.1,
+        },
+      }
+    },
+  )
+
+  @classmethod
+  def from_db(cls, document: dict) -> 'PartialPlayerModel':
+    """Builds a projected Player from a MongoDB document without re-validating it.
+
+    Args:
+        document (dict): Projected Player record as returned by MongoDB.
+
+    Returns:
+        PartialPlayerModel: Player built from the document.
+    """
+    values = {name: document.get(key) for name, key in PARTIAL_KEYS}
+    if values['id'] is not None:
+      values['id'] = str(values['id'])
+    return construct_trusted(
+      cls,
+      values,
+      {name for name, key in PARTIAL_KEYS if key in document},
+    )
+
+
+# (field name, MongoDB key) for every field of a projected Player
+PARTIAL_KEYS = tuple(
+  (name, field.alias or name)
+  for name, field in PartialPlayerModel.model_fields.items()
+)
@@ -6,6 +6,10 @@ from db.models.playerModel import PlayerModel
 
 
 class PlayerCollection(BaseModel):
-  """A container holding a list of `PlayerModel` instances to avoid top-level array JSON vulnerability."""
+  """A container holding a list of `PlayerModel` instances to avoid top-level array JSON vulnerability.
+
+  `next_after` is the cursor for the following page, None on the last page.
+  """
 
   players: List[PlayerModel]
+  next_after: int | None = None
@@ -0,0 +1,220 @@
+from typing import Any, get_args, get_origin
+
+from pydantic import (
+  BaseModel,
+  ConfigDict,
+  TypeAdapter,
+  ValidationError,
+  model_validator,
+)
+
+from db.models.playerModel import PlayerModel
+
+# Top-level Player fields that may be targeted by a delta
+DELTA_FIELDS = {
+  'title',
+  'playerClass',
+  'stats',
+  'tokens',
+  'favor',
+  'inventory',
+  'cooldowns',
+}
+# Numeric fields `inc` may target, directly or one level down
+INC_FIELDS = {'tokens', 'favor'}
+INC_PARENTS = {'stats', 'inventory'}
+
+
+def _value_type(annotation: Any) -> Any:
+  # Type of the values of a dict field, e.g. int for dict[str, int]
+  for option in (annotation, *get_args(annotation)):
+    if get_origin(option) is dict:
+      return get_args(option)[1]
+  return None
+
+
+# Checks values written with `set` to a whole field
+FIELD_TYPES = {
+  field: TypeAdapter(PlayerModel.model_fields[field].annotation)
+  for field in DELTA_FIELDS
+}
+# Checks values written with `set` inside a dict field
+VALUE_TYPES = {
+  field: TypeAdapter(value_type)
+  for field in DELTA_FIELDS
+  if (
+    value_type := _value_type(
+      PlayerModel.model_fields[field].annotation
+    )
+  )
+  is not None
+}
+
+
+class PlayerDeltaModel(BaseModel):
+  """Container for a field-level update to an existing Player record.
+
+  Keys are MongoDB dotted paths, e.g. `stats.currentxp` or
+  `inventory.Rumshot`, so only the touched values are sent. A path
+  is a field or one key inside a dict field. It may appear once, and
+  not inside another path of the same delta, as MongoDB rejects such
+  updates. Values in `set` must match the Player field they replace.
+
+  Args:
+      BaseModel: Pydantic base model.
+  """
+
+  inc: dict[str, int | float] | None = None
+  set: dict[str, Any] | None = None
+  unset: list[str] | None = None
+  model_config = ConfigDict(
+    json_schema_extra={
+      'example': {
+        'inc': {
+          'stats.currentxp': 40,
+          'inventory.Rumshot': 1,
+        },
+        'set': {'cooldowns.hunt': 1718000000.0},
+        'unset': ['inventory.Sprinkles'],
+      }
+    },
+  )
+
+  @model_validator(mode='after')
+  def check_paths(self) -> 'PlayerDeltaModel':
+    for path in self.paths():
+      field, *keys = path.split('.')
+      if field not in DELTA_FIELDS or len(keys) > 1:
+        raise ValueError(f'Field {path} cannot be updated')
+      # Positional operators and empty keys are not Player fields
+      if keys and (
+        field not in VALUE_TYPES
+        or not keys[0]
+        or keys[0].startswith('$')
+      ):
+        raise ValueError(f'Field {path} cannot be updated')
+    for path, value in (self.set or {}).items():
+      field, *keys = path.split('.')
+      adapter = VALUE_TYPES[field] if keys else FIELD_TYPES[field]
+      try:
+        self.set[path] = adapter.validate_python(value)
+      except ValidationError as e:
+        raise ValueError(
+          f'Invalid value for {path}: {e.errors()[0]["msg"]}'
+        ) from e
+    for path in self.inc or {}:
+      parent, _, key = path.partition('.')
+      if path not in INC_FIELDS and not (
+        parent in INC_PARENTS and key and '.' not in key
+      ):
+        raise ValueError(f'Field {path} is not a number')
+
+    paths = set()
+    for path in self.paths():
+      if path in paths:
+        raise ValueError(f'Field {path} is updated more than once')
+      paths.add(path)
+    for path in paths:
+      parts = path.split('.')
+      for end in range(1, len(parts)):
+        if (parent := '.'.join(parts[:end])) in paths:
+          raise ValueError(f'Fields {parent} and {path} overlap')
+    return self
+
+  def paths(self) -> list[str]:
+    """Returns every path touched by the delta."""
+    return [
+      *(self.inc or {}),
+      *(self.set or {}),
+      *(self.unset or []),
+    ]
+
+  def is_empty(self) -> bool:
+    return not (self.inc or self.set or self.unset)
+
+  def to_mongo(self) -> dict:
+    """Builds the MongoDB update document for this delta.
+
+    Returns:
+        dict: Update document using `$inc`, `$set` and `$unset`.
+    """
+    update = {}
+    if self.inc:
+      update['$inc'] = dict(self.inc)
+    if self.set:
+      update['$set'] = dict(self.set)
+    if self.unset:
+      update['$unset'] = {path: '' for path in self.unset}
+    return update
+
+  def apply_to(self, document: dict) -> dict:
+    """Applies the delta to a Player record in place, as MongoDB would.
+
+    Args:
+        document (dict): Player record to modify.
+
+    Returns:
+        dict: The modified record.
+    """
+    return apply_update(document, self.to_mongo())
+
+
+class PlayerBatchDeltaModel(BaseModel):
+  """Container for one Player's delta within a batch update.
+
+  Args:
+      BaseModel: Pydantic base model.
+  """
+
+  discord_id: int
+  delta: PlayerDeltaModel
+  # Only apply if the stored Player is still at this version
+  expected_version: int | None = None
+
+
+def versioned(update: dict) -> dict:
+  """Adds the `version` increment every Player write carries.
+
+  Args:
+      update (dict): MongoDB update document, modified in place.
+
+  Returns:
+      dict: The update document.
+  """
+  update.setdefault('$inc', {})['version'] = 1
+  return update
+
+
+def apply_update(document: dict, update: dict) -> dict:
+  """Applies a MongoDB update document to a Player record in place.
+
+  Only `$inc`, `$set` and `$unset` are supported, which is all the
+  Player routes write.
+
+  Args:
+      document (dict): Player record to modify.
+      update (dict): MongoDB update document.
+
+  Returns:
+      dict: The modified record.
+  """
+  for path, amount in update.get('$inc', {}).items():
+    parent, key = _resolve(document, path)
+    parent[key] = parent.get(key, 0) + amount
+  for path, value in update.get('$set', {}).items():
+    parent, key = _resolve(document, path)
+    parent[key] = value
+  for path in update.get('$unset', {}):
+    parent, key = _resolve(document, path)
+    parent.pop(key, None)
+  return document
+
+
+def _resolve(document: dict, path: str) -> tuple[dict, str]:
+  # Walk a dotted path, creating sub-documents that do not exist yet
+  *parents, key = path.split('.')
+  for parent in parents:
+    if document.get(parent) is None:
+      document[parent] = {}
+    document = document[parent]
+  return document, key
@@ -59,6 +59,8 @@ class PlayerModel(BaseModel):
     }
   )
   registered_at: datetime = Field(...)
+  # Incremented on every write, used for compare-and-swap updates
+  version: int = Field(default=0)
   model_config = ConfigDict(
     populate_by_name=True,
     arbitrary_types_allowed=True,
@@ -92,10 +94,38 @@ class PlayerModel(BaseModel):
           'hunt': 400.1,
         },
         'registered_at': datetime.now(),
+        'version': 3,
       }
     },
   )
 
+  @classmethod
+  def from_db(cls, document: dict) -> 'PlayerModel':
+    """Builds a Player from a MongoDB document without re-validating it.
+
+    Documents we wrote ourselves already match the schema, so validation
+    is skipped. Documents missing any field fall back to full validation,
+    except `version`, which documents from before versioning lack.
+    HTTP routes keep validating through their `response_model`.
+
+    Args:
+        document (dict): Player record as returned by MongoDB.
+
+    Returns:
+        PlayerModel: Player built from the document.
+    """
+    if 'version' not in document:
+      document = {**document, 'version': 0}
+    try:
+      values = {
+        name: document[key] for name, key in DOCUMENT_KEYS
+      }
+    except KeyError:
+      return cls(**document)
+
+    values['id'] = str(values['id'])
+    return construct_trusted(cls, values, set(values))
+
   def calculate_xp_gauss(
     self, m_multiplier: int, s_multiplier: int
   ) -> int:
@@ -141,3 +171,36 @@ class PlayerModel(BaseModel):
               seconds,
             )
           } of cooldown remaining'
+
+
+# (field name, MongoDB key) for every field of a stored Player
+DOCUMENT_KEYS = tuple(
+  (name, field.alias or name)
+  for name, field in PlayerModel.model_fields.items()
+)
+
+
+def construct_trusted(
+  cls: type[BaseModel], values: dict, fields_set: set[str]
+) -> BaseModel:
+  """Creates a model instance from already valid values.
+
+  Does the same as `model_construct` without its per-field default
+  handling, which makes it cheaper than validation.
+
+  Args:
+      cls (type[BaseModel]): Model to create.
+      values (dict): Value for every field of the model.
+      fields_set (set[str]): Fields that were explicitly provided.
+
+  Returns:
+      BaseModel: The new instance.
+  """
+  model = cls.__new__(cls)
+  object.__setattr__(model, '__dict__', values)
+  object.__setattr__(
+    model, '__pydantic_fields_set__', fields_set
+  )
+  object.__setattr__(model, '__pydantic_extra__', None)
+  object.__setattr__(model, '__pydantic_private__', None)
+  return model
@@ -0,0 +1,133 @@
+import os
+from collections import defaultdict
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+from fastapi import Request
+from pymongo import monitoring
+
+from utility.metrics import Histogram, registry
+
+load_dotenv()
+
+# Commands slower than this are printed with their filter shape
+SLOW_OP_MS = float(os.getenv('DB_SLOW_MS', '100'))
+
+# Slash command or route the current task is serving. Motor runs
+# queries on executor threads with a copy of the caller's context,
+# so the listener below sees the value set by the caller.
+current_caller: ContextVar[str] = ContextVar(
+  'current_caller', default='internal'
+)
+
+
+def _shape(value):
+  # Keep keys and operators, hide the values
+  if isinstance(value, dict):
+    return {key: _shape(v) for key, v in value.items()}
+  if isinstance(value, list):
+    return [_shape(value[0])] if value else []
+  return '?'
+
+
+db_command_seconds = registry.histogram(
+  'planephobia_db_command_seconds',
+  'MongoDB command latency in seconds.',
+  ('command',),
+)
+db_command_failures = registry.counter(
+  'planephobia_db_command_failures_total',
+  'MongoDB commands that returned an error.',
+  ('command',),
+)
+
+
+def _filter_of(command_name: str, command: dict):
+  if command_name in ('find', 'count'):
+    return command.get('filter', command.get('query'))
+  if command_name == 'findAndModify':
+    return command.get('query')
+  if command_name in ('update', 'delete'):
+    statements = command.get(f'{command_name}s') or [{}]
+    return statements[0].get('q')
+  if command_name == 'aggregate':
+    return command.get('pipeline')
+  return None
+
+
+class CommandMonitor(monitoring.CommandListener):
+  """Records MongoDB command latency per operation and per caller.
+
+  Commands are attributed to `current_caller`. Commands slower than
+  `slow_ms` are printed with the shape of their filter.
+
+  Args:
+      slow_ms (float, optional): Threshold for printing a command. Defaults to 100.
+  """
+
+  def __init__(self, slow_ms: float = 100.0) -> None:
+    self.slow_ms = slow_ms
+    self.by_op: defaultdict[str, Histogram] = defaultdict(Histogram)
+    self.by_caller: defaultdict[str, defaultdict[str, Histogram]] = (
+      defaultdict(lambda: defaultdict(Histogram))
+    )
+    self.failures: defaultdict[str, int] = defaultdict(int)
+    self.slow = 0
+    self._started: dict[tuple, tuple[str, object]] = {}
+
+  def _key(self, event) -> tuple:
+    return (event.connection_id, event.request_id)
+
+  def started(self, event) -> None:
+    self._started[self._key(event)] = (
+      current_caller.get(),
+      _filter_of(event.command_name, event.command),
+    )
+
+  def succeeded(self, event) -> None:
+    self._record(event)
+
+  def failed(self, event) -> None:
+    self.failures[event.command_name] += 1
+    db_command_failures.labels(event.command_name).inc()
+    self._record(event)
+
+  def _record(self, event) -> None:
+    caller, query = self._started.pop(
+      self._key(event), ('unknown', None)
+    )
+    seconds = event.duration_micros / 1e6
+    self.by_op[event.command_name].observe(seconds)
+    self.by_caller[caller][event.command_name].observe(seconds)
+    db_command_seconds.labels(event.command_name).observe(seconds)
+    if seconds * 1000 >= self.slow_ms:
+      self.slow += 1
+      print(
+        f'Slow {event.command_name} ({seconds * 1000:.1f}ms) '
+        f'from {caller}: {_shape(query)}'
+      )
+
+  def stats(self) -> dict:
+    """Returns latency summaries per operation and per caller."""
+    return {
+      'slow_ms': self.slow_ms,
+      'slow': self.slow,
+      'failures': dict(self.failures),
+      'operations': {
+        op: hist.summary() for op, hist in self.by_op.items()
+      },
+      'callers': {
+        caller: {op: hist.summary() for op, hist in ops.items()}
+        for caller, ops in self.by_caller.items()
+      },
+    }
+
+
+async def route_caller(request: Request) -> None:
+  """Router dependency attributing queries to the matched route."""
+  route = request.scope.get('route')
+  path = route.path if route is not None else request.url.path
+  current_caller.set(f'{request.method} {path}')
+
+
+command_monitor = CommandMonitor(SLOW_OP_MS)
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from db.cache import player_cache
+from db.circuit import DatabaseUnavailable, db_circuit
+from db.journal import Journal
+from db.models.playerDeltaModel import apply_update
+from db.queries import by_discord_id
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class OutageLog:
+  """Write-ahead log for Player writes made while MongoDB is down.
+
+  Writes are journalled in order and replayed once the database is
+  reachable again. Until the journal is empty every write goes to
+  it, so replayed and new writes are never reordered. Reads overlay
+  the journalled updates with `overlay`.
+
+  Records are numbered, and the last one replayed is checkpointed
+  after each write, so a crash mid-replay does not apply them
+  twice. Writes MongoDB rejects are moved to a `.rejected` journal.
+
+  Only one process may use a journal, so it is disabled unless
+  `DB_JOURNAL` names a file. Leave it unset for API workers when
+  running several.
+
+  Args:
+      journal (Journal | None): Journal the updates are appended to, None to reject writes while down.
+  """
+
+  def __init__(self, journal: Journal | None) -> None:
+    self.journal = journal
+    self._updates: dict[int, list[dict]] = {}
+    self._replaying: asyncio.Task | None = None
+    self._app = None
+    # Last record number journalled and last one replayed
+    self._seq = 0
+    self._replayed_seq = 0
+    self.recorded = 0
+    self.replayed = 0
+    self.rejected = 0
+
+  @property
+  def enabled(self) -> bool:
+    return self._app is not None and self.journal is not None
+
+  @property
+  def pending(self) -> int:
+    """int: Journalled updates not yet written to MongoDB."""
+    return sum(len(u) for u in self._updates.values())
+
+  async def start(self, app) -> None:
+    """Loads a journal left by a previous run and starts replaying it.
+
+    Args:
+        app: Object holding the `players` collection.
+    """
+    if self.journal is None:
+      return
+    self._app = app
+    for checkpoint in self._checkpoint.read():
+      # Numbering goes on after the trimmed records
+      self._seq = self._replayed_seq = checkpoint['seq']
+    for record in self.journal.read():
+      self._seq = max(self._seq, record['seq'])
+      if record['seq'] > self._replayed_seq:
+        self._updates.setdefault(record['discord_id'], []).append(
+          record['update']
+        )
+    self.journal.open()
+    if self.pending:
+      print(f'Replaying {self.pending} journalled Player writes.')
+      self.schedule_replay()
+
+  async def stop(self) -> None:
+    if self._replaying is not None:
+      self._replaying.cancel()
+      self._replaying = None
+    if self.enabled:
+      self.journal.close()
+      self._app = None
+
+  async def record(self, discord_id: int, update: dict) -> None:
+    """Journals an update to be written once MongoDB is back.
+
+    Args:
+        discord_id (int): Player's Discord id.
+        update (dict): MongoDB update document.
+    """
+    # Tracked before awaiting the fsync, a replay may pick it up
+    self._updates.setdefault(discord_id, []).append(update)
+    self._seq += 1
+    self.recorded += 1
+    await self.journal.append(
+      {'seq': self._seq, 'discord_id': discord_id, 'update': update}
+    )
+
+  def overlay(self, discord_id: int, player: dict) -> dict:
+    """Applies a Player's journalled updates to a stored record.
+
+    Args:
+        discord_id (int): Player's Discord id.
+        player (dict): Record as stored, modified in place.
+
+    Returns:
+        dict: The record including journalled updates.
+    """
+    for update in self._updates.get(discord_id, ()):
+      apply_update(player, update)
+    return player
+
+  def schedule_replay(self) -> None:
+    """Starts replaying the journal unless already replaying."""
+    if self.pending and self._replaying is None:
+      self._replaying = asyncio.create_task(self._replay())
+
+  async def _replay(self) -> None:
+    try:
+      while records := self.journal.read():
+        for done, record in enumerate(records):
+          if record['seq'] <= self._replayed_seq:
+            # Written before a crash, the journal was not trimmed yet
+            continue
+          discord_id, update = record['discord_id'], record['update']
+          try:
+            async with db_circuit:
+              await self._app.players.update_one(
+                by_discord_id(discord_id), update
+              )
+          except DatabaseUnavailable:
+            # Still down, try again once the circuit allows a query
+            self._drop(done)
+            await asyncio.sleep(db_circuit.reset_timeout)
+            break
+          except Exception:
+            # Retrying cannot help, keep it aside for an operator
+            logger.exception(
+              'MongoDB rejected journalled write for Player %s, '
+              'moved to %s',
+              discord_id,
+              self._rejected.path,
+            )
+            await self._reject(record)
+          else:
+            # Cached records hold what is stored, so apply it there
+            player_cache.modify(
+              discord_id,
+              lambda player, update=update: apply_update(
+                player, update
+              ),
+            )
+            self.replayed += 1
+          self._replayed_seq = record['seq']
+          self._checkpoint.rewrite([{'seq': self._replayed_seq}])
+          self._updates[discord_id].pop(0)
+          if not self._updates[discord_id]:
+            del self._updates[discord_id]
+        else:
+          # Keep anything journalled while replaying
+          self._drop(len(records))
+    finally:
+      self._replaying = None
+
+  def _drop(self, count: int) -> None:
+    self.journal.rewrite(self.journal.read()[count:])
+
+  @property
+  def _checkpoint(self) -> Journal:
+    return Journal(f'{self.journal.path}.replayed')
+
+  @property
+  def _rejected(self) -> Journal:
+    return Journal(f'{self.journal.path}.rejected')
+
+  async def _reject(self, record: dict) -> None:
+    rejected = self._rejected
+    rejected.open()
+    try:
+      await rejected.append(record)
+    finally:
+      rejected.close()
+    self.rejected += 1
+
+  def stats(self) -> dict:
+    """Returns how many writes were journalled and replayed."""
+    return {
+      'pending': self.pending,
+      'recorded': self.recorded,
+      'replayed': self.replayed,
+      'rejected': self.rejected,
+      'replaying': self._replaying is not None,
+    }
+
+
+# Journal writes made during outages, e.g. `outage.journal`
+DB_JOURNAL = os.getenv('DB_JOURNAL', '')
+outage_log = OutageLog(Journal(DB_JOURNAL) if DB_JOURNAL else None)
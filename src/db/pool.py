@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+from db.circuit import DatabaseUnavailable, db_circuit
+
+load_dotenv()
+
+# Motor client options, see `db.db_app.connectToDB`
+POOL_OPTIONS = {
+  'maxPoolSize': int(os.getenv('DB_MAX_POOL_SIZE', '50')),
+  'minPoolSize': int(os.getenv('DB_MIN_POOL_SIZE', '2')),
+  'maxIdleTimeMS': int(os.getenv('DB_MAX_IDLE_MS', '300000')),
+  'waitQueueTimeoutMS': int(os.getenv('DB_WAIT_QUEUE_MS', '2000')),
+  'serverSelectionTimeoutMS': int(
+    os.getenv('DB_SERVER_SELECTION_MS', '3000')
+  ),
+  'connectTimeoutMS': int(os.getenv('DB_CONNECT_MS', '3000')),
+  'socketTimeoutMS': int(os.getenv('DB_SOCKET_MS', '5000')),
+}
+# Seconds between background pings
+PROBE_INTERVAL = float(os.getenv('DB_PROBE_INTERVAL', '15'))
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+  """Counts connection pool events reported by the driver.
+
+  Events are delivered on the driver's threads, so only plain
+  counters are updated here.
+  """
+
+  def __init__(self) -> None:
+    self.created = 0
+    self.closed = 0
+    self.checked_out = 0
+    self.checked_in = 0
+    self.checkout_failed = 0
+    self.cleared = 0
+    self.checkout_time = 0.0
+    self.max_checkout_time = 0.0
+
+  def pool_created(self, event) -> None:
+    pass
+
+  def pool_ready(self, event) -> None:
+    pass
+
+  def pool_cleared(self, event) -> None:
+    self.cleared += 1
+
+  def pool_closed(self, event) -> None:
+    pass
+
+  def connection_created(self, event) -> None:
+    self.created += 1
+
+  def connection_ready(self, event) -> None:
+    pass
+
+  def connection_closed(self, event) -> None:
+    self.closed += 1
+
+  def connection_check_out_started(self, event) -> None:
+    pass
+
+  def connection_check_out_failed(self, event) -> None:
+    self.checkout_failed += 1
+
+  def connection_checked_out(self, event) -> None:
+    self.checked_out += 1
+    # Seconds spent waiting for a connection, incl. creating one
+    if (duration := getattr(event, 'duration', None)) is not None:
+      self.checkout_time += duration
+      self.max_checkout_time = max(self.max_checkout_time, duration)
+
+  def connection_checked_in(self, event) -> None:
+    self.checked_in += 1
+
+  def stats(self) -> dict:
+    """Returns open and in-use connections and checkout waits."""
+    return {
+      'open': self.created - self.closed,
+      'in_use': self.checked_out - self.checked_in,
+      'created': self.created,
+      'closed': self.closed,
+      'checkout_failed': self.checkout_failed,
+      'cleared': self.cleared,
+      'avg_checkout_ms': 1000 * self.checkout_time / self.checked_out
+      if self.checked_out
+      else 0.0,
+      'max_checkout_ms': 1000 * self.max_checkout_time,
+    }
+
+
+class HealthProbe:
+  """Pings MongoDB in the background and remembers the round trip.
+
+  Regular pings keep pooled connections warm, so a slash command
+  never pays for connection setup, and let the circuit breaker
+  notice a recovered database without waiting for user traffic.
+
+  Args:
+      interval (float, optional): Seconds between pings. Defaults to 15.
+  """
+
+  def __init__(self, interval: float = 15.0) -> None:
+    self.interval = interval
+    self.rtt: float | None = None
+    self.last_probe: float | None = None
+    self.last_error: str | None = None
+    self._task: asyncio.Task | None = None
+
+  async def ping(self, app) -> float:
+    """Runs one `ping` command and records its round trip.
+
+    Args:
+        app: Object holding the `db` handle.
+
+    Raises:
+        DatabaseUnavailable: The database did not answer.
+
+    Returns:
+        float: Round trip in seconds.
+    """
+    start = time.perf_counter()
+    try:
+      async with db_circuit:
+        await app.db.command('ping')
+    except DatabaseUnavailable as e:
+      self.last_error = str(e)
+      raise
+    finally:
+      self.last_probe = time.monotonic()
+    self.rtt = time.perf_counter() - start
+    self.last_error = None
+    return self.rtt
+
+  def start(self, app) -> None:
+    self._task = asyncio.create_task(self._probe_periodically(app))
+
+  async def stop(self) -> None:
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+
+  async def _probe_periodically(self, app) -> None:
+    while True:
+      await asyncio.sleep(self.interval)
+      try:
+        await self.ping(app)
+      except DatabaseUnavailable:
+        pass
+
+  def stats(self) -> dict:
+    """Returns the latest round trip and how long ago it was measured."""
+    return {
+      'rtt_ms': 1000 * self.rtt if self.rtt is not None else None,
+      'last_probe_age': time.monotonic() - self.last_probe
+      if self.last_probe is not None
+      else None,
+      'last_error': self.last_error,
+    }
+
+
+pool_monitor = PoolMonitor()
+health_probe = HealthProbe(PROBE_INTERVAL)
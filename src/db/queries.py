@@ -0,0 +1,45 @@
+from pymongo import ASCENDING
+
+# Players are listed and streamed in Discord id order
+PLAYER_ORDER = [('discord_id', ASCENDING)]
+
+
+def by_discord_id(discord_id: int) -> dict:
+  return {'discord_id': discord_id}
+
+
+def by_discord_ids(discord_ids: list[int]) -> dict:
+  return {'discord_id': {'$in': discord_ids}}
+
+
+def by_version(discord_id: int, version: int | None) -> dict:
+  """Matches a Player only while it is at `version`.
+
+  Args:
+      discord_id (int): Player's Discord id.
+      version (int | None): Version the Player must have, None to match any.
+
+  Returns:
+      dict: MongoDB filter.
+  """
+  query = by_discord_id(discord_id)
+  if version == 0:
+    # Players stored before versioning have no `version` yet
+    query['version'] = {'$in': [0, None]}
+  elif version is not None:
+    query['version'] = version
+  return query
+
+
+def page_after(after: int | None) -> dict:
+  """Matches the Players after `after` in `PLAYER_ORDER`.
+
+  Args:
+      after (int | None): Last Discord id of the previous page, None for the first page.
+
+  Returns:
+      dict: MongoDB filter.
+  """
+  if after is None:
+    return {}
+  return {'discord_id': {'$gt': after}}
@@ -1,17 +1,111 @@
+from collections.abc import AsyncIterator
+from typing import Annotated
+
+from bson import ObjectId
 from fastapi import (
   APIRouter,
   Body,
+  Depends,
   HTTPException,
+  Query,
   Response,
   status,
 )
-from pymongo import ReturnDocument
+from fastapi.responses import StreamingResponse
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult
 
+from db.cache import player_cache
+from db.circuit import DatabaseUnavailable, db_circuit
+from db.models.partialPlayerModel import (
+  PROJECTABLE_FIELDS,
+  PartialPlayerModel,
+)
 from db.models.playerCollectionModel import PlayerCollection
+from db.models.playerDeltaModel import (
+  PlayerBatchDeltaModel,
+  PlayerDeltaModel,
+  apply_update,
+  versioned,
+)
 from db.models.playerModel import PlayerModel
 from db.models.updatePlayerModel import UpdatePlayerModel
+from db.monitoring import route_caller
+from db.outage import outage_log
+from db.queries import (
+  PLAYER_ORDER,
+  by_discord_id,
+  by_discord_ids,
+  by_version,
+  page_after,
+)
+from db.write_behind import fold, write_behind
+from utility.tracing import traced
+
+# Attribute DB latency to the route being served
+router = APIRouter(dependencies=[Depends(route_caller)])
+
+# Largest page `list_players` will return
+MAX_PAGE_SIZE = 100
+# Upserts `register_player` tries while losing races
+REGISTER_ATTEMPTS = 3
+# MongoDB error codes for updates that do not fit the stored Player
+INVALID_UPDATE_CODES = {2, 9, 14, 28, 40, 52, 56, 57}
+
+
+@traced()
+async def register_player(
+  app, player: PlayerModel
+) -> tuple[dict, bool]:
+  """Inserts a Player unless one with the same Discord id exists.
+
+  Uses a single upsert with `$setOnInsert`, so registering costs one
+  round trip and concurrent attempts cannot create duplicates.
+
+  Args:
+      player (PlayerModel): Player to register.
+
+  Raises:
+      HTTPException: The Player kept being registered and deleted concurrently (409).
+
+  Returns:
+      tuple[dict, bool]: The stored Player record and whether it was newly created.
+  """
+  new_id = ObjectId()
+  document = player.model_dump(
+    by_alias=True, exclude=['id', 'discord_id']
+  )
+  document['_id'] = new_id
+  registered = None
+  try:
+    async with db_circuit:
+      for _ in range(REGISTER_ATTEMPTS):
+        try:
+          registered = await app.players.find_one_and_update(
+            by_discord_id(player.discord_id),
+            {'$setOnInsert': document},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+          )
+        except DuplicateKeyError:
+          # Lost a race with another upsert for the same Player,
+          # which may have been deleted again since
+          registered = await app.players.find_one(
+            by_discord_id(player.discord_id)
+          )
+        if registered is not None:
+          break
+  except DatabaseUnavailable:
+    raise _unavailable()
+  if registered is None:
+    raise HTTPException(
+      status_code=409,
+      detail=f'Player {player.discord_id} was modified concurrently',
+    )
+  player_cache.put(player.discord_id, registered)
 
-router = APIRouter()
+  return registered, registered['_id'] == new_id
 
 
 @router.post(
@@ -21,65 +115,452 @@ router = APIRouter()
   status_code=status.HTTP_201_CREATED,
   response_model_by_alias=False,
 )
+@traced()
 async def add_player(app, player: PlayerModel = Body(...)):
   """Inserts a new Player record into player database.
 
+  Raises:
+      HTTPException: A Player with the same Discord id already exists.
+
   Returns:
       any: A generated unique `id`.
   """
-  new_player = await app.players.insert_one(
-    player.model_dump(by_alias=True, exclude=['id'])
-  )
-  created_player = await app.players.find_one(
-    {'_id': new_player.inserted_id}
+  created_player, created = await register_player(app, player)
+
+  if created:
+    return created_player
+
+  raise HTTPException(
+    status_code=409,
+    detail=f'Player {player.discord_id} already exists',
   )
 
-  return created_player
+
+@router.post(
+  '/batch',
+  response_description='Apply field-level updates to many Players',
+)
+@traced()
+async def bulk_patch_players(
+  app,
+  updates: Annotated[list[PlayerBatchDeltaModel], Body()],
+):
+  """Applies the deltas of many Players in a single `bulk_write`.
+
+  Updates are unordered, so one missing Player does not stop the rest.
+  Updates with an `expected_version` only apply if the Player is
+  still at that version.
+
+  Args:
+      updates (list[PlayerBatchDeltaModel]): Delta for each Player, read from the request body.
+
+  Raises:
+      HTTPException: A Player with an `expected_version` was changed since (409). Updates to the other Players may have been applied.
+
+  Returns:
+      dict: Number of Players matched and modified, and the `versions` written for updates with an `expected_version`.
+  """
+  updates = [u for u in updates if not u.delta.is_empty()]
+  if not updates:
+    return {'matched': 0, 'modified': 0, 'versions': {}}
+
+  writes = [
+    (
+      update.discord_id,
+      versioned(update.delta.to_mongo()),
+      update.expected_version,
+    )
+    for update in updates
+  ]
+  if outage_log.pending:
+    return await _bulk_degraded(app, writes)
+
+  try:
+    async with db_circuit:
+      result, writes = await _bulk_write(app, writes)
+  except DatabaseUnavailable:
+    return await _bulk_degraded(app, writes)
+  except OperationFailure as e:
+    # The other updates may have been applied
+    for discord_id, _, _ in writes:
+      player_cache.invalidate(discord_id)
+    raise _invalid_update(e)
+
+  if result.matched_count < len(writes) and any(
+    expected_version is not None for _, _, expected_version in writes
+  ):
+    for discord_id, _, _ in writes:
+      player_cache.invalidate(discord_id)
+    raise HTTPException(
+      status_code=409,
+      detail='Players were modified concurrently',
+    )
+
+  # Documents are not returned, so patch cached copies in place
+  for discord_id, update, _ in writes:
+    if result.matched_count == len(writes):
+      player_cache.modify(
+        discord_id,
+        lambda player, update=update: apply_update(
+          player, update
+        ),
+      )
+    else:
+      player_cache.invalidate(discord_id)
+
+  return {
+    'matched': result.matched_count,
+    'modified': result.modified_count,
+    # Guarded updates moved their Player exactly one version on
+    'versions': {
+      discord_id: expected_version + 1
+      for discord_id, _, expected_version in writes
+      if expected_version is not None
+    },
+  }
+
+
+async def _bulk_write(
+  app, writes: list[tuple[int, dict, int | None]]
+) -> tuple[BulkWriteResult, list[tuple[int, dict, int | None]]]:
+  # Buffered counters for these Players ride along with the batch
+  buffered = {}
+  landed = set()
+  try:
+    for discord_id, _, _ in writes:
+      if (delta := await write_behind.claim(discord_id)) is not None:
+        buffered[discord_id] = delta
+    writes = [
+      (
+        discord_id,
+        fold(buffered.get(discord_id), update),
+        _stored_version(expected_version, buffered.get(discord_id)),
+      )
+      for discord_id, update, expected_version in writes
+    ]
+    result = await app.players.bulk_write(
+      [
+        UpdateOne(by_version(discord_id, expected_version), update)
+        for discord_id, update, expected_version in writes
+      ],
+      ordered=False,
+    )
+    landed = await _landed(app, writes, buffered, result)
+  finally:
+    for discord_id in buffered:
+      await write_behind.release(discord_id, discord_id in landed)
+  return result, writes
+
+
+async def _landed(
+  app,
+  writes: list[tuple[int, dict, int | None]],
+  buffered: dict[int, PlayerDeltaModel],
+  result: BulkWriteResult,
+) -> set[int]:
+  # Players whose buffered changes the batch applied
+  if not buffered or result.matched_count == len(writes):
+    return set(buffered)
+  stored = {
+    player['discord_id']: player.get('version', 0)
+    async for player in app.players.find(
+      by_discord_ids(list(buffered)),
+      {'discord_id': 1, 'version': 1},
+    )
+  }
+  return {
+    discord_id
+    for discord_id, _, expected_version in writes
+    if discord_id in buffered
+    and discord_id in stored
+    and (
+      expected_version is None
+      or stored[discord_id] == expected_version + 1
+    )
+  }
+
+
+def _stored_version(
+  expected_version: int | None, buffered: PlayerDeltaModel | None
+) -> int | None:
+  # Reads count buffered changes as one version ahead of the
+  # stored Player, the write carrying them makes that true
+  if expected_version is None or buffered is None:
+    return expected_version
+  return expected_version - 1
+
+
+async def _bulk_degraded(
+  app, writes: list[tuple[int, dict, int | None]]
+) -> dict:
+  # Check every Player first so the batch is journalled whole
+  found = []
+  for discord_id, update, expected_version in writes:
+    if (player := await _load_player(app, discord_id)) is None:
+      continue
+    player = _overlay(discord_id, player)
+    if (
+      expected_version is not None
+      and player.get('version', 0) != expected_version
+    ):
+      raise HTTPException(
+        status_code=409,
+        detail=f'Player {discord_id} was modified concurrently',
+      )
+    found.append((discord_id, update, expected_version))
+  versions = {}
+  for discord_id, update, expected_version in found:
+    player = await _update_degraded(
+      app, discord_id, update, expected_version
+    )
+    versions[discord_id] = player['version']
+  return {
+    'matched': len(found),
+    'modified': len(found),
+    'versions': versions,
+  }
 
 
 @router.get(
   '/',
-  response_description='List all Players',
+  response_description='List a page of Players',
   response_model=PlayerCollection,
   response_model_by_alias=False,
 )
-async def list_players(app):
-  """Lists all player records. Response is limited to 1000 results.
+@traced()
+async def list_players(
+  app, limit: int = 50, after: int | None = None
+):
+  """Lists Player records one page at a time, ordered by Discord id.
+
+  Uses keyset pagination: pass the previous page's `next_after` as
+  `after` to get the following page.
+
+  Args:
+      limit (int, optional): Page size, capped at `MAX_PAGE_SIZE`. Defaults to 50.
+      after (int | None, optional): Only return Players with a greater Discord id. Defaults to None.
 
   Returns:
-      PlayerCollection: A container holding a list of `PlayerModel` instances.
+      PlayerCollection: A container holding a page of `PlayerModel` instances.
   """
+  limit = max(1, min(limit, MAX_PAGE_SIZE))
+  # One extra Player tells whether there is a next page
+  players = (
+    await app.players.find(page_after(after), {'_id': 0})
+    .sort(PLAYER_ORDER)
+    .limit(limit + 1)
+    .to_list(limit + 1)
+  )
+  players, more = players[:limit], len(players) > limit
+
   return PlayerCollection(
-    players=await app.players.find({}, {'_id': 0}).to_list(
-      1000
-    )
+    players=players,
+    next_after=players[-1]['discord_id'] if more else None,
+  )
+
+
+async def iter_players(
+  app, batch_size: int = 100
+) -> AsyncIterator[dict]:
+  """Yields every Player record as the cursor produces it.
+
+  Args:
+      batch_size (int, optional): Documents fetched per round trip. Defaults to 100.
+
+  Yields:
+      dict: Player record without `_id`.
+  """
+  cursor = (
+    app.players.find(page_after(None), {'_id': 0})
+    .sort(PLAYER_ORDER)
+    .batch_size(batch_size)
   )
+  async for player in cursor:
+    yield player
+
+
+@router.get(
+  '/stream',
+  response_description='Stream all Players as NDJSON',
+  response_class=StreamingResponse,
+)
+@traced()
+async def stream_players(app, batch_size: int = 100):
+  """Streams all Player records as newline-delimited JSON.
+
+  Memory use stays at one cursor batch regardless of collection size.
+
+  Args:
+      batch_size (int, optional): Documents fetched per round trip. Defaults to 100.
+
+  Returns:
+      StreamingResponse: One JSON Player record per line.
+  """
+
+  async def lines():
+    async for player in iter_players(app, batch_size):
+      yield PlayerModel(**player).model_dump_json() + '\n'
+
+  return StreamingResponse(
+    lines(), media_type='application/x-ndjson'
+  )
+
+
+@router.get(
+  '/many',
+  response_description='Get several Players at once',
+  response_model=PlayerCollection,
+  response_model_by_alias=False,
+)
+@traced()
+async def get_players(
+  app, discord_ids: Annotated[list[int], Query()]
+):
+  """Gets the records for several Players in a single query.
+
+  Cached Players are served from `player_cache` and the rest are
+  fetched together with one `$in` query. Players that do not exist
+  are left out.
+
+  Args:
+      discord_ids (list[int]): Discord ids of the Players to get.
+
+  Returns:
+      dict: `players` found, in the order they were requested.
+  """
+  discord_ids = list(dict.fromkeys(discord_ids))
+  found = {}
+  for discord_id in discord_ids:
+    if (player := player_cache.get(discord_id)) is not None:
+      found[discord_id] = player
+
+  missing = [i for i in discord_ids if i not in found]
+  if missing:
+    try:
+      async with db_circuit:
+        async for player in app.players.find(
+          by_discord_ids(missing)
+        ):
+          player_cache.put(player['discord_id'], player)
+          found[player['discord_id']] = player
+    except DatabaseUnavailable:
+      # Degraded mode, answer from whatever is cached
+      for discord_id in missing:
+        if (player := player_cache.stale(discord_id)) is not None:
+          found[discord_id] = player
+
+  return {
+    'players': [
+      _overlay(i, found[i]) for i in discord_ids if i in found
+    ]
+  }
 
 
 @router.get(
   '/{id}',
   response_description='Get a single Player',
-  response_model=PlayerModel,
+  response_model=PlayerModel | PartialPlayerModel,
   response_model_by_alias=False,
 )
-async def get_player(app, discord_id: int):
+@traced()
+async def get_player(
+  app,
+  discord_id: int,
+  fields: Annotated[list[str] | None, Query()] = None,
+):
   """Gets the record for a specific Player record.
 
+  Reads go through `player_cache`, so repeated lookups for the same
+  Player are served from memory until the entry expires or is
+  overwritten by a write. While the database is down, expired
+  entries are served instead.
+
   Args:
     discord_id (int): Required Player's Discord id.
+    fields (list[str] | None, optional): Only return these fields. `_id` and `discord_id` are always included. Defaults to None.
 
   Raises:
       HTTPException: Unable to find a Player with provided Discord id.
+      HTTPException: Database is down and the Player is not cached (503).
 
   Returns:
-      PlayerModel: Found Player record.
+      PlayerModel | PartialPlayerModel: Found Player record, partial if `fields` is given.
   """
-  if (
-    player := await app.players.find_one(
-      {'discord_id': discord_id}
+  if fields:
+    return await _get_player_fields(app, discord_id, fields)
+
+  if (player := await _load_player(app, discord_id)) is not None:
+    return _overlay(discord_id, player)
+
+  raise HTTPException(
+    status_code=404, detail=f'Player {discord_id} not found'
+  )
+
+
+async def _load_player(app, discord_id: int) -> dict | None:
+  async def load() -> dict | None:
+    async with db_circuit:
+      return await app.players.find_one(by_discord_id(discord_id))
+
+  try:
+    return await player_cache.get_or_load(discord_id, load)
+  except DatabaseUnavailable:
+    # Degraded mode, answer from whatever is cached
+    if (player := player_cache.stale(discord_id)) is not None:
+      return player
+    raise _unavailable()
+
+
+def _overlay(discord_id: int, player: dict) -> dict:
+  # Writes not in the database yet, oldest first
+  outage_log.overlay(discord_id, player)
+  return write_behind.overlay(discord_id, player)
+
+
+def _unavailable() -> HTTPException:
+  return HTTPException(
+    status_code=503, detail='Database unavailable'
+  )
+
+
+def _invalid_update(error: OperationFailure) -> Exception:
+  # Updates MongoDB refuses to apply are the caller's fault
+  codes = {
+    write_error['code']
+    for write_error in (error.details or {}).get('writeErrors', ())
+  } or {error.code}
+  if codes <= INVALID_UPDATE_CODES:
+    return HTTPException(status_code=422, detail=str(error))
+  return error
+
+
+async def _get_player_fields(
+  app, discord_id: int, fields: list[str]
+) -> dict:
+  unknown = set(fields) - PROJECTABLE_FIELDS
+  if unknown:
+    raise HTTPException(
+      status_code=422,
+      detail=f'Unknown fields: {", ".join(sorted(unknown))}',
     )
-  ) is not None:
-    return player
+  fields = {'_id', 'discord_id', *fields}
+
+  # Project from a cached full record if there is one
+  if (player := player_cache.get(discord_id)) is None:
+    try:
+      async with db_circuit:
+        # `version` tells the overlay whether a flush has landed
+        player = await app.players.find_one(
+          by_discord_id(discord_id),
+          {field: 1 for field in {*fields, 'version'}},
+        )
+    except DatabaseUnavailable:
+      if (player := player_cache.stale(discord_id)) is None:
+        raise _unavailable()
+
+  if player is not None:
+    player = _overlay(discord_id, player)
+    return {k: v for k, v in player.items() if k in fields}
 
   raise HTTPException(
     status_code=404, detail=f'Player {discord_id} not found'
@@ -89,6 +570,7 @@ async def get_player(app, discord_id: int):
 @router.delete(
   '/{id}', response_description='Delete a Player'
 )
+@traced()
 async def delete_player(app, discord_id: int):
   """Deletes a specific Player record.
 
@@ -101,9 +583,15 @@ async def delete_player(app, discord_id: int):
   Returns:
       Response: Status code HTTP 204 No Content.
   """
-  delete_result = await app.players.delete_one(
-    {'discord_id': discord_id}
-  )
+  try:
+    async with db_circuit:
+      delete_result = await app.players.delete_one(
+        by_discord_id(discord_id)
+      )
+  except DatabaseUnavailable:
+    raise _unavailable()
+  player_cache.invalidate(discord_id)
+  write_behind.discard(discord_id)
 
   if delete_result.deleted_count == 1:
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -120,19 +608,24 @@ async def delete_player(app, discord_id: int):
   response_model=PlayerModel,
   response_model_by_alias=False,
 )
+@traced()
 async def update_player(
   app,
   discord_id: int,
   player: UpdatePlayerModel = Body(...),
+  expected_version: int | None = None,
 ):
   """Updates individual Player record.
 
   Args:
       discord_id (int): Discord id of Player to be updated.
       player (UpdatePlayerModel, optional): New set of Player data. Ignores null fields. Defaults to Body(...).
+      expected_version (int | None, optional): Only update if the stored `version` matches. Defaults to None.
 
   Raises:
       HTTPException: Unable to find Player by specified Discord id.
+      HTTPException: Player was changed since `expected_version` (409).
+      HTTPException: The update does not fit the stored Player (422).
 
   Returns:
       PlayerMode: New Player record or existing record if update is empty.
@@ -144,28 +637,155 @@ async def update_player(
   }
 
   if len(player) >= 1:
-    update_result = await app.players.find_one_and_update(
-      {'discord_id': discord_id},
-      {'$set': player},
-      return_document=ReturnDocument.AFTER,
+    return await _update_versioned(
+      app, discord_id, {'$set': player}, expected_version
     )
 
-    if update_result is not None:
-      return update_result
-    else:
-      raise HTTPException(
-        status_code=404,
-        detail=f'Player {discord_id} not found',
+  # Update is empty, just return matching document
+  return await get_player(app, discord_id=discord_id)
+
+
+@router.patch(
+  '/{id}',
+  response_description='Apply a field-level update to a Player',
+  response_model=PlayerModel,
+  response_model_by_alias=False,
+)
+@traced()
+async def patch_player(
+  app,
+  discord_id: int,
+  delta: Annotated[PlayerDeltaModel, Body()],
+  expected_version: int | None = None,
+):
+  """Atomically applies `$inc`/`$set`/`$unset` on dotted paths.
+
+  Unlike `update_player`, only the touched values are written, so
+  concurrent updates to different keys of the same sub-document
+  do not overwrite each other.
+
+  Args:
+      discord_id (int): Discord id of Player to be updated.
+      delta (PlayerDeltaModel): Paths to change, read from the request body.
+      expected_version (int | None, optional): Only update if the stored `version` matches. Defaults to None.
+
+  Raises:
+      HTTPException: Unable to find Player by specified Discord id.
+      HTTPException: Player was changed since `expected_version` (409).
+      HTTPException: The update does not fit the stored Player (422).
+
+  Returns:
+      PlayerModel: New Player record or existing record if delta is empty.
+  """
+  if delta.is_empty():
+    # Nothing to write, just return matching document
+    return await get_player(app, discord_id=discord_id)
+
+  return await _update_versioned(
+    app, discord_id, delta.to_mongo(), expected_version
+  )
+
+
+async def _update_versioned(
+  app,
+  discord_id: int,
+  update: dict,
+  expected_version: int | None,
+) -> dict:
+  update = versioned(update)
+
+  # Journalled writes must be replayed before writing directly
+  if outage_log.pending:
+    return await _update_degraded(
+      app, discord_id, update, expected_version
+    )
+
+  try:
+    async with db_circuit:
+      update_result = await _write_carrying_buffered(
+        app, discord_id, update, expected_version
       )
+      exists = update_result is not None or (
+        expected_version is not None
+        and await app.players.count_documents(
+          by_discord_id(discord_id), limit=1
+        )
+      )
+  except DatabaseUnavailable:
+    return await _update_degraded(
+      app, discord_id, update, expected_version
+    )
+  except OperationFailure as e:
+    raise _invalid_update(e)
 
-  # Update is empty, just return matching document
-  if (
-    existing_player := await app.players.find_one(
-      {'discord_id': discord_id}
+  if update_result is not None:
+    player_cache.put(discord_id, update_result)
+    return update_result
+
+  if exists:
+    # Whatever is cached is older than the stored Player
+    player_cache.invalidate(discord_id)
+    raise HTTPException(
+      status_code=409,
+      detail=f'Player {discord_id} was modified concurrently',
     )
-  ) is not None:
-    return existing_player
 
   raise HTTPException(
     status_code=404, detail=f'Player {discord_id} not found'
   )
+
+
+async def _write_carrying_buffered(
+  app,
+  discord_id: int,
+  update: dict,
+  expected_version: int | None,
+) -> dict | None:
+  # Buffered counters for the Player ride along with this write
+  buffered = await write_behind.claim(discord_id)
+  player = None
+  try:
+    player = await app.players.find_one_and_update(
+      by_version(
+        discord_id, _stored_version(expected_version, buffered)
+      ),
+      fold(buffered, update),
+      return_document=ReturnDocument.AFTER,
+    )
+  finally:
+    if buffered is not None:
+      await write_behind.release(discord_id, player is not None)
+  return player
+
+
+async def _update_degraded(
+  app,
+  discord_id: int,
+  update: dict,
+  expected_version: int | None,
+) -> dict:
+  # Journal the write and answer as if it had been applied
+  if not outage_log.enabled:
+    raise _unavailable()
+  if (player := await _load_player(app, discord_id)) is None:
+    raise HTTPException(
+      status_code=404, detail=f'Player {discord_id} not found'
+    )
+  player = _overlay(discord_id, player)
+  if (
+    expected_version is not None
+    and player.get('version', 0) != expected_version
+  ):
+    raise HTTPException(
+      status_code=409,
+      detail=f'Player {discord_id} was modified concurrently',
+    )
+
+  # Buffered counters are older, so they go first
+  if (buffered := write_behind.take(discord_id)) is not None:
+    await outage_log.record(
+      discord_id, versioned(buffered.to_mongo())
+    )
+  await outage_log.record(discord_id, update)
+  outage_log.schedule_replay()
+  return apply_update(player, update)
@@ -0,0 +1,147 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from core.mailbox import player_mailbox
+from db.cache import player_cache
+from db.circuit import db_circuit
+from db.monitoring import command_monitor
+from db.outage import outage_log
+from db.pool import health_probe, pool_monitor
+from db.write_behind import write_behind
+from utility.metrics import registry
+from utility.tracing import tracer
+
+router = APIRouter()
+
+
+@router.get(
+  '/cache',
+  response_description='Player cache statistics',
+)
+async def cache_stats():
+  """Reports Player cache counters, used to size the cache.
+
+  Returns:
+      dict: Size, hit/miss counters and hit rate.
+  """
+  return player_cache.stats()
+
+
+@router.get(
+  '/mailbox',
+  response_description='Per-Player lock statistics',
+)
+async def mailbox_stats():
+  """Reports how often commands wait on each other's Player locks.
+
+  Returns:
+      dict: Active Players, queue depth and wait times.
+  """
+  return player_mailbox.stats()
+
+
+@router.get(
+  '/write-behind',
+  response_description='Write-behind buffer statistics',
+)
+async def write_behind_stats():
+  """Reports buffered Player writes, used to tune flush thresholds.
+
+  Returns:
+      dict: Buffered deltas, age of the oldest and flush counters.
+  """
+  return write_behind.stats()
+
+
+@router.get(
+  '/circuit',
+  response_description='Database circuit breaker state',
+)
+async def circuit_stats():
+  """Reports whether the database is treated as down.
+
+  Returns:
+      dict: Circuit state and writes journalled during outages.
+  """
+  return {**db_circuit.stats(), 'journal': outage_log.stats()}
+
+
+@router.get(
+  '/health',
+  response_description='Database connection health',
+)
+async def health():
+  """Reports round-trip latency and connection pool usage.
+
+  Latency comes from the background probe, so this never waits on
+  the database itself.
+
+  Returns:
+      dict: Overall status, latest ping, pool counters and circuit state.
+  """
+  probe = health_probe.stats()
+  return {
+    'status': 'ok'
+    if db_circuit.state == 'closed' and probe['last_error'] is None
+    else 'degraded',
+    **probe,
+    'pool': pool_monitor.stats(),
+    'circuit': db_circuit.state,
+  }
+
+
+@router.get(
+  '/db-ops',
+  response_description='MongoDB command latency',
+)
+async def db_op_stats():
+  """Reports latency histograms per MongoDB command and per caller.
+
+  Returns:
+      dict: Latency summaries, failures and slow command counts.
+  """
+  return command_monitor.stats()
+
+
+@router.get(
+  '/traces',
+  response_description='Slowest sampled interaction traces',
+)
+async def slow_traces(min_ms: float | None = None, limit: int = 20):
+  """Dumps sampled traces slower than `min_ms`, slowest first.
+
+  Each trace lists timed spans for the cog, `core.player_utils`,
+  `db.routes` and Discord HTTP calls it made.
+
+  Args:
+      min_ms (float | None, optional): Threshold in ms. Defaults to `TRACE_SLOW_MS`.
+      limit (int, optional): Most traces to return. Defaults to 20.
+
+  Returns:
+      dict: Tracer counters and the matching traces.
+  """
+  return {
+    **tracer.stats(),
+    'traces': tracer.slow(min_ms, min(limit, 256)),
+  }
+
+
+@router.get(
+  '/metrics',
+  response_class=PlainTextResponse,
+  response_description='Metrics in Prometheus text format',
+)
+async def metrics():
+  """Exposes command, database, cache and Discord API metrics.
+
+  Only metrics recorded in this process are included, so slash
+  commands and Discord calls are missing when the API runs apart
+  from the Bot.
+
+  Returns:
+      PlainTextResponse: Prometheus text exposition format.
+  """
+  return PlainTextResponse(
+    registry.render(),
+    media_type='text/plain; version=0.0.4',
+  )
@@ -0,0 +1,498 @@
+import asyncio
+import os
+import time
+from collections.abc import Callable
+
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from db.cache import player_cache
+from db.circuit import DatabaseUnavailable, db_circuit
+from db.journal import Journal
+from db.models.playerDeltaModel import (
+  PlayerDeltaModel,
+  apply_update,
+  versioned,
+)
+from db.queries import by_discord_ids, by_version
+
+load_dotenv()
+
+# Counters that may be buffered, anything else is written directly
+BUFFERED_INC = {'favor', 'tokens', 'stats.currentxp'}
+BUFFERED_SET_PREFIXES = ('cooldowns.',)
+# Errors a flush may fail with, the batch then stays buffered
+FLUSH_ERRORS = (DatabaseUnavailable, PyMongoError, OSError)
+
+
+class WriteBehindBuffer:
+  """Buffers high-frequency Player counters and writes them in bulk.
+
+  Accepted deltas are merged per Player in memory and appended to a
+  local journal before `add` returns, so a crash loses nothing. They
+  are written with one unordered `bulk_write` once `max_pending`
+  deltas have been buffered, once the oldest is `max_age` seconds
+  old, and on shutdown. Reads overlay the pending changes with
+  `overlay`, so commands never see stale counters.
+
+  The batch being written stays in the overlay until it is known to
+  be stored. Before writing, the batch's journal is rewritten with
+  each Player's current `version`, so a batch replayed after a crash
+  or a failed write only applies where it has not landed yet.
+
+  A direct write to a Player with buffered changes `claim`s them and
+  carries them in the same update, then `release`s them, which marks
+  them written in the journal.
+
+  Only one process may use a journal, so keep this disabled for API
+  workers when running the API separately.
+
+  Args:
+      journal_path (str): File pending deltas are journalled to.
+      max_pending (int, optional): Deltas buffered before a flush. Defaults to 500.
+      max_age (float, optional): Seconds a delta may wait. Defaults to 5.
+      clock (Callable[[], float], optional): Time source. Defaults to time.monotonic.
+  """
+
+  def __init__(
+    self,
+    journal_path: str,
+    max_pending: int = 500,
+    max_age: float = 5.0,
+    clock: Callable[[], float] = time.monotonic,
+  ) -> None:
+    self._journal = Journal(journal_path)
+    self.max_pending = max_pending
+    self.max_age = max_age
+    self._clock = clock
+    self._pending: dict[int, PlayerDeltaModel] = {}
+    # Batch being written and the versions it was read at
+    self._flushing: dict[int, PlayerDeltaModel] = {}
+    self._expected: dict[int, int] = {}
+    # Taken by direct writes still in flight
+    self._claimed: dict[int, PlayerDeltaModel] = {}
+    self._count = 0
+    self._oldest: float | None = None
+    self._flush_lock = asyncio.Lock()
+    self._flusher: asyncio.Task | None = None
+    self._app = None
+    self.flushes = 0
+    self.flushed = 0
+
+  @property
+  def enabled(self) -> bool:
+    return self._app is not None
+
+  def accepts(self, delta: PlayerDeltaModel) -> bool:
+    """Whether a delta only touches counters that can be buffered."""
+    return (
+      not delta.unset
+      and all(path in BUFFERED_INC for path in delta.inc or {})
+      and all(
+        path.startswith(BUFFERED_SET_PREFIXES)
+        for path in delta.set or {}
+      )
+    )
+
+  # region Lifecycle
+  async def start(self, app) -> None:
+    """Replays the journal left by a previous run and starts flushing.
+
+    Args:
+        app: Object holding the `players` collection.
+    """
+    self._app = app
+    # A crash mid-flush leaves the batch being written behind, it is
+    # kept apart as it may already be stored
+    for record in Journal(self._flushing_path).read():
+      discord_id = record['discord_id']
+      _combine(
+        self._flushing,
+        discord_id,
+        PlayerDeltaModel(**record['delta']),
+      )
+      if 'version' in record:
+        self._expected[discord_id] = record['version']
+    records = self._journal.read()
+    for record in records:
+      if record.get('written'):
+        # Carried by a direct write since
+        self._pending.pop(record['discord_id'], None)
+        continue
+      self._merge(
+        record['discord_id'], PlayerDeltaModel(**record['delta'])
+      )
+    self._journal.rewrite(self._records())
+    self._journal.open()
+    if records or self._flushing:
+      print(
+        f'Replaying {len(records) + len(self._flushing)} buffered '
+        'Player writes.'
+      )
+      try:
+        await self.flush()
+      except FLUSH_ERRORS as e:
+        print(f'Write-behind flush failed: {e}')
+    self._flusher = asyncio.create_task(self._flush_periodically())
+
+  async def stop(self) -> None:
+    """Stops the periodic flush and writes everything still buffered."""
+    if self._flusher is not None:
+      self._flusher.cancel()
+      self._flusher = None
+    if self.enabled:
+      try:
+        await self.flush()
+      except DatabaseUnavailable:
+        print('Database down, buffered writes kept in the journal.')
+      self._journal.close()
+      self._app = None
+
+  async def _flush_periodically(self) -> None:
+    while True:
+      await asyncio.sleep(self.max_age / 2)
+      # A batch whose write failed is retried whatever its age
+      if self._flushing or (
+        self._oldest is not None
+        and self._clock() - self._oldest >= self.max_age
+      ):
+        try:
+          await self.flush()
+        except FLUSH_ERRORS as e:
+          # Still buffered and journalled, try again next time
+          print(f'Write-behind flush failed: {e}')
+
+  # endregion
+
+  # region Buffering
+  async def add(
+    self, discord_id: int, delta: PlayerDeltaModel
+  ) -> None:
+    """Buffers a delta accepted by `accepts`.
+
+    Args:
+        discord_id (int): Player's Discord id.
+        delta (PlayerDeltaModel): Counter changes to buffer.
+    """
+    self._merge(discord_id, delta)
+    await self._journal.append(_record(discord_id, delta))
+    if self._count >= self.max_pending:
+      await self.flush()
+
+  def _merge(self, discord_id: int, delta: PlayerDeltaModel) -> None:
+    _combine(self._pending, discord_id, delta)
+    self._count += 1
+    if self._oldest is None:
+      self._oldest = self._clock()
+
+  def overlay(self, discord_id: int, player: dict) -> dict:
+    """Applies a Player's pending changes to a record read from the DB.
+
+    Args:
+        discord_id (int): Player's Discord id.
+        player (dict): Record as stored, modified in place.
+
+    Returns:
+        dict: The record including buffered changes.
+    """
+    if (flushing := self._flushing.get(discord_id)) is not None:
+      # Unless the record was read after the batch landed
+      expected = self._expected.get(discord_id)
+      if expected is None or player.get('version', 0) == expected:
+        flushing.apply_to(player)
+        player['version'] = player.get('version', 0) + 1
+    if self.buffers(discord_id):
+      for deltas in (self._claimed, self._pending):
+        if (delta := deltas.get(discord_id)) is not None:
+          delta.apply_to(player)
+      # Reported as the version the next write will produce
+      player['version'] = player.get('version', 0) + 1
+    return player
+
+  def buffers(self, discord_id: int) -> bool:
+    """Whether a Player has changes that are not being written yet."""
+    return discord_id in self._pending or discord_id in self._claimed
+
+  def discard(self, discord_id: int) -> None:
+    if self._pending.pop(discord_id, None) is not None:
+      self._journal.rewrite(self._records())
+
+  def take(self, discord_id: int) -> PlayerDeltaModel | None:
+    """Removes a Player's buffered changes so they can be written elsewhere.
+
+    Args:
+        discord_id (int): Player's Discord id.
+
+    Returns:
+        PlayerDeltaModel | None: The buffered changes, None if there are none.
+    """
+    delta = self._pending.pop(discord_id, None)
+    if delta is not None:
+      self._journal.rewrite(self._records())
+    return delta
+
+  async def claim(self, discord_id: int) -> PlayerDeltaModel | None:
+    """Takes a Player's buffered changes for a direct write to carry.
+
+    Waits only if the Player is in a batch being written, so the
+    direct write is never reordered with it. The changes stay in the
+    overlay and the journal until `release`.
+
+    Args:
+        discord_id (int): Player's Discord id.
+
+    Returns:
+        PlayerDeltaModel | None: The buffered changes, None if there are none.
+    """
+    if discord_id in self._flushing:
+      async with self._flush_lock:
+        if discord_id in self._flushing:
+          # Left by a failed write, which may have landed
+          await self._write_flushing(guarded=True)
+    delta = self._pending.pop(discord_id, None)
+    if delta is not None:
+      self._claimed[discord_id] = delta
+    return delta
+
+  async def release(self, discord_id: int, written: bool) -> None:
+    """Ends a `claim`.
+
+    Args:
+        discord_id (int): Player's Discord id.
+        written (bool): Whether the direct write carrying the changes was applied.
+    """
+    claimed = self._claimed.pop(discord_id, None)
+    if claimed is None:
+      return
+    if not written:
+      # Older than anything buffered meanwhile
+      newer = self._pending.pop(discord_id, None)
+      _combine(self._pending, discord_id, claimed)
+      if newer is not None:
+        _combine(self._pending, discord_id, newer)
+      if self._oldest is None:
+        self._oldest = self._clock()
+      return
+    # Replay skips everything journalled for the Player before this,
+    # so changes buffered meanwhile are journalled again after it
+    await self._journal.append(
+      {'discord_id': discord_id, 'written': True}
+    )
+    if (pending := self._pending.get(discord_id)) is not None:
+      await self._journal.append(_record(discord_id, pending))
+    if not self._pending:
+      self._oldest = None
+
+  # endregion
+
+  # region Flushing
+
+  async def flush(self) -> int:
+    """Writes all buffered changes with a single `bulk_write`.
+
+    A batch left by a crash or a failed write is retried first.
+
+    Returns:
+        int: Number of Players written.
+    """
+    async with self._flush_lock:
+      written = 0
+      if self._flushing:
+        written += await self._write_flushing(guarded=True)
+      if not self._pending:
+        return written
+      self._flushing, self._pending = self._pending, {}
+      self._expected = {}
+      self._count = 0
+      self._oldest = None
+      # Later deltas go to a fresh journal while this batch is written
+      flushing = self._journal.rotate(self._flushing_path)
+      if self._claimed:
+        # Not part of the batch, so they stay journalled
+        flushing.rewrite(self._batch_records())
+        self._journal.rewrite(self._records())
+
+      try:
+        async with db_circuit:
+          self._expected = await self._versions(self._flushing)
+      except BaseException:
+        # Nothing written, put the batch back under anything
+        # buffered meanwhile
+        batch, newer = self._flushing, self._pending
+        self._flushing, self._pending = {}, {}
+        self._count = 0
+        for deltas in (batch, newer):
+          for discord_id, delta in deltas.items():
+            self._merge(discord_id, delta)
+        self._journal.rewrite(self._records())
+        flushing.remove()
+        raise
+      flushing.rewrite(self._batch_records())
+      # If this fails the batch may still have landed, so it stays
+      # in the overlay and is retried guarded
+      return written + await self._write_flushing(guarded=False)
+
+  async def _versions(
+    self, batch: dict[int, PlayerDeltaModel]
+  ) -> dict[int, int]:
+    # Documents from before versioning count as version 0
+    return {
+      player['discord_id']: player.get('version', 0)
+      async for player in self._app.players.find(
+        by_discord_ids(list(batch)),
+        {'discord_id': 1, 'version': 1},
+      )
+    }
+
+  async def _write_flushing(self, guarded: bool) -> int:
+    updates = {
+      discord_id: versioned(delta.to_mongo())
+      for discord_id, delta in self._flushing.items()
+    }
+    async with db_circuit:
+      await self._app.players.bulk_write(
+        [
+          # Only matches if the update has not been applied yet
+          UpdateOne(
+            by_version(
+              discord_id,
+              self._expected.get(discord_id) if guarded else None,
+            ),
+            update,
+          )
+          for discord_id, update in updates.items()
+        ],
+        ordered=False,
+      )
+
+    Journal(self._flushing_path).remove()
+    # Cached records hold what is stored, so apply it there before
+    # the batch leaves the overlay
+    for discord_id, update in updates.items():
+      player_cache.modify(
+        discord_id,
+        lambda player, update=update: apply_update(player, update),
+      )
+    self._flushing, self._expected = {}, {}
+    self.flushes += 1
+    self.flushed += len(updates)
+    return len(updates)
+
+  # endregion
+
+  # region Journal
+  @property
+  def _flushing_path(self) -> str:
+    return f'{self._journal.path}.flushing'
+
+  def _records(self) -> list[dict]:
+    # One merged record per Player, replaces the journal after a change
+    return [
+      _record(discord_id, delta)
+      for deltas in (self._claimed, self._pending)
+      for discord_id, delta in deltas.items()
+    ]
+
+  def _batch_records(self) -> list[dict]:
+    return [
+      {
+        **_record(discord_id, delta),
+        'version': self._expected.get(discord_id),
+      }
+      for discord_id, delta in self._flushing.items()
+    ]
+
+  # endregion
+
+  def stats(self) -> dict:
+    """Returns counters used to tune the flush thresholds."""
+    return {
+      'enabled': self.enabled,
+      'players': len(self._pending),
+      'flushing': len(self._flushing),
+      'pending': self._count,
+      'oldest_age': self._clock() - self._oldest
+      if self._oldest is not None
+      else 0.0,
+      'flushes': self.flushes,
+      'flushed': self.flushed,
+    }
+
+
+def _combine(
+  batch: dict[int, PlayerDeltaModel],
+  discord_id: int,
+  delta: PlayerDeltaModel,
+) -> None:
+  merged = batch.get(discord_id)
+  if merged is None:
+    merged = batch[discord_id] = PlayerDeltaModel()
+  inc = merged.inc or {}
+  for path, amount in (delta.inc or {}).items():
+    inc[path] = inc.get(path, 0) + amount
+  merged.inc = inc or None
+  merged.set = {**(merged.set or {}), **(delta.set or {})} or None
+
+
+def fold(buffered: PlayerDeltaModel | None, update: dict) -> dict:
+  """Adds buffered changes to a direct write made after them.
+
+  The direct write's values were computed from a read overlaid with
+  the buffered changes, so paths it sets or unsets replace buffered
+  ones, while increments to the same path add up.
+
+  Args:
+      buffered (PlayerDeltaModel | None): Changes returned by `claim`.
+      update (dict): MongoDB update of the direct write.
+
+  Returns:
+      dict: Update applying both.
+  """
+  if buffered is None:
+    return update
+  replaced = [*update.get('$set', {}), *update.get('$unset', {})]
+
+  def kept(path: str) -> bool:
+    return not any(
+      path == other
+      or path.startswith(f'{other}.')
+      or other.startswith(f'{path}.')
+      for other in replaced
+    )
+
+  inc = dict(update.get('$inc', {}))
+  for path, amount in (buffered.inc or {}).items():
+    if kept(path):
+      inc[path] = inc.get(path, 0) + amount
+  values = {
+    path: value
+    for path, value in (buffered.set or {}).items()
+    if kept(path) and path not in inc
+  }
+  folded = {**update, '$inc': inc}
+  if values:
+    folded['$set'] = {**values, **update.get('$set', {})}
+  return folded
+
+
+def _record(discord_id: int, delta: PlayerDeltaModel) -> dict:
+  return {
+    'discord_id': discord_id,
+    'delta': delta.model_dump(exclude_none=True),
+  }
+
+
+# Buffer XP, favor and cooldown writes, see `db.db_app.open_database`
+WRITE_BEHIND = os.getenv('WRITE_BEHIND', '').lower() in (
+  '1',
+  'true',
+  'yes',
+)
+write_behind = WriteBehindBuffer(
+  journal_path=os.getenv(
+    'WRITE_BEHIND_JOURNAL', 'write_behind.journal'
+  ),
+  max_pending=int(os.getenv('WRITE_BEHIND_MAX_PENDING', '500')),
+  max_age=float(os.getenv('WRITE_BEHIND_MAX_AGE', '5')),
+)
@@ -1,8 +1,8 @@
+import asyncio
 import contextlib
 import datetime
 import logging
 import os
-import threading
 import time
 import traceback
 import typing
@@ -12,27 +12,134 @@ import aiohttp
 import discord
 import uvicorn
 import uvicorn.server
+from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
 from fastapi import FastAPI
 
-from db.db_app import app
+from db.db_app import app, close_database, open_database
+from db.monitoring import current_caller
+from utility.metrics import registry
+from utility.tracing import tracer
+
+# How the Bot and the DB API are run:
+# single: API served from the Bot's event loop, one process
+# bot: Bot only, with its own DB connection; run the API separately
+# api: API only, with `API_WORKERS` worker processes
+RUN_MODES = ('single', 'bot', 'api')
+
+command_seconds = registry.histogram(
+  'planephobia_command_seconds',
+  'Slash command latency in seconds.',
+  ('command', 'outcome'),
+)
+command_total = registry.counter(
+  'planephobia_commands_total',
+  'Slash commands handled.',
+  ('command', 'outcome'),
+)
+discord_http_seconds = registry.histogram(
+  'planephobia_discord_http_seconds',
+  'Discord HTTP request latency in seconds.',
+  ('method', 'route', 'status'),
+)
+
+
+def _route_of(path: str) -> str:
+  # Collapse snowflakes and tokens so each endpoint is one series
+  segments = path.split('/')
+  for index, segment in enumerate(segments):
+    if segment.isdigit():
+      segments[index] = '{id}'
+    elif len(segment) >= 32:
+      segments[index] = '{token}'
+  return '/'.join(segments)
+
+
+def discord_http_trace() -> aiohttp.TraceConfig:
+  """Builds a trace config timing every request to the Discord API.
+
+  Interaction responses go through the same session as REST calls,
+  so both are covered.
+
+  Returns:
+      aiohttp.TraceConfig: Trace config for the Bot's HTTP session.
+  """
+
+  async def on_start(session, context, params) -> None:
+    context.started = time.perf_counter()
+
+  def record(context, params, status: int | str) -> None:
+    elapsed = time.perf_counter() - context.started
+    route = _route_of(params.url.path)
+    discord_http_seconds.labels(
+      params.method, route, status
+    ).observe(elapsed)
+    tracer.record(
+      f'discord {params.method} {route}', context.started, elapsed
+    )
+
+  async def on_end(session, context, params) -> None:
+    record(context, params, params.response.status)
+
+  async def on_exception(session, context, params) -> None:
+    record(context, params, 'error')
+
+  trace = aiohttp.TraceConfig()
+  trace.on_request_start.append(on_start)
+  trace.on_request_end.append(on_end)
+  trace.on_request_exception.append(on_exception)
+  return trace
+
+
+def _record_command(
+  interaction: discord.Interaction, outcome: str
+) -> None:
+  if (trace := interaction.extras.get('trace')) is not None:
+    tracer.finish(trace, outcome)
+  started = interaction.extras.get('started')
+  if started is None or interaction.command is None:
+    return
+  name = interaction.command.qualified_name
+  command_seconds.labels(name, outcome).observe(
+    time.perf_counter() - started
+  )
+  command_total.labels(name, outcome).inc()
 
 
 class Server(uvicorn.Server):
-  """Custom Uvicorn Server class used as a context manager to ensure the DB server starts and stops correctly."""
+  """Custom Uvicorn Server class served from the Bot's event loop, so the DB client and the cogs share one loop."""
 
   @contextlib.contextmanager
-  def run_in_thread(self) -> Generator:
-    thread = threading.Thread(target=self.run)
-    thread.start()
-    try:
-      while not self.started:
-        time.sleep(0.001)
-        yield
-    finally:
-      self.should_exit = True
-      thread.join()
+  def capture_signals(self) -> Generator:
+    # The Bot owns signal handling and stops the server on close
+    yield
+
+
+class PlanephobiaTree(app_commands.CommandTree):
+  """Command tree that tags each interaction's task with its command, times and traces it."""
+
+  async def interaction_check(
+    self, interaction: discord.Interaction
+  ) -> bool:
+    # DB queries made by the command are attributed to it
+    if interaction.command is not None:
+      name = f'/{interaction.command.qualified_name}'
+      current_caller.set(name)
+      interaction.extras['trace'] = tracer.begin(
+        interaction.id, name
+      )
+    interaction.extras['started'] = time.perf_counter()
+    return True
+
+  async def on_error(
+    self,
+    interaction: discord.Interaction,
+    error: app_commands.AppCommandError,
+  ) -> None:
+    # Called after the command's own error handler, if any
+    _record_command(interaction, 'error')
+    await super().on_error(interaction, error)
 
 
 class PlanephobiaBot(commands.Bot):
@@ -47,6 +154,8 @@ class PlanephobiaBot(commands.Bot):
     ext_dir: str,
     app: FastAPI,
     *args: typing.Any,
+    mode: str = 'single',
+    server: Server | None = None,
     **kwargs: typing.Any,
   ) -> None:
     """Initiate the Bot.
@@ -55,6 +164,8 @@ class PlanephobiaBot(commands.Bot):
         prefix (str): Prefix for players to call Bot commands.
         ext_dir (str): External directory where cogs are stored.
         app (FastAPI): FastAPI.
+        mode (str, optional): One of `RUN_MODES`, except 'api'. Defaults to 'single'.
+        server (Server | None, optional): Uvicorn Server to serve in 'single' mode. Defaults to None.
     """
     intents = discord.Intents.all()
     intents.members = True
@@ -64,12 +175,43 @@ class PlanephobiaBot(commands.Bot):
       **kwargs,
       command_prefix=commands.when_mentioned_or(prefix),
       intents=intents,
+      tree_cls=PlanephobiaTree,
+      http_trace=discord_http_trace(),
     )
     self.logger = logging.getLogger(self.__class__.__name__)
     self.ext_dir = ext_dir
     self.app = app
+    self.mode = mode
+    self.server = server
+    self.server_task: asyncio.Task | None = None
     self.synced = True
 
+  async def _start_database(self) -> None:
+    """Connects to the DB on the Bot's event loop."""
+    if self.mode == 'single':
+      # Lifespan runs on this loop, so the Motor client does too
+      self.server_task = asyncio.create_task(
+        self.server.serve()
+      )
+      while not self.server.started:
+        if self.server_task.done():
+          # Raises whatever stopped the server from starting
+          self.server_task.result()
+          raise RuntimeError('HTTP server stopped on startup')
+        await asyncio.sleep(0.01)
+      self.logger.info(
+        f'HTTP server is running on http://{self.server.config.host}:{self.server.config.port}'
+      )
+    else:
+      await open_database(self.app)
+
+  async def _stop_database(self) -> None:
+    if self.server_task is not None:
+      self.server.should_exit = True
+      await self.server_task
+    elif self.mode == 'bot' and hasattr(self.app, 'client'):
+      await close_database(self.app)
+
   async def _load_extensions(self) -> None:
     """Loads the Bot's cogs."""
     if not os.path.isdir(self.ext_dir):
@@ -124,6 +266,13 @@ class PlanephobiaBot(commands.Bot):
         f'An error occurred in {event_method}.\n{traceback.format_exc()}'
       )
 
+  async def on_app_command_completion(
+    self,
+    interaction: discord.Interaction,
+    command: app_commands.Command | app_commands.ContextMenu,
+  ) -> None:
+    _record_command(interaction, 'ok')
+
   async def on_ready(self) -> None:
     self.logger.info(
       f'Logged in as {self.user} ({self.user.id})'
@@ -132,6 +281,7 @@ class PlanephobiaBot(commands.Bot):
   async def setup_hook(self) -> None:
     self.client = aiohttp.ClientSession()
 
+    await self._start_database()
     await self._load_extensions()
     if not self.synced:
       await self.tree.sync()
@@ -140,6 +290,7 @@ class PlanephobiaBot(commands.Bot):
   async def close(self) -> None:
     await super().close()
     await self.client.close()
+    await self._stop_database()
 
   def run(
     self, *args: typing.Any, **kwargs: typing.Any
@@ -167,30 +318,47 @@ class PlanephobiaBot(commands.Bot):
 
 def main() -> None:
   """Main function. Sets up Uvicorn, Logging and the Bot itself."""
-  # Set up uvicorn for db
-  config = uvicorn.Config(app=app, host='localhost')
-  server = Server(config=config)
-
-  # Run uvicorn on a separate thread
-  with server.run_in_thread():
-    address, port = (
-      server.config.bind_socket().getsockname()
-    )
-    print(
-      f'HTTP server is running on http://{address}.{port}'
+  load_dotenv()
+  mode = os.getenv('RUN_MODE', 'single')
+  if mode not in RUN_MODES:
+    raise ValueError(
+      f'RUN_MODE must be one of {", ".join(RUN_MODES)}, got {mode}'
     )
+  host = os.getenv('API_HOST', 'localhost')
+  port = int(os.getenv('API_PORT', '8000'))
 
-    # Set up logging
-    logging.basicConfig(
-      level=logging.INFO,
-      format='[%(asctime)s] %(levelname)s: %(message)s',
-    )
-    # Set up and run bot
-    bot = PlanephobiaBot(
-      prefix='!', ext_dir='cogs', app=app
+  # Set up logging
+  logging.basicConfig(
+    level=logging.INFO,
+    format='[%(asctime)s] %(levelname)s: %(message)s',
+  )
+
+  if mode == 'api':
+    # Workers import the app themselves, so pass it by name
+    uvicorn.run(
+      'db.db_app:app',
+      host=host,
+      port=port,
+      workers=int(os.getenv('API_WORKERS', '1')),
     )
+    return
+
+  # Set up uvicorn for db, served from the bot's loop
+  server = None
+  if mode == 'single':
+    config = uvicorn.Config(app=app, host=host, port=port)
+    server = Server(config=config)
+
+  # Set up and run bot
+  bot = PlanephobiaBot(
+    prefix='!',
+    ext_dir='cogs',
+    app=app,
+    mode=mode,
+    server=server,
+  )
 
-    bot.run()
+  bot.run()
 
 
 if __name__ == '__main__':
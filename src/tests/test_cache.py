@@ -0,0 +1,116 @@
+import asyncio
+
+from db.cache import PlayerCache
+
+
+class FakeClock:
+  def __init__(self) -> None:
+    self.now = 0.0
+
+  def __call__(self) -> float:
+    return self.now
+
+
+def test_entries_expire_after_ttl():
+  clock = FakeClock()
+  cache = PlayerCache(ttl=10, clock=clock)
+  cache.put(1, {'discord_id': 1})
+  clock.now = 9.9
+  assert cache.get(1) == {'discord_id': 1}
+  clock.now = 10
+  assert cache.get(1) is None
+  # Kept for outages until reloaded or evicted
+  assert cache.stale(1) == {'discord_id': 1}
+  assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_returns_copies():
+  cache = PlayerCache()
+  cache.put(1, {'inventory': {'a': 1}})
+  cache.get(1)['inventory']['a'] = 5
+  assert cache.peek(1) == {'inventory': {'a': 1}}
+
+
+def test_evicts_least_recently_used():
+  cache = PlayerCache(max_size=2)
+  cache.put(1, {'discord_id': 1})
+  cache.put(2, {'discord_id': 2})
+  cache.get(1)
+  cache.put(3, {'discord_id': 3})
+  assert cache.peek(2) is None
+  assert cache.peek(1) is not None
+  assert cache.peek(3) is not None
+  assert cache.evictions == 1
+
+
+def test_peek_does_not_refresh_lru_order():
+  cache = PlayerCache(max_size=2)
+  cache.put(1, {'discord_id': 1})
+  cache.put(2, {'discord_id': 2})
+  cache.peek(1)
+  cache.put(3, {'discord_id': 3})
+  assert cache.peek(1) is None
+  assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_concurrent_loads_share_one_query():
+  cache = PlayerCache()
+  calls = 0
+
+  async def loader():
+    nonlocal calls
+    calls += 1
+    await asyncio.sleep(0.01)
+    return {'discord_id': 1}
+
+  async def main():
+    return await asyncio.gather(
+      *(cache.get_or_load(1, loader) for _ in range(5))
+    )
+
+  results = asyncio.run(main())
+  assert calls == 1
+  assert results == [{'discord_id': 1}] * 5
+  assert (cache.misses, cache.coalesced) == (1, 4)
+  assert cache.peek(1) == {'discord_id': 1}
+
+
+def test_write_during_load_is_not_overwritten():
+  cache = PlayerCache()
+
+  async def loader():
+    cache.put(1, {'favor': 2})
+    return {'favor': 1}
+
+  asyncio.run(cache.get_or_load(1, loader))
+  assert cache.peek(1) == {'favor': 2}
+
+
+def test_failed_load_is_shared_and_not_cached():
+  cache = PlayerCache()
+
+  async def loader():
+    await asyncio.sleep(0.01)
+    raise ConnectionError('down')
+
+  async def main():
+    return await asyncio.gather(
+      cache.get_or_load(1, loader),
+      cache.get_or_load(1, loader),
+      return_exceptions=True,
+    )
+
+  results = asyncio.run(main())
+  assert all(isinstance(r, ConnectionError) for r in results)
+  assert cache.peek(1) is None
+  assert not cache._loading
+
+
+def test_missing_players_are_not_cached():
+  cache = PlayerCache()
+
+  async def loader():
+    return None
+
+  assert asyncio.run(cache.get_or_load(1, loader)) is None
+  assert len(cache) == 0
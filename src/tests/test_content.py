@@ -0,0 +1,156 @@
+import json
+import pickle
+from pathlib import Path
+
+import pytest
+
+from core.content import (
+  CONTENT_DIR,
+  ContentError,
+  compile_packs,
+  load_content,
+)
+
+RUM = {
+  'key': 'Rumshot',
+  'kind': 'consumable',
+  'name': 'Rum Shot',
+  'emoji': '🥃',
+  'description': 'Heals a little.',
+  'value': 5,
+  'stat': 'hp',
+  'amount': 10,
+}
+GULL = {
+  'key': 'Gull',
+  'name': 'Gull',
+  'emoji': '🐦',
+  'description': 'Loud.',
+  'drops': {'Rumshot': 0.5},
+  'hp': 5,
+  'atk': 1,
+}
+
+
+def pack(tmp_path: Path, name: str, **sections) -> Path:
+  path = tmp_path / name
+  path.write_text(json.dumps(sections))
+  return path
+
+
+def test_shipped_packs_compile():
+  files = sorted(CONTENT_DIR.glob('*.json'))
+  assert compile_packs(files)['items']
+
+
+def test_rows_follow_section_field_order(tmp_path):
+  sections = compile_packs(
+    [pack(tmp_path, 'a.json', items=[RUM], mobs=[GULL])]
+  )
+  assert sections['items'][0][:3] == (
+    'Rumshot',
+    'consumable',
+    'Rum Shot',
+  )
+  assert sections['mobs'][0][4] == {'Rumshot': 0.5}
+
+
+def test_later_packs_may_add_content(tmp_path):
+  sections = compile_packs(
+    [
+      pack(tmp_path, 'a.json', items=[RUM]),
+      pack(tmp_path, 'b.json', mobs=[GULL]),
+    ]
+  )
+  assert len(sections['mobs']) == 1
+
+
+@pytest.mark.parametrize(
+  ('sections', 'message'),
+  [
+    ({'items': [RUM, RUM]}, 'more than once'),
+    ({'mobs': [GULL]}, 'unknown items'),
+    ({'shops': []}, 'unknown section'),
+    ({'items': [{**RUM, 'kind': 'hat'}]}, 'unknown kind'),
+    ({'items': [{**RUM, 'colour': 'red'}]}, 'unknown'),
+    (
+      {'items': [{k: v for k, v in RUM.items() if k != 'stat'}]},
+      'missing',
+    ),
+    (
+      {'items': [RUM], 'mobs': [{**GULL, 'drops': ['Rumshot']}]},
+      'must be a table',
+    ),
+    (
+      {
+        'items': [RUM],
+        'mobs': [{**GULL, 'drops': {'Rumshot': '0.5'}}],
+      },
+      'must be a number',
+    ),
+    (
+      {
+        'items': [RUM],
+        'mobs': [{**GULL, 'drops': {'Rumshot': True}}],
+      },
+      'must be a number',
+    ),
+    (
+      {
+        'items': [RUM, {**RUM, 'key': 'Rumbottle'}],
+        'mobs': [
+          {**GULL, 'drops': {'Rumshot': 0.6, 'Rumbottle': 0.2}}
+        ],
+      },
+      'cumulative',
+    ),
+  ],
+)
+def test_rejects_invalid_packs(tmp_path, sections, message):
+  with pytest.raises(ContentError, match=message):
+    compile_packs([pack(tmp_path, 'a.json', **sections)])
+
+
+def test_malformed_pack_names_the_file(tmp_path):
+  path = tmp_path / 'broken.toml'
+  path.write_text('[[items]\n')
+  with pytest.raises(ContentError, match='broken.toml'):
+    compile_packs([path])
+
+
+def test_compiled_packs_are_cached(tmp_path):
+  content_dir = tmp_path / 'content'
+  content_dir.mkdir()
+  pack(content_dir, 'a.json', items=[RUM])
+  cache_dir = tmp_path / 'cache'
+  first = load_content(content_dir, cache_dir)
+  (cached,) = cache_dir.glob('*.pickle')
+  assert cached.stat().st_mode & 0o777 == 0o644
+  assert (
+    load_content(content_dir, cache_dir).sections == first.sections
+  )
+
+  # A changed pack is compiled again and replaces the old cache
+  pack(
+    content_dir, 'a.json', items=[RUM, {**RUM, 'key': 'Rumbottle'}]
+  )
+  second = load_content(content_dir, cache_dir)
+  assert second.digest != first.digest
+  assert [p.stem for p in cache_dir.glob('*.pickle')] == [
+    second.digest
+  ]
+
+
+def test_writable_cache_is_not_trusted(tmp_path):
+  content_dir = tmp_path / 'content'
+  content_dir.mkdir()
+  pack(content_dir, 'a.json', items=[RUM])
+  cache_dir = tmp_path / 'cache'
+  digest = load_content(content_dir, cache_dir).digest
+  cached = cache_dir / f'{digest}.pickle'
+  cached.write_bytes(pickle.dumps({'items': ('tampered',)}))
+  cached.chmod(0o666)
+  assert load_content(content_dir, cache_dir).rows('items') != (
+    'tampered',
+  )
+  assert cached.stat().st_mode & 0o777 == 0o644
@@ -0,0 +1,141 @@
+import asyncio
+
+from db.journal import Journal
+from db.outage import OutageLog
+
+
+class FakePlayers:
+  """Collection that records updates and can fail on demand."""
+
+  def __init__(self) -> None:
+    self.written = []
+    self.crash_at = None
+
+  async def update_one(self, query: dict, update: dict) -> None:
+    if len(self.written) == self.crash_at:
+      # The process dies before this write reaches MongoDB
+      raise asyncio.CancelledError
+    if update.get('bad'):
+      raise ValueError('rejected')
+    self.written.append(update)
+
+
+class FakeApp:
+  def __init__(self) -> None:
+    self.players = FakePlayers()
+
+
+def inc(n: int) -> dict:
+  return {'$inc': {'favor': n}}
+
+
+def test_append_then_read(tmp_path):
+  journal = Journal(str(tmp_path / 'j'), sync_delay=0)
+  journal.open()
+
+  async def main():
+    await asyncio.gather(
+      *(journal.append({'n': n}) for n in range(5))
+    )
+
+  asyncio.run(main())
+  journal.close()
+  assert journal.read() == [{'n': n} for n in range(5)]
+  # Appends made together share an fsync
+  assert journal.syncs < 5
+
+
+def test_rewrite_keeps_the_journal_open(tmp_path):
+  journal = Journal(str(tmp_path / 'j'), sync_delay=0)
+  journal.open()
+  asyncio.run(journal.append({'n': 1}))
+  journal.rewrite([{'n': 2}, {'n': 3}])
+  asyncio.run(journal.append({'n': 4}))
+  journal.close()
+  assert journal.read() == [{'n': 2}, {'n': 3}, {'n': 4}]
+  assert not (tmp_path / 'j.tmp').exists()
+
+
+def test_rotate_moves_records_and_starts_empty(tmp_path):
+  journal = Journal(str(tmp_path / 'j'), sync_delay=0)
+  journal.open()
+  asyncio.run(journal.append({'n': 1}))
+  moved = journal.rotate(str(tmp_path / 'j.flushing'))
+  asyncio.run(journal.append({'n': 2}))
+  journal.close()
+  assert moved.read() == [{'n': 1}]
+  assert journal.read() == [{'n': 2}]
+  journal.remove()
+  assert journal.read() == []
+
+
+def test_replay_writes_in_order_and_empties_the_journal(tmp_path):
+  app = FakeApp()
+
+  async def main():
+    log = OutageLog(Journal(str(tmp_path / 'o')))
+    await log.start(app)
+    for n in range(3):
+      await log.record(1, inc(n))
+    assert log.overlay(1, {'favor': 10}) == {'favor': 13}
+    log.schedule_replay()
+    await log._replaying
+    await log.stop()
+    return log
+
+  log = asyncio.run(main())
+  assert app.players.written == [inc(0), inc(1), inc(2)]
+  assert log.pending == 0
+  assert Journal(str(tmp_path / 'o')).read() == []
+
+
+def test_replay_after_crash_does_not_repeat_writes(tmp_path):
+  app = FakeApp()
+  path = str(tmp_path / 'o')
+
+  async def crash():
+    log = OutageLog(Journal(path))
+    await log.start(app)
+    for n in range(4):
+      await log.record(1, inc(n))
+    app.players.crash_at = 2
+    log.schedule_replay()
+    try:
+      await log._replaying
+    except asyncio.CancelledError:
+      pass
+    log.journal.close()
+
+  async def restart():
+    app.players.crash_at = None
+    log = OutageLog(Journal(path))
+    await log.start(app)
+    assert log.pending == 2
+    await log._replaying
+    await log.stop()
+
+  asyncio.run(crash())
+  asyncio.run(restart())
+  assert app.players.written == [inc(0), inc(1), inc(2), inc(3)]
+
+
+def test_rejected_writes_are_set_aside(tmp_path):
+  app = FakeApp()
+  path = str(tmp_path / 'o')
+
+  async def main():
+    log = OutageLog(Journal(path))
+    await log.start(app)
+    await log.record(1, inc(1))
+    await log.record(1, {'bad': 1})
+    await log.record(1, inc(2))
+    log.schedule_replay()
+    await log._replaying
+    await log.stop()
+    return log
+
+  log = asyncio.run(main())
+  assert app.players.written == [inc(1), inc(2)]
+  assert log.stats()['rejected'] == 1
+  rejected = Journal(f'{path}.rejected').read()
+  assert [r['update'] for r in rejected] == [{'bad': 1}]
@@ -0,0 +1,90 @@
+import asyncio
+
+from core.mailbox import PlayerMailbox
+
+
+def test_hold_is_reentrant_within_a_task():
+  mailbox = PlayerMailbox()
+
+  async def helper():
+    async with mailbox.hold(1), mailbox.hold_many(1, 2):
+      return len(mailbox)
+
+  async def main():
+    async with mailbox.hold(1):
+      return await helper()
+
+  assert asyncio.run(asyncio.wait_for(main(), 1)) == 2
+  assert len(mailbox) == 0
+
+
+def test_other_tasks_wait_for_the_holder():
+  mailbox = PlayerMailbox()
+  events = []
+
+  async def command(name: str):
+    async with mailbox.hold(1):
+      events.append(f'{name} start')
+      await asyncio.sleep(0.01)
+      events.append(f'{name} end')
+
+  async def main():
+    await asyncio.gather(command('a'), command('b'))
+
+  asyncio.run(main())
+  assert events == ['a start', 'a end', 'b start', 'b end']
+  assert mailbox.stats()['contended'] == 1
+
+
+def test_child_tasks_do_not_share_the_hold():
+  mailbox = PlayerMailbox()
+
+  async def child():
+    async with mailbox.hold(1):
+      pass
+
+  async def main():
+    async with mailbox.hold(1):
+      task = asyncio.create_task(child())
+      await asyncio.sleep(0.01)
+      assert not task.done()
+    await task
+
+  asyncio.run(main())
+  assert len(mailbox) == 0
+
+
+def test_overlapping_hold_many_does_not_deadlock():
+  mailbox = PlayerMailbox()
+
+  async def duel(*discord_ids: int):
+    async with mailbox.hold_many(*discord_ids):
+      await asyncio.sleep(0.001)
+
+  async def main():
+    await asyncio.wait_for(
+      asyncio.gather(duel(1, 2), duel(2, 1), duel(2, 3), duel(3, 1)),
+      1,
+    )
+
+  asyncio.run(main())
+  assert len(mailbox) == 0
+
+
+def test_cancelled_waiter_releases_its_slot():
+  mailbox = PlayerMailbox()
+
+  async def main():
+    async with mailbox.hold(1):
+      waiter = asyncio.create_task(child_hold())
+      await asyncio.sleep(0)
+      waiter.cancel()
+      await asyncio.gather(waiter, return_exceptions=True)
+      assert mailbox._slots[1].users == 1
+
+  async def child_hold():
+    async with mailbox.hold(1):
+      pass
+
+  asyncio.run(main())
+  assert len(mailbox) == 0
@@ -0,0 +1,110 @@
+import copy
+
+import pytest
+from pydantic import ValidationError
+
+from core.player_utils import PlayerUnitOfWork
+from db.models.playerDeltaModel import (
+  PlayerDeltaModel,
+  apply_update,
+  versioned,
+)
+from db.models.playerModel import PlayerModel
+
+EXAMPLE = PlayerModel.model_config['json_schema_extra']['example']
+
+
+def make_player() -> PlayerModel:
+  return PlayerModel(**copy.deepcopy(EXAMPLE))
+
+
+def test_to_mongo_builds_one_operator_per_kind():
+  delta = PlayerDeltaModel(
+    inc={'stats.currentxp': 40},
+    set={'cooldowns.hunt': 1.5},
+    unset=['inventory.rumbottle'],
+  )
+  assert delta.to_mongo() == {
+    '$inc': {'stats.currentxp': 40},
+    '$set': {'cooldowns.hunt': 1.5},
+    '$unset': {'inventory.rumbottle': ''},
+  }
+
+
+def test_apply_update_matches_mongo():
+  player = {'favor': 1, 'inventory': {'a': 2, 'b': 1}}
+  apply_update(
+    player,
+    versioned(
+      {
+        '$inc': {'favor': 2, 'inventory.a': 1},
+        '$set': {'inventory.c': 4},
+        '$unset': {'inventory.b': ''},
+      }
+    ),
+  )
+  assert player == {
+    'favor': 3,
+    'inventory': {'a': 3, 'c': 4},
+    'version': 1,
+  }
+
+
+@pytest.mark.parametrize(
+  'delta',
+  [
+    {'set': {'discord_id': 1}},
+    {'set': {'stats.hp.max': 1}},
+    {'set': {'inventory.$': 1}},
+    {'set': {'inventory.$[]': 1}},
+    {'unset': ['inventory.']},
+    {'set': {'favor.x': 1}},
+    {'inc': {'title': 1}},
+    {'set': {'stats.hp': 'lots'}},
+    {'set': {'favor': None}},
+    {'inc': {'favor': 1}, 'set': {'favor': 2}},
+    {'set': {'inventory': {}}, 'inc': {'inventory.a': 1}},
+  ],
+)
+def test_rejects_invalid_deltas(delta):
+  with pytest.raises(ValidationError):
+    PlayerDeltaModel(**delta)
+
+
+def test_set_values_are_coerced_to_the_field_type():
+  delta = PlayerDeltaModel(set={'stats.hp': '5'})
+  assert delta.set == {'stats.hp': 5}
+
+
+def test_uow_records_field_level_changes():
+  uow = PlayerUnitOfWork(None, make_player())
+  uow.update_favor(5)
+  uow.update_favor(-2)
+  uow.add_item('rumbottle', 2)
+  uow.start_cooldown('hunt')
+  delta = uow.to_delta()
+  assert delta.inc == {'favor': 3, 'inventory.rumbottle': 2}
+  assert set(delta.set) == {'cooldowns.hunt'}
+  assert delta.unset is None
+
+
+def test_uow_remove_then_add_sets_the_new_amount():
+  player = make_player()
+  uow = PlayerUnitOfWork(None, player)
+  uow.remove_item('rumbottle', 5)
+  uow.add_item('rumbottle', 2)
+  delta = uow.to_delta()
+  # A single path, so MongoDB accepts the update
+  assert delta.paths() == ['inventory.rumbottle']
+  assert delta.set == {'inventory.rumbottle': 2}
+  stored = copy.deepcopy(EXAMPLE)
+  assert delta.apply_to(stored)['inventory'] == player.inventory
+
+
+def test_uow_add_then_remove_unsets():
+  uow = PlayerUnitOfWork(None, make_player())
+  uow.add_item('rumbottle', 1)
+  uow.remove_item('rumbottle', 6)
+  delta = uow.to_delta()
+  assert delta.inc is None
+  assert delta.unset == ['inventory.rumbottle']
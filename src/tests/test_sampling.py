@@ -0,0 +1,77 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from core.sampling import AliasSampler
+
+
+def implied(sampler: AliasSampler) -> dict:
+  """Exact probability of each outcome under the alias table."""
+  n = len(sampler.outcomes)
+  mass = Counter()
+  for i, p in enumerate(sampler._prob):
+    mass[sampler.outcomes[i]] += p / n
+    mass[sampler.outcomes[sampler._alias[i]]] += (1 - p) / n
+  return mass
+
+
+def test_table_matches_weights():
+  sampler = AliasSampler(['a', 'b', 'c', 'd'], [1, 2, 3, 4])
+  mass = implied(sampler)
+  for outcome, weight in zip('abcd', [1, 2, 3, 4]):
+    assert math.isclose(mass[outcome], weight / 10)
+
+
+def test_zero_weight_is_never_drawn():
+  sampler = AliasSampler(['a', 'b', 'c'], [0, 1, 1])
+  assert implied(sampler)['a'] == 0
+  rng = random.Random(1)
+  assert 'a' not in sampler.draws(2000, rng)
+
+
+def test_draws_follow_the_weights():
+  sampler = AliasSampler(['a', 'b'], [1, 3])
+  counts = Counter(sampler.draws(20000, random.Random(7)))
+  assert abs(counts['b'] / 20000 - 0.75) < 0.02
+
+
+def test_draw_and_draws_agree():
+  sampler = AliasSampler(['a', 'b', 'c'], [5, 1, 2])
+  rng = random.Random(3)
+  one_by_one = [sampler.draw(rng) for _ in range(50)]
+  assert one_by_one == sampler.draws(50, random.Random(3))
+
+
+def test_from_cumulative_matches_random_choices():
+  sampler = AliasSampler.from_cumulative(
+    ['a', 'b', 'c'], [10, 30, 60], total=100, rest=None
+  )
+  mass = implied(sampler)
+  assert math.isclose(mass['a'], 0.1)
+  assert math.isclose(mass['b'], 0.2)
+  assert math.isclose(mass['c'], 0.3)
+  assert math.isclose(mass[None], 0.4)
+
+
+@pytest.mark.parametrize(
+  ('outcomes', 'weights'),
+  [
+    ([], []),
+    (['a'], [1, 2]),
+    (['a', 'b'], [1, -1]),
+    (['a'], [math.nan]),
+    (['a', 'b'], [0, 0]),
+  ],
+)
+def test_rejects_invalid_tables(outcomes, weights):
+  with pytest.raises(ValueError):
+    AliasSampler(outcomes, weights)
+
+
+def test_from_cumulative_rejects_bad_totals():
+  with pytest.raises(ValueError):
+    AliasSampler.from_cumulative(['a', 'b'], [5, 3])
+  with pytest.raises(ValueError):
+    AliasSampler.from_cumulative(['a'], [5], total=4)
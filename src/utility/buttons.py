@@ -1,5 +1,8 @@
 import discord
 
+from db.routes import list_players
+from utility import embeds
+
 
 class DuelConsentButton(discord.ui.View):
   def __init__(
@@ -129,3 +132,72 @@ class PlayerClassButtons(discord.ui.View):
         view=self,
       )
     return await super().on_timeout()
+
+
+class PlayerListPages(discord.ui.View):
+  def __init__(
+    self, app, *, timeout: int = 180, page_size: int = 10
+  ):
+    """Creates a Discord button set to page through all Players.
+
+    Args:
+        app: FastAPI app holding the `players` collection.
+        timeout (int, optional): Seconds until interaction times out. Defaults to 180.
+        page_size (int, optional): Players shown per page. Defaults to 10.
+    """
+    super().__init__(timeout=timeout)
+    self.app = app
+    self.page_size = page_size
+    self.response = None
+    # Cursor used to fetch each page visited so far
+    self.cursors: list[int | None] = [None]
+    self.next_after: int | None = None
+
+  async def load_page(self) -> embeds.PlayerListEmbed:
+    """Fetches the page at the current cursor.
+
+    Returns:
+        PlayerListEmbed: Embed listing the Players on the page.
+    """
+    page = await list_players(
+      self.app, limit=self.page_size, after=self.cursors[-1]
+    )
+    self.next_after = page.next_after
+    self.previous.disabled = len(self.cursors) <= 1
+    self.next.disabled = self.next_after is None
+    return embeds.PlayerListEmbed(
+      page.players, len(self.cursors)
+    )
+
+  @discord.ui.button(
+    label='Previous', style=discord.ButtonStyle.grey
+  )
+  async def previous(
+    self,
+    interaction: discord.Interaction,
+    button: discord.ui.Button,
+  ):
+    self.cursors.pop()
+    return await interaction.response.edit_message(
+      embed=await self.load_page(), view=self
+    )
+
+  @discord.ui.button(
+    label='Next', style=discord.ButtonStyle.grey
+  )
+  async def next(
+    self,
+    interaction: discord.Interaction,
+    button: discord.ui.Button,
+  ):
+    self.cursors.append(self.next_after)
+    return await interaction.response.edit_message(
+      embed=await self.load_page(), view=self
+    )
+
+  async def on_timeout(self):
+    for item in self.children:
+      item.disabled = True
+    if self.response:
+      await self.response.edit(view=self)
+    return await super().on_timeout()
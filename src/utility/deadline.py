@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+from collections.abc import Callable
+from functools import wraps
+from typing import Any
+
+import discord
+from dotenv import load_dotenv
+
+from utility.metrics import registry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Discord drops interactions not acknowledged within this many seconds
+ACK_DEADLINE = 3.0
+# Age at which a command that has not responded yet is deferred
+DEFER_AFTER = float(os.getenv('INTERACTION_DEFER_AFTER', '2.0'))
+
+# Methods that acknowledge an interaction
+_ACK_METHODS = (
+  'send_message',
+  'defer',
+  'edit_message',
+  'send_modal',
+)
+
+ack_seconds = registry.histogram(
+  'planephobia_interaction_ack_seconds',
+  'Interaction age when it was acknowledged, in seconds.',
+  ('command', 'method'),
+)
+auto_deferrals = registry.counter(
+  'planephobia_interaction_auto_deferrals_total',
+  'Interactions deferred because the command was close to the deadline.',
+  ('command',),
+)
+late_acks = registry.counter(
+  'planephobia_interaction_late_acks_total',
+  'Interactions acknowledged after the deadline.',
+  ('command',),
+)
+
+
+def _age(interaction: discord.Interaction) -> float:
+  return (
+    discord.utils.utcnow() - interaction.created_at
+  ).total_seconds()
+
+
+class DeadlineResponse:
+  """Stands in for `interaction.response` while a command runs.
+
+  The first acknowledgement is timed against the deadline. Once the
+  interaction has been deferred, `send_message` goes through the
+  followup webhook and `edit_message` edits the deferred response
+  instead, so commands need not know whether they were deferred.
+  Everything else is passed to the real response.
+
+  Args:
+      interaction (discord.Interaction): Interaction being handled.
+      command (str): Command name used in metrics.
+      ephemeral (bool, optional): Defer with an ephemeral response. Defaults to False.
+  """
+
+  def __init__(
+    self,
+    interaction: discord.Interaction,
+    command: str,
+    ephemeral: bool = False,
+  ) -> None:
+    self._interaction = interaction
+    self._response = interaction.response
+    self._command = command
+    self._ephemeral = ephemeral
+    # Stops the deferral racing the command's own response
+    self._lock = asyncio.Lock()
+    self.auto_deferred = False
+
+  def __getattr__(self, name: str) -> Any:
+    attr = getattr(self._response, name)
+    if name not in _ACK_METHODS:
+      return attr
+
+    async def acknowledge(*args, **kwargs):
+      async with self._lock:
+        if name == 'send_message' and self._response.is_done():
+          return await self._followup(*args, **kwargs)
+        if self.auto_deferred:
+          if name == 'edit_message':
+            return await self._edit_original(**kwargs)
+          if name == 'send_modal':
+            raise RuntimeError(
+              f'{self._command} was deferred and can no longer send a modal, drop `auto_defer`'
+            )
+        result = await attr(*args, **kwargs)
+        self._record(name)
+        return result
+
+    return acknowledge
+
+  async def _followup(self, *args, **kwargs):
+    # Not supported by webhooks
+    kwargs.pop('delete_after', None)
+    return await self._interaction.followup.send(*args, **kwargs)
+
+  async def _edit_original(self, **kwargs):
+    # Not supported when editing the deferred response
+    kwargs.pop('delete_after', None)
+    kwargs.pop('suppress_embeds', None)
+    return await self._interaction.edit_original_response(**kwargs)
+
+  def _record(self, method: str) -> None:
+    age = _age(self._interaction)
+    ack_seconds.labels(self._command, method).observe(age)
+    if age > ACK_DEADLINE:
+      late_acks.labels(self._command).inc()
+
+  async def defer_if_pending(self) -> None:
+    """Defers the interaction unless it was already acknowledged."""
+    async with self._lock:
+      if self._response.is_done():
+        return
+      await self._response.defer(
+        thinking=True, ephemeral=self._ephemeral
+      )
+      self.auto_deferred = True
+      auto_deferrals.labels(self._command).inc()
+      self._record('auto_defer')
+
+
+async def _defer_later(
+  response: DeadlineResponse, delay: float
+) -> None:
+  await asyncio.sleep(delay)
+  try:
+    await response.defer_if_pending()
+  except discord.HTTPException as e:
+    # Usually the interaction expired before we got to it
+    logger.warning('Could not defer interaction: %s', e)
+
+
+def auto_defer(
+  defer_after: float = DEFER_AFTER, ephemeral: bool = False
+) -> Callable:
+  """Defers a slash command that has not responded in time.
+
+  Place under `app_commands.command`. If the command has not
+  acknowledged the interaction `defer_after` seconds after it was
+  created, it is deferred, and later `response.send_message` calls
+  are sent as followups.
+
+  Not for commands that may answer with a modal, which cannot follow
+  a deferral. Commands that reply ephemerally must pass `ephemeral`,
+  as a deferred response keeps the visibility it was deferred with.
+
+  Args:
+      defer_after (float, optional): Interaction age in seconds before deferring. Defaults to `DEFER_AFTER`.
+      ephemeral (bool, optional): Whether the command replies ephemerally. Defaults to False.
+  """
+
+  def decorate(callback: Callable) -> Callable:
+    @wraps(callback)
+    async def wrapper(
+      self, interaction: discord.Interaction, *args, **kwargs
+    ):
+      original = interaction.response
+      response = DeadlineResponse(
+        interaction,
+        f'/{interaction.command.qualified_name}',
+        ephemeral=ephemeral,
+      )
+      # `Interaction.response` is cached in this slot
+      interaction._cs_response = response
+      watcher = asyncio.create_task(
+        _defer_later(
+          response, max(0.0, defer_after - _age(interaction))
+        )
+      )
+      try:
+        return await callback(self, interaction, *args, **kwargs)
+      finally:
+        watcher.cancel()
+        interaction._cs_response = original
+
+    return wrapper
+
+  return decorate
@@ -1,8 +1,9 @@
-import importlib
 from enum import Enum, IntEnum
 
 from discord import Embed, User
 
+from core.items import ITEMS
+from db.models.partialPlayerModel import PartialPlayerModel
 from db.models.playerModel import PlayerModel
 
 
@@ -61,6 +62,17 @@ class ExceptionEmbed(Embed):
     )
 
 
+class NotRegisteredEmbed(Embed):
+  """Discord Embed for Players who have not registered yet."""
+
+  def __init__(self) -> None:
+    super().__init__(
+      color=EmbedColors.DEFAULT,
+      title='Not Registered',
+      description='You have not registered yet. Use `/start` to create a Player.',
+    )
+
+
 class HelpEmbed(Embed):
   """Discord Embed for Help command."""
 
@@ -134,7 +146,9 @@ class ProfileEmbed(Embed):
 class StatsEmbed(Embed):
   """Discord Embed for Stats command."""
 
-  def __init__(self, player: PlayerModel, user: User):
+  def __init__(
+    self, player: PlayerModel | PartialPlayerModel, user: User
+  ):
     super().__init__(
       color=EmbedColors.DEFAULT,
       title='ALL STATS',
@@ -149,7 +163,9 @@ class StatsEmbed(Embed):
 class InventoryEmbed(Embed):
   """Discord Embed for Inventory command."""
 
-  def __init__(self, player: PlayerModel):
+  def __init__(
+    self, player: PlayerModel | PartialPlayerModel
+  ):
     inventory = ''
     if (
       player.inventory is None or len(player.inventory) <= 0
@@ -157,11 +173,7 @@ class InventoryEmbed(Embed):
       inventory = 'Your inventory is empty.'
     else:
       for key in player.inventory.keys():
-        # Get the item
-        ItemClass = getattr(
-          importlib.import_module('core.items'), key
-        )
-        item = ItemClass()
+        item = ITEMS[key]
 
         inventory = (
           inventory
@@ -175,6 +187,26 @@ class InventoryEmbed(Embed):
     )
 
 
+class PlayerListEmbed(Embed):
+  """Discord Embed for one page of the Players command."""
+
+  def __init__(self, players: list[PlayerModel], page: int):
+    if players:
+      description = '\n'.join(
+        f'<@{player.discord_id}> - {player.playerClass}, Lv {player.stats["level"]}'
+        for player in players
+      )
+    else:
+      description = 'No Players found.'
+
+    super().__init__(
+      color=EmbedColors.DEFAULT,
+      title='PLAYERS',
+      description=description,
+    )
+    self.set_footer(text=f'Page {page}')
+
+
 class CooldownsEmbed(Embed):
   """Discord Embed for Cooldowns command."""
 
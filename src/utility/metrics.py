@@ -0,0 +1,219 @@
+import threading
+from bisect import bisect_left
+from collections.abc import Callable
+
+# Upper bounds in seconds, from 1ms to 10s
+LATENCY_BUCKETS = (
+  0.001,
+  0.0025,
+  0.005,
+  0.01,
+  0.025,
+  0.05,
+  0.1,
+  0.25,
+  0.5,
+  1.0,
+  2.5,
+  5.0,
+  10.0,
+)
+
+
+class Histogram:
+  """Fixed-bucket latency histogram, safe to update from any thread.
+
+  Args:
+      buckets (tuple[float, ...], optional): Sorted bucket upper bounds. Defaults to LATENCY_BUCKETS.
+  """
+
+  __slots__ = ('_lock', 'buckets', 'count', 'counts', 'max', 'sum')
+
+  def __init__(
+    self, buckets: tuple[float, ...] = LATENCY_BUCKETS
+  ) -> None:
+    self.buckets = buckets
+    # Last slot counts values above the largest bound
+    self.counts = [0] * (len(buckets) + 1)
+    self.count = 0
+    self.sum = 0.0
+    self.max = 0.0
+    self._lock = threading.Lock()
+
+  def observe(self, value: float) -> None:
+    index = bisect_left(self.buckets, value)
+    with self._lock:
+      self.counts[index] += 1
+      self.count += 1
+      self.sum += value
+      self.max = max(self.max, value)
+
+  def quantile(self, q: float) -> float:
+    """Estimates a quantile as the upper bound of its bucket.
+
+    Args:
+        q (float): Quantile between 0 and 1.
+
+    Returns:
+        float: Estimated value, 0 if nothing was observed.
+    """
+    if not self.count:
+      return 0.0
+    rank = q * self.count
+    seen = 0
+    for index, count in enumerate(self.counts):
+      seen += count
+      if seen >= rank:
+        break
+    if index == len(self.buckets):
+      return self.max
+    return min(self.buckets[index], self.max)
+
+  def summary(self) -> dict:
+    """Returns count, mean, max and estimated quantiles in ms."""
+    return {
+      'count': self.count,
+      'avg_ms': 1000 * self.sum / self.count if self.count else 0.0,
+      'max_ms': 1000 * self.max,
+      'p50_ms': 1000 * self.quantile(0.5),
+      'p95_ms': 1000 * self.quantile(0.95),
+      'p99_ms': 1000 * self.quantile(0.99),
+    }
+
+
+class Counter:
+  """Monotonic counter, safe to update from any thread."""
+
+  __slots__ = ('_lock', 'value')
+
+  def __init__(self) -> None:
+    self.value = 0.0
+    self._lock = threading.Lock()
+
+  def inc(self, amount: float = 1.0) -> None:
+    with self._lock:
+      self.value += amount
+
+
+class Family:
+  """A named metric with one child per combination of label values.
+
+  Args:
+      name (str): Metric name.
+      help (str): Description shown by Prometheus.
+      kind (str): 'counter' or 'histogram'.
+      labels (tuple[str, ...], optional): Label names. Defaults to ().
+  """
+
+  def __init__(
+    self,
+    name: str,
+    help: str,
+    kind: str,
+    labels: tuple[str, ...] = (),
+  ) -> None:
+    self.name = name
+    self.help = help
+    self.kind = kind
+    self.label_names = labels
+    self._children: dict[tuple[str, ...], Counter | Histogram] = {}
+    self._lock = threading.Lock()
+
+  def labels(self, *values: object) -> Counter | Histogram:
+    """Returns the child for these label values, creating it if needed."""
+    key = tuple(str(value) for value in values)
+    if (child := self._children.get(key)) is None:
+      with self._lock:
+        if (child := self._children.get(key)) is None:
+          child = Counter() if self.kind == 'counter' else Histogram()
+          self._children[key] = child
+    return child
+
+  def render(self) -> list[str]:
+    lines = [
+      f'# HELP {self.name} {self.help}',
+      f'# TYPE {self.name} {self.kind}',
+    ]
+    for key, child in list(self._children.items()):
+      labels = dict(zip(self.label_names, key))
+      if isinstance(child, Counter):
+        lines.append(_sample(self.name, labels, child.value))
+        continue
+      cumulative = 0
+      for bound, count in zip((*child.buckets, '+Inf'), child.counts):
+        cumulative += count
+        lines.append(
+          _sample(
+            f'{self.name}_bucket',
+            {**labels, 'le': str(bound)},
+            cumulative,
+          )
+        )
+      lines.append(_sample(f'{self.name}_sum', labels, child.sum))
+      lines.append(_sample(f'{self.name}_count', labels, child.count))
+    return lines
+
+
+class Registry:
+  """In-process metric registry rendered in Prometheus text format.
+
+  Counters and histograms are updated where things happen. Values
+  that are already tracked elsewhere, such as the cache size, are
+  read by callbacks registered with `gauge` when rendering.
+  """
+
+  def __init__(self) -> None:
+    self._families: dict[str, Family] = {}
+    self._gauges: dict[str, tuple[str, Callable[[], float]]] = {}
+
+  def counter(
+    self, name: str, help: str, labels: tuple[str, ...] = ()
+  ) -> Family:
+    return self._family(name, help, 'counter', labels)
+
+  def histogram(
+    self, name: str, help: str, labels: tuple[str, ...] = ()
+  ) -> Family:
+    return self._family(name, help, 'histogram', labels)
+
+  def gauge(
+    self, name: str, help: str, read: Callable[[], float]
+  ) -> None:
+    self._gauges[name] = (help, read)
+
+  def _family(
+    self, name: str, help: str, kind: str, labels: tuple[str, ...]
+  ) -> Family:
+    if name not in self._families:
+      self._families[name] = Family(name, help, kind, labels)
+    return self._families[name]
+
+  def render(self) -> str:
+    lines = []
+    for family in self._families.values():
+      lines.extend(family.render())
+    for name, (help, read) in self._gauges.items():
+      lines.append(f'# HELP {name} {help}')
+      lines.append(f'# TYPE {name} gauge')
+      lines.append(_sample(name, {}, read()))
+    return '\n'.join(lines) + '\n'
+
+
+def _sample(name: str, labels: dict[str, str], value: float) -> str:
+  if not labels:
+    return f'{name} {value}'
+  pairs = ','.join(
+    f'{key}="{_escape(value)}"' for key, value in labels.items()
+  )
+  return f'{name}{{{pairs}}} {value}'
+
+
+def _escape(value: str) -> str:
+  return (
+    value.replace('\\', '\\\\')
+    .replace('"', '\\"')
+    .replace('\n', '\\n')
+  )
+
+
+registry = Registry()
@@ -0,0 +1,178 @@
+import inspect
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import nullcontext
+from functools import wraps
+from typing import Any
+
+import discord
+from fastapi import HTTPException
+
+import core.player_utils as utils
+from core.mailbox import player_mailbox
+from db.models.partialPlayerModel import PartialPlayerModel
+from db.models.playerModel import PlayerModel
+from db.routes import get_player
+from utility import embeds
+from utility.metrics import registry
+
+# Parameters filled in by `player_command` rather than by Discord
+_INJECTED = ('player', 'uow')
+# Response methods that show the Player a result
+_REPLY_METHODS = ('send_message', 'edit_message', 'send_modal')
+
+player_load_seconds = registry.histogram(
+  'planephobia_command_player_load_seconds',
+  'Time to load the calling Player for a slash command, in seconds.',
+  ('command',),
+)
+player_commit_seconds = registry.histogram(
+  'planephobia_command_player_commit_seconds',
+  "Time to write a slash command's pending changes, in seconds.",
+  ('command',),
+)
+not_registered = registry.counter(
+  'planephobia_command_not_registered_total',
+  'Slash commands used by someone without a Player.',
+  ('command',),
+)
+
+
+class CommitFirstResponse:
+  """Stands in for `interaction.response` while a `player_command` runs.
+
+  Pending changes are committed before each reply is sent, so the
+  Player is never told about changes that were then not saved. If
+  the commit fails, the reply is not sent and the error is raised
+  to the command's error handler instead.
+
+  Args:
+      response: The interaction's response, possibly a `DeadlineResponse`.
+      commit (Callable[[], Awaitable[None]]): Writes the command's pending changes.
+  """
+
+  def __init__(
+    self, response, commit: Callable[[], Awaitable[None]]
+  ) -> None:
+    self._response = response
+    self._commit = commit
+
+  def __getattr__(self, name: str) -> Any:
+    attr = getattr(self._response, name)
+    if name not in _REPLY_METHODS:
+      return attr
+
+    async def reply(*args, **kwargs):
+      await self._commit()
+      return await attr(*args, **kwargs)
+
+    return reply
+
+
+def player_command(fields: list[str] | None = None) -> Callable:
+  """Loads the calling Player once and passes it to the command.
+
+  Place under `app_commands.command` (and `auto_defer`). The command
+  declares a `player` and/or `uow` parameter, which are filled in
+  here and hidden from Discord. Callers who have not registered get
+  `NotRegisteredEmbed` and the command is not run. Changes in `uow`
+  are committed before the command replies, see
+  `CommitFirstResponse`, and any left when it returns after that.
+
+  Unless `fields` is given, the Player's `player_mailbox` lock is
+  held from loading to committing, so two commands by the same
+  Player cannot both act on the same loaded state.
+
+  Args:
+      fields (list[str] | None, optional): Only load these fields, the command then gets a read-only `PartialPlayerModel`. Defaults to None.
+
+  Raises:
+      TypeError: The command asks for `uow` together with `fields`.
+  """
+
+  def decorate(callback: Callable) -> Callable:
+    signature = inspect.signature(callback)
+    injected = [
+      name for name in _INJECTED if name in signature.parameters
+    ]
+    if fields and 'uow' in injected:
+      raise TypeError(
+        f'{callback.__qualname__}: projected Players cannot be written, drop `fields` to use `uow`'
+      )
+
+    @wraps(callback)
+    async def wrapper(
+      self, interaction: discord.Interaction, *args, **kwargs
+    ):
+      # Read-only commands need not wait for writing ones
+      lock = (
+        nullcontext()
+        if fields
+        else player_mailbox.hold(interaction.user.id)
+      )
+      async with lock:
+        return await run(self, interaction, *args, **kwargs)
+
+    async def run(
+      self, interaction: discord.Interaction, *args, **kwargs
+    ):
+      command = f'/{interaction.command.qualified_name}'
+      started = time.perf_counter()
+      try:
+        document = await get_player(
+          self.app, discord_id=interaction.user.id, fields=fields
+        )
+      except HTTPException as e:
+        if e.status_code != 404:
+          raise
+        not_registered.labels(command).inc()
+        return await interaction.response.send_message(
+          embed=embeds.NotRegisteredEmbed()
+        )
+      player_load_seconds.labels(command).observe(
+        time.perf_counter() - started
+      )
+
+      if fields:
+        player = PartialPlayerModel.from_db(document)
+        uow = None
+      else:
+        player = PlayerModel.from_db(document)
+        uow = utils.PlayerUnitOfWork(self.app, player)
+      values = {'player': player, 'uow': uow}
+      for name in injected:
+        kwargs[name] = values[name]
+      if uow is None:
+        return await callback(self, interaction, *args, **kwargs)
+
+      async def commit() -> None:
+        if uow.dirty:
+          started = time.perf_counter()
+          await uow.commit()
+          player_commit_seconds.labels(command).observe(
+            time.perf_counter() - started
+          )
+
+      # `Interaction.response` is cached in this slot
+      response = interaction.response
+      interaction._cs_response = CommitFirstResponse(response, commit)
+      try:
+        result = await callback(self, interaction, *args, **kwargs)
+        # Changes made after the last reply, if any
+        await commit()
+        return result
+      finally:
+        # Error handlers reply without committing
+        interaction._cs_response = response
+
+    # Discord builds the command's options from this signature
+    wrapper.__signature__ = signature.replace(
+      parameters=[
+        parameter
+        for parameter in signature.parameters.values()
+        if parameter.name not in injected
+      ]
+    )
+    return wrapper
+
+  return decorate
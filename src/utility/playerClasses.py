@@ -1,3 +1,31 @@
+from types import MappingProxyType
+
+from core.content import Record, content
+
+
+class PlayerClass(Record):
+  """A class Players pick when registering.
+
+  Args:
+      id (int): Position of the class in the content packs.
+      key (str): Value of the class's button, e.g. 'a'.
+      name (str): Name stored on the Player.
+      stats (Mapping[str, int]): Starting stats.
+  """
+
+  __slots__ = ('id', 'key', 'name', 'stats')
+
+
+# Player classes by button value
+PLAYER_CLASSES: dict[str, PlayerClass] = {
+  key: PlayerClass(
+    id=id, key=key, name=name, stats=MappingProxyType(stats)
+  )
+  for id, (key, name, stats) in enumerate(
+    content.rows('player_classes')
+  )
+}
+
 # Cooldowns
 defaultCooldowns = {
   'worship': None,
@@ -6,33 +34,7 @@ defaultCooldowns = {
 }
 
 # Test A
-defaultStatsA = {
-  'level': 1,
-  'currentxp': 0,
-  'requiredxp': 100,
-  'maxhp': 10,
-  'hp': 10,
-  'maxsan': 5,
-  'san': 5,
-  'atk': 2,
-  'dfs': 1,
-  'rst': 2,
-  'per': 2,
-  'sth': 2,
-}
+defaultStatsA = dict(PLAYER_CLASSES['a'].stats)
 
 # Test B
-defaultStatsB = {
-  'level': 1,
-  'currentxp': 0,
-  'requiredxp': 100,
-  'maxhp': 15,
-  'hp': 15,
-  'maxsan': 5,
-  'san': 5,
-  'atk': 5,
-  'dfs': 2,
-  'rst': 1,
-  'per': 1,
-  'sth': 1,
-}
+defaultStatsB = dict(PLAYER_CLASSES['b'].stats)
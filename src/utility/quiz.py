@@ -1,52 +1,29 @@
-quiz_data = [
-  {
-    'question': "Which novel starts with the line 'Call me Ishmael.'?",
-    'choices': {
-      'a': 'Moby-Dick',
-      'b': 'Treasure Island',
-      'c': 'Robinson Crusoe',
-      'd': 'The Old Man and the Sea',
-    },
-    'answer': 'a',
-  },
-  {
-    'question': 'What is the title of the first Harry Potter book in the UK?',
-    'choices': {
-      'a': 'Harry Potter and the Chamber of Secrets',
-      'b': "Harry Potter and the Philosopher's Stone",
-      'c': "Harry Potter and the Sorcerer's Stone",
-      'd': 'Harry Potter and the Prisoner of Azkaban',
-    },
-    'answer': 'b',
-  },
-  {
-    'question': 'In which novel does the character Atticus Finch appear?',
-    'choices': {
-      'a': 'Catcher in the Rye',
-      'b': 'To Kill a Mockingbird',
-      'c': 'The Great Gatsby',
-      'd': '1984',
-    },
-    'answer': 'b',
-  },
-  {
-    'question': "Who created fictional detective 'Sherlock Holmes'?",
-    'choices': {
-      'a': 'Agatha Christie',
-      'b': 'Raymond Chandler',
-      'c': 'Dashiell Hammett',
-      'd': 'Arthur Conan Doyle',
-    },
-    'answer': 'd',
-  },
-  {
-    'question': "Who is the author of 'The Book Thief'?",
-    'choices': {
-      'a': 'Markus Zusak',
-      'b': 'Khaled Hosseini',
-      'c': 'J.K. Rowling',
-      'd': 'Suzanne Collins',
-    },
-    'answer': 'a',
-  },
-]
+from types import MappingProxyType
+
+from core.content import Record, content
+
+
+class Question(Record):
+  """A quiz question.
+
+  Args:
+      id (int): Position of the question in the content packs.
+      question (str): Question text.
+      choices (Mapping[str, str]): Answers by letter.
+      answer (str): Letter of the right answer.
+  """
+
+  __slots__ = ('answer', 'choices', 'id', 'question')
+
+
+quiz_data: tuple[Question, ...] = tuple(
+  Question(
+    id=id,
+    question=question,
+    choices=MappingProxyType(choices),
+    answer=answer,
+  )
+  for id, (question, choices, answer) in enumerate(
+    content.rows('quiz')
+  )
+)
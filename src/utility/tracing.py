@@ -0,0 +1,273 @@
+import inspect
+import os
+import random
+import time
+from collections import deque
+from collections.abc import Callable
+from contextvars import ContextVar
+from functools import wraps
+from typing import Self, TypeVar
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+F = TypeVar('F', bound=Callable)
+
+
+class Trace:
+  """Timings of one interaction, from the cog down to the routes.
+
+  Args:
+      key (int | str): Identifies the trace, e.g. the interaction id.
+      name (str): What is being traced, e.g. the slash command.
+  """
+
+  __slots__ = (
+    'duration',
+    'key',
+    'name',
+    'outcome',
+    'spans',
+    'started',
+    'started_at',
+  )
+
+  def __init__(self, key: int | str, name: str) -> None:
+    self.key = key
+    self.name = name
+    self.started_at = time.time()
+    self.started = time.perf_counter()
+    self.duration = 0.0
+    self.outcome = 'running'
+    # (name, depth, offset, duration), appended as spans finish
+    self.spans: list[tuple[str, int, float, float]] = []
+
+  def to_dict(self) -> dict:
+    return {
+      'key': str(self.key),
+      'name': self.name,
+      'started_at': self.started_at,
+      'duration_ms': 1000 * self.duration,
+      'outcome': self.outcome,
+      'spans': [
+        {
+          'name': name,
+          'depth': depth,
+          'offset_ms': 1000 * offset,
+          'duration_ms': 1000 * duration,
+        }
+        for name, depth, offset, duration in sorted(
+          self.spans, key=lambda span: span[2]
+        )
+      ],
+    }
+
+
+# Trace the current task belongs to and how deep its open spans are
+_current: ContextVar[tuple[Trace, int] | None] = ContextVar(
+  '_current_trace', default=None
+)
+
+
+class _Span:
+  __slots__ = ('_started', '_token', 'name')
+
+  def __init__(self, name: str) -> None:
+    self.name = name
+
+  def __enter__(self) -> Self:
+    trace, depth = _current.get()
+    self._token = _current.set((trace, depth + 1))
+    self._started = time.perf_counter()
+    return self
+
+  def __exit__(self, exc_type, exc, tb) -> None:
+    ended = time.perf_counter()
+    trace, depth = _current.get()
+    _current.reset(self._token)
+    trace.spans.append(
+      (
+        self.name,
+        depth,
+        self._started - trace.started,
+        ended - self._started,
+      )
+    )
+
+
+class _NoSpan:
+  __slots__ = ()
+
+  def __enter__(self) -> Self:
+    return self
+
+  def __exit__(self, exc_type, exc, tb) -> None:
+    pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+  """Samples interactions and keeps their span timings in a ring buffer.
+
+  A sampled trace is started with `begin` and closed with `finish`.
+  Code running in between, in the same task or tasks it creates,
+  adds spans with `span` or `traced`. Outside a sampled trace both
+  cost one context variable lookup.
+
+  Args:
+      sample_rate (float, optional): Share of interactions traced, 0 to 1. Defaults to 0.1.
+      buffer_size (int, optional): Finished traces kept. Defaults to 256.
+      slow_ms (float, optional): Default threshold for `slow`. Defaults to 500.
+  """
+
+  def __init__(
+    self,
+    sample_rate: float = 0.1,
+    buffer_size: int = 256,
+    slow_ms: float = 500.0,
+  ) -> None:
+    self.sample_rate = sample_rate
+    self.slow_ms = slow_ms
+    self.traces: deque[Trace] = deque(maxlen=buffer_size)
+    self.started = 0
+    self.finished = 0
+
+  def begin(self, key: int | str, name: str) -> Trace | None:
+    """Starts a trace for the current task, if sampled.
+
+    Args:
+        key (int | str): Identifies the trace, e.g. the interaction id.
+        name (str): What is being traced, e.g. the slash command.
+
+    Returns:
+        Trace | None: The new trace, to pass to `finish`. None if not sampled.
+    """
+    if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+      return None
+    trace = Trace(key, name)
+    _current.set((trace, 0))
+    self.started += 1
+    return trace
+
+  def finish(self, trace: Trace, outcome: str = 'ok') -> None:
+    """Closes a trace and stores it in the ring buffer.
+
+    Args:
+        trace (Trace): Trace returned by `begin`.
+        outcome (str, optional): How the traced work ended. Defaults to 'ok'.
+    """
+    if trace.outcome != 'running':
+      return
+    trace.duration = time.perf_counter() - trace.started
+    trace.outcome = outcome
+    self.traces.append(trace)
+    self.finished += 1
+
+  def span(self, name: str) -> _Span | _NoSpan:
+    """Times a block as a span of the current trace.
+
+    Args:
+        name (str): Span name.
+
+    Returns:
+        _Span | _NoSpan: Context manager, a no-op if nothing is traced.
+    """
+    if _current.get() is None:
+      return _NO_SPAN
+    return _Span(name)
+
+  def record(
+    self, name: str, started: float, duration: float
+  ) -> None:
+    """Adds an already timed span to the current trace, if any.
+
+    Args:
+        name (str): Span name.
+        started (float): `time.perf_counter()` value when it started.
+        duration (float): Seconds it took.
+    """
+    if (current := _current.get()) is None:
+      return
+    trace, depth = current
+    trace.spans.append(
+      (name, depth + 1, started - trace.started, duration)
+    )
+
+  def slow(
+    self, min_ms: float | None = None, limit: int = 20
+  ) -> list[dict]:
+    """Returns the slowest finished traces, slowest first.
+
+    Args:
+        min_ms (float | None, optional): Only traces at least this slow. Defaults to `slow_ms`.
+        limit (int, optional): Most traces to return. Defaults to 20.
+
+    Returns:
+        list[dict]: Traces with their spans.
+    """
+    if min_ms is None:
+      min_ms = self.slow_ms
+    found = [
+      trace
+      for trace in list(self.traces)
+      if 1000 * trace.duration >= min_ms
+    ]
+    found.sort(key=lambda trace: trace.duration, reverse=True)
+    return [trace.to_dict() for trace in found[:limit]]
+
+  def stats(self) -> dict:
+    return {
+      'sample_rate': self.sample_rate,
+      'slow_ms': self.slow_ms,
+      'started': self.started,
+      'finished': self.finished,
+      'buffered': len(self.traces),
+    }
+
+
+def traced(name: str | None = None) -> Callable[[F], F]:
+  """Records each call of the decorated function as a span.
+
+  Works on plain and async functions. The signature is kept, so it
+  can sit under FastAPI route decorators.
+
+  Args:
+      name (str | None, optional): Span name. Defaults to the module and function name.
+  """
+
+  def decorate(fn: F) -> F:
+    span_name = name or (
+      f'{fn.__module__.rsplit(".", 1)[-1]}.{fn.__qualname__}'
+    )
+
+    if inspect.iscoroutinefunction(fn):
+
+      @wraps(fn)
+      async def wrapper(*args, **kwargs):
+        if _current.get() is None:
+          return await fn(*args, **kwargs)
+        with _Span(span_name):
+          return await fn(*args, **kwargs)
+
+    else:
+
+      @wraps(fn)
+      def wrapper(*args, **kwargs):
+        if _current.get() is None:
+          return fn(*args, **kwargs)
+        with _Span(span_name):
+          return fn(*args, **kwargs)
+
+    return wrapper
+
+  return decorate
+
+
+tracer = Tracer(
+  sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', '0.1')),
+  buffer_size=int(os.getenv('TRACE_BUFFER_SIZE', '256')),
+  slow_ms=float(os.getenv('TRACE_SLOW_MS', '500')),
+)